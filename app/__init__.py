@@ -1,40 +1,88 @@
-from flask import Flask, g
+from flask import Flask, g, request
 from flask_login import current_user
+import os
 from .app_factory import create_app
-from .db_connect import close_db, get_db
+from .compression import init_compression
+from .db_connect import close_db, log_request_sql, summarize_sql_stats
+from .functions import days_overdue
 
 app = create_app()
 
 # Register Blueprints
+from app.blueprints.analytics import analytics
 from app.blueprints.auth import auth
 from app.blueprints.dashboard import dashboard
-from app.blueprints.rentals import rentals
+from app.blueprints.exports import exports
+from app.blueprints.imports import imports
+from app.blueprints.rentals import rentals, start_overdue_refresher, start_overdue_sweeper
 
+app.register_blueprint(analytics)
 app.register_blueprint(auth)
 app.register_blueprint(dashboard)
+app.register_blueprint(exports)
+app.register_blueprint(imports)
 app.register_blueprint(rentals)
 
+app.add_template_filter(days_overdue)
+
+# Hashed, precompressed /assets/ and Accept-Encoding compression. Registered before
+# the hooks below so it runs after them (after_request hooks run in reverse order).
+init_compression(app)
+
+# Mark past-due rentals Overdue in the background when OVERDUE_SWEEP_INTERVAL is set
+start_overdue_sweeper(app)
+# Rebuild overdue_rental when it drifts from the live join, when OVERDUE_REFRESH_INTERVAL is set
+start_overdue_refresher(app)
+
 # Import routes (for any non-blueprint routes)
 from . import routes
 
-@app.before_request
-def before_request():
-    g.db = get_db()
-    if g.db is None:
-        print("Warning: Database connection unavailable. Some features may not work.")
-
 @app.after_request
 def add_cache_control_headers(response):
     """
     Add cache control headers to prevent browser caching of protected pages.
     This ensures that after logout, users cannot access protected pages via back button.
+    Static files and /assets/ are skipped so serving them never loads the user from the database.
+    Responses with an ETag (conditional_get views, and their 304s) may be stored but
+    must be revalidated on every use, which still re-checks the login.
     """
-    if current_user.is_authenticated:
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
+    if request.endpoint not in ('static', 'asset') and current_user.is_authenticated:
+        if response.get_etag()[0]:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        else:
+            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
     return response
 
+# Per-request SQL summary headers, on in debug mode or with SQL_DEBUG_HEADERS=1
+SQL_DEBUG_HEADERS = os.getenv('SQL_DEBUG_HEADERS', '0') == '1'
+
+@app.after_request
+def add_sql_summary(response):
+    """
+    Summarize the request's SQL (count, DB time, repeated statement shapes).
+    Flags slow or N+1-looking requests in the slow-query log. In debug mode,
+    or with SQL_DEBUG_HEADERS, also exposes the summary as X-DB-* and
+    Server-Timing headers. Statements run while a streamed body is being
+    sent come after this hook and are not included.
+    """
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    summary = summarize_sql_stats(stats)
+    log_request_sql(summary)
+    if app.debug or SQL_DEBUG_HEADERS:
+        response.headers['X-DB-Queries'] = str(summary['queries'])
+        response.headers['X-DB-Time-Ms'] = f"{summary['db_ms']:.2f}"
+        response.headers['X-DB-Rows'] = str(summary['rows'])
+        response.headers['Server-Timing'] = f'db;dur={summary["db_ms"]:.2f};desc="{summary["queries"]} queries"'
+        if summary['repeated']:
+            top = summary['repeated'][0]
+            response.headers['X-DB-Repeated'] = (f"{len(summary['repeated'])} shape(s); "
+                                                 f"{top['count']}x {top['statement'][:200]}")
+    return response
+
 # Setup database connection teardown
 @app.teardown_appcontext
 def teardown_db(exception=None):
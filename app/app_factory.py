@@ -1,16 +1,27 @@
 from flask import Flask
 from flask_login import LoginManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Proxies in front of the app whose X-Forwarded-For and X-Forwarded-Proto are
+# trusted, so request.remote_addr is the client's address rather than the
+# proxy's. Off by default: with no proxy in front, trusting the header would
+# let a client pick its own address. Deployments behind one (the Heroku
+# router, nginx) set it to the number of proxies.
+PROXY_FIX_HOPS = int(os.getenv('PROXY_FIX_HOPS', 0))
+
 def create_app():
     app = Flask(__name__)
 
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-this')
 
+    if PROXY_FIX_HOPS:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_HOPS, x_proto=PROXY_FIX_HOPS)
+
     # Initialize Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -21,7 +32,12 @@ def create_app():
     # User loader callback for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
+        from app.db_connect import DatabaseUnavailableError
         from app.models import Employee
-        return Employee.get_by_id(int(user_id))
+        try:
+            return Employee.get_cached(int(user_id))
+        except DatabaseUnavailableError:
+            # Treat the session as logged out; protected pages redirect to the login form
+            return None
 
     return app
\ No newline at end of file
@@ -0,0 +1,449 @@
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required
+from app.db_connect import get_db, run_in_transaction
+from app.functions import ROLLUP_JOB, get_snapshot, rental_month_counter
+from app.summaries import RENTAL_HISTORY_COUNTER
+from datetime import date, timedelta
+import os
+
+import numpy as np
+import pandas as pd
+import pymysql.cursors
+
+analytics = Blueprint('analytics', __name__)
+
+# Rows fetched from the server-side cursor per DataFrame chunk
+ANALYTICS_CHUNK_ROWS = 50000
+# Seconds a closed month's metrics are cached (unless a write reaches back into
+# it); the current month is recomputed after ANALYTICS_CURRENT_TTL seconds or
+# as soon as a rental write lands
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 3600))
+ANALYTICS_CURRENT_TTL = int(os.getenv('ANALYTICS_CURRENT_TTL', 60))
+ANALYTICS_WINDOWS = (3, 6, 12, 24)
+
+# One row per rental line, with its rental's dates and totals repeated
+BUCKET_COLUMNS = ('rental_id', 'rental_date', 'return_date', 'total_cost', 'late_fee', 'equipment_id')
+
+def month_start(day):
+    """The first day of day's month"""
+    return day.replace(day=1)
+
+def next_month(day):
+    """The first day of the month after day's"""
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def month_buckets(first, last):
+    """First days of every month from first's month to last's month, inclusive"""
+    buckets = []
+    current = month_start(first)
+    while current <= last:
+        buckets.append(current)
+        current = next_month(current)
+    return buckets
+
+def empty_bucket_frame():
+    """A bucket frame with no rows but the dtypes compute_bucket expects"""
+    return pd.DataFrame({
+        'rental_id': pd.Series(dtype='int64'),
+        'rental_date': pd.Series(dtype='datetime64[ns]'),
+        'return_date': pd.Series(dtype='datetime64[ns]'),
+        'total_cost': pd.Series(dtype='float64'),
+        'late_fee': pd.Series(dtype='float64'),
+        'equipment_id': pd.Series(dtype='int64'),
+    })
+
+def load_bucket_frame(db, start, end):
+    """
+    Load every rental line whose rental overlaps [start, end) as a DataFrame.
+
+    The page calls this once for the span of months it needs and slices each
+    month out with bucket_rows, because the range on rental_date is only
+    bounded above: a per-month query would rescan all earlier history every
+    time. Rows come off an unbuffered cursor ANALYTICS_CHUNK_ROWS at a time
+    and are converted to columns chunk by chunk, so the Python row tuples for
+    the whole span never exist at once.
+    """
+    cursor = db.cursor(pymysql.cursors.SSCursor)
+    cursor.execute("""
+        SELECT r.rental_id, r.rental_date, r.return_date, r.total_cost, r.late_fee, rd.equipment_id
+        FROM rental r
+        JOIN rental_detail rd ON r.rental_id = rd.rental_id
+        WHERE r.rental_date < %s AND (r.return_date IS NULL OR r.return_date >= %s)
+    """, (end, start))
+
+    frames = []
+    while True:
+        chunk = cursor.fetchmany(ANALYTICS_CHUNK_ROWS)
+        if not chunk:
+            break
+        frame = pd.DataFrame.from_records(chunk, columns=BUCKET_COLUMNS)
+        frame['rental_date'] = pd.to_datetime(frame['rental_date'])
+        frame['return_date'] = pd.to_datetime(frame['return_date'])
+        frame['total_cost'] = frame['total_cost'].astype('float64')
+        frame['late_fee'] = frame['late_fee'].astype('float64')
+        frames.append(frame)
+    cursor.close()
+
+    if not frames:
+        return empty_bucket_frame()
+    return pd.concat(frames, ignore_index=True)
+
+def bucket_rows(frame, start, end):
+    """The lines of a frame (see load_bucket_frame) whose rental overlaps the month [start, end)"""
+    overlaps = ((frame['rental_date'] < pd.Timestamp(end))
+                & (frame['return_date'].isna() | (frame['return_date'] >= pd.Timestamp(start))))
+    return frame[overlaps]
+
+def compute_bucket(frame, start, end, today):
+    """
+    Metrics for one month [start, end) from its bucket frame, all vectorized.
+
+    Revenue, rental length and late fees are counted for rentals that start in
+    the month. Equipment days count every day a line's equipment was out in
+    the month, inclusive of the return day (or up to today while unreturned).
+    """
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+    one_day = np.timedelta64(1, 'D')
+
+    # Equipment occupancy, clipped to the month
+    out_until = frame['return_date'].fillna(pd.Timestamp(today)) + one_day
+    occupied_from = frame['rental_date'].clip(lower=start_ts)
+    occupied_to = out_until.clip(upper=end_ts)
+    occupied_days = ((occupied_to - occupied_from) / one_day).clip(lower=0)
+    equipment_days = occupied_days.groupby(frame['equipment_id']).sum()
+
+    # Rental-level metrics for rentals starting in this month
+    rentals = frame.drop_duplicates('rental_id')
+    rentals = rentals[rentals['rental_date'] >= start_ts]
+    daily_revenue = rentals.groupby('rental_date')['total_cost'].sum()
+    returned = rentals[rentals['return_date'].notna()]
+    lengths = (returned['return_date'] - returned['rental_date']) / one_day
+
+    return {
+        'daily_revenue': daily_revenue,
+        'equipment_days': equipment_days,
+        'rentals': int(len(rentals)),
+        'revenue': float(rentals['total_cost'].sum()),
+        'returned': int(len(returned)),
+        'rental_days': float(lengths.sum()),
+        'late_returns': int((returned['late_fee'] > 0).sum()),
+        'late_fees': float(rentals['late_fee'].sum()),
+    }
+
+def combine_buckets(buckets, first, last, equipment):
+    """
+    Merge per-month results into the analytics page's metrics for [first, last].
+
+    `equipment` is a DataFrame indexed by equipment_id with equipment_name and
+    equipment_type. Returns a dict of revenue series (daily, weekly, monthly)
+    and utilization frames, plus headline averages and rates.
+    """
+    days = pd.date_range(first, last, freq='D')
+    series = [bucket['daily_revenue'] for bucket in buckets if len(bucket['daily_revenue'])]
+    daily = pd.concat(series).groupby(level=0).sum() if series else pd.Series(dtype='float64')
+    daily = daily.reindex(days, fill_value=0.0)
+    weekly = daily.resample('W-MON', label='left', closed='left').sum()
+    monthly = daily.resample('MS').sum()
+
+    window_days = len(days)
+    equipment_days = pd.concat([bucket['equipment_days'] for bucket in buckets]).groupby(level=0).sum()
+    per_equipment = equipment.copy()
+    per_equipment['days_rented'] = equipment_days.reindex(per_equipment.index, fill_value=0.0)
+    per_equipment['utilization'] = per_equipment['days_rented'] / window_days
+
+    per_type = per_equipment.groupby('equipment_type').agg(
+        items=('equipment_name', 'size'), days_rented=('days_rented', 'sum'))
+    per_type['utilization'] = per_type['days_rented'] / (per_type['items'] * window_days)
+
+    totals = {key: sum(bucket[key] for bucket in buckets)
+              for key in ('rentals', 'revenue', 'returned', 'rental_days', 'late_returns', 'late_fees')}
+    return {
+        'daily': daily,
+        'weekly': weekly,
+        'monthly': monthly,
+        'per_equipment': per_equipment.sort_values('utilization', ascending=False),
+        'per_type': per_type.sort_values('utilization', ascending=False),
+        'rentals': totals['rentals'],
+        'revenue': totals['revenue'],
+        'avg_rental_days': totals['rental_days'] / totals['returned'] if totals['returned'] else 0.0,
+        'late_return_rate': totals['late_returns'] / totals['returned'] if totals['returned'] else 0.0,
+        'late_fee_share': totals['late_fees'] / totals['revenue'] if totals['revenue'] else 0.0,
+    }
+
+def load_equipment_frame(cursor):
+    """Non-archived equipment names and types as a DataFrame indexed by equipment_id"""
+    cursor.execute("""
+        SELECT equipment_id, equipment_name, equipment_type
+        FROM equipment
+        WHERE is_archived = FALSE
+    """)
+    rows = cursor.fetchall()
+    frame = pd.DataFrame.from_records(rows, columns=['equipment_id', 'equipment_name', 'equipment_type'])
+    return frame.set_index('equipment_id')
+
+def get_bucket(start, today, load_rows):
+    """
+    Cached metrics for the month starting at start.
+
+    The current month is recomputed after ANALYTICS_CURRENT_TTL seconds or a
+    rental write. A closed month is served from the snapshot cache for
+    ANALYTICS_CACHE_TTL seconds unless its shared counter moved: any worker's
+    write that reaches back into it (app.functions.rewind_rental_months), or a
+    bulk load of rental history. On a miss, load_rows(start, end) supplies the
+    month's lines.
+    """
+    end = next_month(start)
+    if end > today:
+        return get_snapshot(('analytics_bucket', start, today),
+                            lambda: compute_bucket(load_rows(start, end), start, end, today),
+                            ttl=ANALYTICS_CURRENT_TTL, tables=('rental',))
+    return get_snapshot(('analytics_bucket', start, None),
+                        lambda: compute_bucket(load_rows(start, end), start, end, today),
+                        ttl=ANALYTICS_CACHE_TTL, tables=(RENTAL_HISTORY_COUNTER, rental_month_counter(start)),
+                        shared=True)
+
+def get_buckets(db, first, today):
+    """
+    Metrics for every month from first's month through today's.
+
+    Months are visited oldest first, so the first one missing from the cache
+    loads one frame covering it and every later month, and the rest of the
+    misses are sliced from that frame: one query per page load, none when
+    every month is cached.
+    """
+    window = {}
+
+    def load_rows(start, end):
+        if 'frame' not in window:
+            window['frame'] = load_bucket_frame(db, start, next_month(today))
+        return bucket_rows(window['frame'], start, end)
+
+    return [get_bucket(start, today, load_rows) for start in month_buckets(first, today)]
+
+@analytics.route('/analytics')
+@login_required
+def index():
+    months = request.args.get('months', 12, type=int)
+    if months not in ANALYTICS_WINDOWS:
+        months = 12
+
+    today = date.today()
+    first = month_start(today)
+    for _ in range(months - 1):
+        first = month_start(first - timedelta(days=1))
+
+    db = get_db()
+    buckets = get_buckets(db, first, today)
+    cursor = db.cursor()
+    metrics = combine_buckets(buckets, first, today, load_equipment_frame(cursor))
+    cursor.close()
+
+    def series_rows(series):
+        peak = float(series.max()) if len(series) else 0.0
+        return [{'start': ts.date(), 'revenue': float(value), 'share': float(value) / peak if peak else 0.0}
+                for ts, value in series.items()]
+
+    return render_template(
+        'analytics/index.html', metrics=metrics, months=months, windows=ANALYTICS_WINDOWS,
+        first=first, today=today,
+        monthly=series_rows(metrics['monthly']),
+        weekly=series_rows(metrics['weekly'].tail(12)),
+        daily=series_rows(metrics['daily'].tail(14)),
+        per_type=metrics['per_type'].reset_index().to_dict('records'),
+        top_equipment=metrics['per_equipment'].head(10).reset_index().to_dict('records'))
+
+# Daily utilization rollup. equipment_daily_rollup holds one row per equipment
+# item per closed day (rented or idle, plus the revenue billed that day). The
+# job only processes days after its watermark; rental and equipment writes that
+# change past days move it back (app.functions.rewind_rollup_watermark) so those
+# days are recomputed on the next run.
+ROLLUP_CHUNK_DAYS = 31
+
+def get_rollup_watermark(cursor):
+    """Last day the rollup has fully processed, or None before its first run"""
+    cursor.execute("SELECT processed_through FROM rollup_watermark WHERE job_name = %s", (ROLLUP_JOB,))
+    row = cursor.fetchone()
+    return row['processed_through'] if row else None
+
+def _rollup_days(cursor, first, last, longest_billing):
+    """
+    Recompute the rollup rows for every equipment item for the days first..last, set-based.
+
+    A line touches the range while the item is out or while it is still being
+    billed. Rentals still out or returned on/after `first` are found through
+    idx_rental_return; lines returned earlier but billed past `first` started
+    at most `longest_billing` (the largest days_rented) days before it, so the
+    scan is bounded by the range, not by the size of the rental history.
+    """
+    line_columns = """
+            SELECT rd.equipment_id,
+                   r.rental_date,
+                   COALESCE(r.return_date, %s) as out_until,
+                   r.rental_date + INTERVAL rd.days_rented DAY as billed_until,
+                   rd.line_total / rd.days_rented as daily_revenue
+            FROM rental r
+            JOIN rental_detail rd ON r.rental_id = rd.rental_id"""
+    cursor.execute(f"""
+        INSERT INTO equipment_daily_rollup (equipment_id, rollup_date, rented_days, idle_days, revenue)
+        WITH RECURSIVE days (day) AS (
+            SELECT CAST(%s AS DATE)
+            UNION ALL
+            SELECT day + INTERVAL 1 DAY FROM days WHERE day < %s
+        ),
+        lines AS ({line_columns}
+            WHERE (r.return_date IS NULL OR r.return_date >= %s)
+              AND r.rental_date <= %s
+            UNION ALL{line_columns}
+            WHERE r.rental_date >= %s - INTERVAL %s DAY
+              AND r.return_date < %s
+              AND r.rental_date + INTERVAL rd.days_rented DAY > %s
+        )
+        SELECT * FROM (
+            SELECT e.equipment_id,
+                   d.day as rollup_date,
+                   COALESCE(MAX(d.day <= l.out_until), 0) as rented,
+                   1 - COALESCE(MAX(d.day <= l.out_until), 0) as idle,
+                   COALESCE(SUM(CASE WHEN d.day < l.billed_until THEN l.daily_revenue END), 0) as billed
+            FROM equipment e
+            JOIN days d ON e.purchase_date IS NULL OR e.purchase_date <= d.day
+            LEFT JOIN lines l ON l.equipment_id = e.equipment_id
+                AND d.day >= l.rental_date
+                AND d.day <= GREATEST(l.out_until, l.billed_until - INTERVAL 1 DAY)
+            GROUP BY e.equipment_id, d.day
+        ) as src
+        ON DUPLICATE KEY UPDATE
+            rented_days = src.rented,
+            idle_days = src.idle,
+            revenue = src.billed
+    """, (first, last, last, first, last, last, first, longest_billing, first, first))
+
+def run_utilization_rollup(db, through=None):
+    """
+    Bring equipment_daily_rollup up to date through `through` (default yesterday).
+
+    Starts the day after the watermark (or at the first rental on the very
+    first run) and commits ROLLUP_CHUNK_DAYS days at a time together with the
+    advanced watermark, so an interrupted run resumes where it stopped.
+    Returns the number of days processed.
+    """
+    through = through or date.today() - timedelta(days=1)
+    cursor = db.cursor()
+    watermark = get_rollup_watermark(cursor)
+    if watermark is None:
+        cursor.execute("SELECT MIN(rental_date) as first_day FROM rental")
+        first_day = cursor.fetchone()['first_day']
+        if first_day is None:
+            cursor.close()
+            return 0
+        watermark = first_day - timedelta(days=1)
+        cursor.execute("INSERT INTO rollup_watermark (job_name, processed_through) VALUES (%s, %s)",
+                       (ROLLUP_JOB, watermark))
+        db.commit()
+    # Bounds how far back a line returned before a chunk can still be billed into it
+    cursor.execute("SELECT MAX(days_rented) as longest FROM rental_detail")
+    longest_billing = cursor.fetchone()['longest'] or 1
+    cursor.close()
+
+    processed = 0
+    while watermark < through:
+        first = watermark + timedelta(days=1)
+        last = min(first + timedelta(days=ROLLUP_CHUNK_DAYS - 1), through)
+
+        def work(cursor):
+            _rollup_days(cursor, first, last, longest_billing)
+            cursor.execute("UPDATE rollup_watermark SET processed_through = %s WHERE job_name = %s",
+                           (last, ROLLUP_JOB))
+
+        run_in_transaction(db, work)
+        processed += (last - first).days + 1
+        watermark = last
+    return processed
+
+@analytics.cli.command('rollup-utilization')
+def rollup_utilization_command():
+    """Fill equipment_daily_rollup for every closed day since the last run."""
+    db = get_db()
+    try:
+        days = run_utilization_rollup(db)
+    except Exception as e:
+        print(f"[ERROR] Utilization rollup failed: {e}")
+        raise SystemExit(1)
+    cursor = db.cursor()
+    print(f"[OK] {days} day(s) rolled up; processed through {get_rollup_watermark(cursor)}")
+    cursor.close()
+
+def query_utilization(cursor, start, end, equipment_type=None, min_idle=None):
+    """
+    Per-equipment rented days, idle days, revenue and utilization for [start, end] from the rollup.
+
+    min_idle (0..1) keeps only items idle at least that share of their days,
+    e.g. 0.8 for "sat idle 80% of the time". Least utilized items come first.
+    """
+    conditions = ["u.rollup_date BETWEEN %s AND %s"]
+    params = [start, end]
+    if equipment_type:
+        conditions.append("e.equipment_type = %s")
+        params.append(equipment_type)
+    having = ""
+    if min_idle is not None:
+        having = "HAVING idle_days >= %s * (rented_days + idle_days)"
+        params.append(min_idle)
+
+    cursor.execute(f"""
+        SELECT e.equipment_id, e.equipment_name, e.equipment_type,
+               SUM(u.rented_days) as rented_days,
+               SUM(u.idle_days) as idle_days,
+               SUM(u.revenue) as revenue
+        FROM equipment_daily_rollup u
+        JOIN equipment e ON u.equipment_id = e.equipment_id
+        WHERE {' AND '.join(conditions)}
+        GROUP BY e.equipment_id, e.equipment_name, e.equipment_type
+        {having}
+        ORDER BY SUM(u.rented_days) / (SUM(u.rented_days) + SUM(u.idle_days)), e.equipment_id
+    """, params)
+    results = []
+    for row in cursor.fetchall():
+        days = int(row['rented_days']) + int(row['idle_days'])
+        results.append({
+            'equipment_id': row['equipment_id'],
+            'equipment_name': row['equipment_name'],
+            'equipment_type': row['equipment_type'],
+            'rented_days': int(row['rented_days']),
+            'idle_days': int(row['idle_days']),
+            'revenue': float(row['revenue']),
+            'utilization': int(row['rented_days']) / days if days else 0.0,
+        })
+    return results
+
+@analytics.route('/analytics/utilization')
+@login_required
+def utilization():
+    """
+    JSON utilization per equipment item between ?start= and ?end= (YYYY-MM-DD).
+
+    Optional ?type= limits to one equipment_type and ?min_idle=0.8 keeps only
+    items idle at least 80% of the range. `end` is clamped to the rollup's
+    watermark, which is returned as processed_through.
+    """
+    try:
+        start = date.fromisoformat(request.args.get('start', ''))
+        end = date.fromisoformat(request.args.get('end', ''))
+        min_idle = request.args.get('min_idle', type=float)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+
+    cursor = get_db().cursor()
+    watermark = get_rollup_watermark(cursor)
+    if watermark is not None:
+        end = min(end, watermark)
+    equipment = query_utilization(cursor, start, end, request.args.get('type'), min_idle)
+    cursor.close()
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'processed_through': watermark.isoformat() if watermark else None,
+        'equipment': equipment,
+    })
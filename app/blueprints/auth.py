@@ -1,9 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, make_response
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models import Employee
+from app.db_connect import DatabaseUnavailableError
+from app.functions import (new_rate_limiter, rate_limit_forgive, rate_limit_hit, rate_limit_reset,
+                           rate_limit_retry_after, rate_limit_stats)
+from app.models import Employee, PasswordCheckBusyError
+import math
+import os
 
 auth = Blueprint('auth', __name__)
 
+# Login throttle: attempts allowed per username and per client IP in any sliding
+# LOGIN_THROTTLE_WINDOW seconds. Checked before any database or hash work. The
+# counts are per worker process, so the effective limit is up to workers x limit.
+# Behind a proxy the client IP comes from X-Forwarded-For via ProxyFix (set
+# PROXY_FIX_HOPS). A successful login takes its own attempt back off the IP's
+# count, so staff sharing an office address only spend it on failed attempts.
+LOGIN_THROTTLE_WINDOW = float(os.getenv('LOGIN_THROTTLE_WINDOW', 300))
+LOGIN_USER_LIMIT = int(os.getenv('LOGIN_USER_LIMIT', 5))
+LOGIN_IP_LIMIT = int(os.getenv('LOGIN_IP_LIMIT', 20))
+_user_attempts = new_rate_limiter(LOGIN_USER_LIMIT, LOGIN_THROTTLE_WINDOW)
+_ip_attempts = new_rate_limiter(LOGIN_IP_LIMIT, LOGIN_THROTTLE_WINDOW)
+
+def get_login_throttle_stats():
+    """Counters of this process's per-username and per-IP login limiters"""
+    return {'by_username': rate_limit_stats(_user_attempts), 'by_ip': rate_limit_stats(_ip_attempts)}
+
+def _login_refused(message, status, retry_after):
+    """Re-render the login form with a flash and a Retry-After header"""
+    flash(message, 'danger')
+    response = make_response(render_template('auth/login.html'), status)
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     # Redirect if already logged in
@@ -19,11 +47,31 @@ def login():
             flash('Please provide both username and password.', 'danger')
             return render_template('auth/login.html')
 
+        # Throttle before touching the database or the password hash
+        user_key = username.strip().lower()
+        ip_key = request.remote_addr or 'unknown'
+        retry_after = max(rate_limit_retry_after(_user_attempts, user_key),
+                          rate_limit_retry_after(_ip_attempts, ip_key))
+        if retry_after:
+            return _login_refused(f'Too many login attempts. Try again in {math.ceil(retry_after)} seconds.',
+                                  429, retry_after)
+        rate_limit_hit(_user_attempts, user_key)
+        rate_limit_hit(_ip_attempts, ip_key)
+
         # Authenticate employee
-        employee = Employee.authenticate(username, password)
+        try:
+            employee = Employee.authenticate(username, password)
+        except PasswordCheckBusyError:
+            return _login_refused('The login service is busy. Please try again in a moment.', 503, 1)
+        except DatabaseUnavailableError:
+            return _login_refused('The database is unavailable. Please try again in a moment.', 503, 5)
 
         if employee:
+            rate_limit_reset(_user_attempts, user_key)
+            rate_limit_forgive(_ip_attempts, ip_key)
             login_user(employee, remember=remember)
+            # The row was just read, so later requests can start from it
+            Employee.cache(employee)
             flash(f'Welcome back, {employee.first_name}!', 'success')
 
             # Redirect to next page if specified, otherwise dashboard
@@ -37,6 +85,7 @@ def login():
 @auth.route('/logout')
 @login_required
 def logout():
+    Employee.invalidate_cache(current_user.employee_id)
     logout_user()
     # Clear all session data to ensure complete logout
     session.clear()
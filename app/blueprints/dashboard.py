@@ -1,98 +1,77 @@
-from flask import Blueprint, render_template, g
-from flask_login import login_required, current_user
+from flask import Blueprint, render_template
+from flask_login import login_required
 from app.db_connect import get_db
+from app.functions import get_snapshot
 from datetime import date
+import os
 
 dashboard = Blueprint('dashboard', __name__)
 
+# Seconds a KPI snapshot is served before it is recomputed; a rental write in any
+# worker invalidates it sooner, through the shared change counters
+KPI_CACHE_TTL = int(os.getenv('DASHBOARD_KPI_TTL', 30))
+
+def load_rental_kpis(cursor):
+    """
+    Read the rental KPI cards from rental_status_summary.
+
+    The summary holds one maintained row per status, so this is a three-row
+    primary-key read no matter how much rental history exists. Returns a dict
+    with total_revenue, active_count, completed_count, overdue_count and
+    total_late_fees.
+    """
+    cursor.execute("""
+        SELECT status, rental_count, total_cost, late_fee_total
+        FROM rental_status_summary
+    """)
+    by_status = {row['status']: row for row in cursor.fetchall()}
+
+    def count(status):
+        return int(by_status[status]['rental_count']) if status in by_status else 0
+
+    return {
+        'total_revenue': sum((row['total_cost'] for row in by_status.values()), 0),
+        'active_count': count('Active'),
+        'completed_count': count('Completed'),
+        'overdue_count': count('Overdue'),
+        'total_late_fees': sum((row['late_fee_total'] for row in by_status.values()), 0),
+    }
+
 @dashboard.route('/')
 @dashboard.route('/dashboard')
 @login_required
 def index():
     db = get_db()
-
-    # Get total revenue
     cursor = db.cursor()
-    cursor.execute("""
-        SELECT COALESCE(SUM(total_cost), 0) as total_revenue
-        FROM rental
-        WHERE status IN ('Completed', 'Overdue', 'Active')
-    """)
-    total_revenue = cursor.fetchone()['total_revenue']
+
+    # Get the KPI cards (revenue, status counts, late fees) from the snapshot cache
+    kpis = get_snapshot('dashboard_kpis', lambda: load_rental_kpis(cursor),
+                        ttl=KPI_CACHE_TTL, tables=('rental',), shared=True)
 
     # Get most rented equipment
     cursor.execute("""
         SELECT
             e.equipment_name,
             e.equipment_type,
-            COUNT(rd.rental_detail_id) as rental_count,
-            SUM(rd.line_total) as total_revenue
-        FROM equipment e
-        JOIN rental_detail rd ON e.equipment_id = rd.equipment_id
-        JOIN rental r ON rd.rental_id = r.rental_id
-        GROUP BY e.equipment_id, e.equipment_name, e.equipment_type
-        ORDER BY rental_count DESC
+            s.times_rented as rental_count,
+            s.total_revenue
+        FROM rental_equipment_summary s
+        JOIN equipment e ON s.equipment_id = e.equipment_id
+        WHERE s.times_rented > 0
+        ORDER BY s.times_rented DESC
         LIMIT 5
     """)
     most_rented_equipment = cursor.fetchall()
 
-    # Get overdue rentals with calculated late fees
+    # Get overdue rentals, already joined and in due-date order in the overdue_rental table
     cursor.execute("""
-        SELECT
-            r.rental_id,
-            r.rental_date,
-            r.due_date,
-            r.subtotal,
-            r.late_fee,
-            r.total_cost,
-            DATEDIFF(CURDATE(), r.due_date) as days_overdue,
-            c.first_name,
-            c.last_name,
-            c.phone,
-            c.email,
-            GROUP_CONCAT(e.equipment_name SEPARATOR ', ') as equipment_list
-        FROM rental r
-        JOIN customer c ON r.customer_id = c.customer_id
-        JOIN rental_detail rd ON r.rental_id = rd.rental_id
-        JOIN equipment e ON rd.equipment_id = e.equipment_id
-        WHERE r.status = 'Overdue'
-        GROUP BY r.rental_id
-        ORDER BY r.due_date ASC
+        SELECT rental_id, rental_date, due_date, subtotal, late_fee, total_cost,
+               first_name, last_name, phone, email, equipment_list
+        FROM overdue_rental
+        ORDER BY due_date, rental_id
     """)
     overdue_rentals = cursor.fetchall()
 
-    # Get active rentals count
-    cursor.execute("""
-        SELECT COUNT(*) as active_count
-        FROM rental
-        WHERE status = 'Active'
-    """)
-    active_rentals_count = cursor.fetchone()['active_count']
-
-    # Get completed rentals count
-    cursor.execute("""
-        SELECT COUNT(*) as completed_count
-        FROM rental
-        WHERE status = 'Completed'
-    """)
-    completed_rentals_count = cursor.fetchone()['completed_count']
-
-    # Get overdue rentals count
-    cursor.execute("""
-        SELECT COUNT(*) as overdue_count
-        FROM rental
-        WHERE status = 'Overdue'
-    """)
-    overdue_rentals_count = cursor.fetchone()['overdue_count']
-
-    # Get total late fees collected
-    cursor.execute("""
-        SELECT COALESCE(SUM(late_fee), 0) as total_late_fees
-        FROM rental
-        WHERE late_fee > 0
-    """)
-    total_late_fees = cursor.fetchone()['total_late_fees']
-
     # Get recent rentals
     cursor.execute("""
         SELECT
@@ -116,12 +95,12 @@ def index():
     cursor.close()
 
     return render_template('dashboard/index.html',
-                         total_revenue=total_revenue,
+                         total_revenue=kpis['total_revenue'],
                          most_rented_equipment=most_rented_equipment,
                          overdue_rentals=overdue_rentals,
-                         active_rentals_count=active_rentals_count,
-                         completed_rentals_count=completed_rentals_count,
-                         overdue_rentals_count=overdue_rentals_count,
-                         total_late_fees=total_late_fees,
+                         active_rentals_count=kpis['active_count'],
+                         completed_rentals_count=kpis['completed_count'],
+                         overdue_rentals_count=kpis['overdue_count'],
+                         total_late_fees=kpis['total_late_fees'],
                          recent_rentals=recent_rentals,
                          current_date=date.today())
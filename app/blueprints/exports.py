@@ -0,0 +1,238 @@
+from flask import Blueprint, Response, abort, request, stream_with_context
+from flask_login import login_required
+from app.db_connect import get_db, release_connection
+from app.functions import conditional_get
+from app.summaries import OVERDUE_COLUMNS
+from datetime import date, datetime
+from decimal import Decimal
+import csv
+import io
+import json
+import zlib
+
+import pymysql.cursors
+
+exports = Blueprint('exports', __name__)
+
+# Rows serialized between writes to the response, and the gzip level for ?gzip=1
+EXPORT_FLUSH_ROWS = 500
+EXPORT_GZIP_LEVEL = 6
+
+RENTAL_COLUMNS = ('rental_id', 'rental_date', 'due_date', 'return_date', 'status', 'subtotal', 'late_fee',
+                  'total_cost', 'notes', 'customer_id', 'customer_first_name', 'customer_last_name',
+                  'employee_id', 'rental_detail_id', 'equipment_id', 'equipment_name', 'quantity',
+                  'daily_rate', 'days_rented', 'line_total')
+# Per-line columns, nested under each rental's "lines" in the JSON export
+RENTAL_LINE_COLUMNS = ('rental_detail_id', 'equipment_id', 'equipment_name', 'quantity', 'daily_rate',
+                       'days_rented', 'line_total')
+CUSTOMER_COLUMNS = ('customer_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state',
+                    'zip_code', 'drivers_license', 'is_archived', 'created_at')
+EQUIPMENT_COLUMNS = ('equipment_id', 'equipment_name', 'equipment_type', 'description', 'daily_rate',
+                     'condition_status', 'availability_status', 'purchase_date', 'serial_number',
+                     'is_archived', 'created_at')
+
+# ?status= values accepted by the rental export, matching the rental list's tabs
+RENTAL_STATUS_FILTERS = {
+    'active': ('Active', 'Overdue'),
+    'overdue': ('Overdue',),
+    'completed': ('Completed',),
+    'all': ('Active', 'Overdue', 'Completed'),
+}
+
+def _json_default(value):
+    """json.dumps fallback for the column types MySQL returns: dates as ISO strings, decimals as numbers"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def serialize_csv(rows, columns):
+    """Yield CSV text for an iterable of dict rows, a header line first, EXPORT_FLUSH_ROWS rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([row[column] for column in columns])
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def serialize_json(rows):
+    """Yield a JSON array of dict rows, one object per line, EXPORT_FLUSH_ROWS objects per chunk"""
+    chunk = ['[']
+    separator = '\n'
+    for count, row in enumerate(rows, 1):
+        chunk.append(separator + json.dumps(row, default=_json_default))
+        separator = ',\n'
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('\n]\n')
+    yield ''.join(chunk)
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into one gzip stream without buffering it"""
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def nest_rental_lines(rows):
+    """Fold consecutive rental/line rows (ordered by rental_id) into one dict per rental with a lines list"""
+    rental = None
+    for row in rows:
+        if rental is None or rental['rental_id'] != row['rental_id']:
+            if rental is not None:
+                yield rental
+            rental = {column: row[column] for column in RENTAL_COLUMNS if column not in RENTAL_LINE_COLUMNS}
+            rental['lines'] = []
+        if row['rental_detail_id'] is not None:
+            rental['lines'].append({column: row[column] for column in RENTAL_LINE_COLUMNS})
+    if rental is not None:
+        yield rental
+
+def stream_export(name, fmt, sql, params, columns, nest=None):
+    """
+    Run sql on an unbuffered server-side cursor and stream the result as a
+    CSV or JSON download, gzipped when the request asks for ?gzip=1.
+
+    Rows are read from MySQL as the client consumes the response, so memory
+    use does not grow with the export size. The query runs before the
+    response starts so SQL errors still produce an error page. If the stream
+    stops early (client disconnect or an error), the connection still has
+    unread rows and is discarded instead of going back to the pool.
+    """
+    compress = request.args.get('gzip') == '1'
+    db = get_db()
+    cursor = db.cursor(pymysql.cursors.SSDictCursor)
+    cursor.execute(sql, params)
+
+    def generate():
+        finished = False
+        try:
+            rows = cursor.fetchall_unbuffered()
+            if fmt == 'json':
+                chunks = serialize_json(nest(rows) if nest else rows)
+            else:
+                chunks = serialize_csv(rows, columns)
+            if compress:
+                chunks = gzip_chunks(chunks)
+            yield from chunks
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+            else:
+                conn = db.detach()
+                if conn is not None:
+                    release_connection(conn, discard=True)
+
+    filename = f"{name}-{date.today().isoformat()}.{fmt}"
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'application/json' if fmt == 'json' else 'text/csv'
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _date_arg(name):
+    """The query argument name as a date (None when absent); aborts with 400 when it is not YYYY-MM-DD"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f"{name} must be a date in YYYY-MM-DD format")
+
+def _archive_condition(alias):
+    """WHERE fragment for ?status=active|archived|all on a table with is_archived"""
+    status = request.args.get('status', 'active').lower()
+    if status == 'archived':
+        return f"{alias}.is_archived = TRUE"
+    if status == 'all':
+        return "TRUE"
+    return f"{alias}.is_archived = FALSE"
+
+@exports.route('/export/rentals.<any(csv, json):fmt>')
+@login_required
+@conditional_get('rental', 'customer', 'equipment')
+def export_rentals(fmt):
+    """Rentals with their detail lines, filtered by ?start=&end= (rental date) and ?status="""
+    statuses = RENTAL_STATUS_FILTERS.get(request.args.get('status', 'all').lower())
+    if statuses is None:
+        abort(400, description=f"status must be one of: {', '.join(RENTAL_STATUS_FILTERS)}")
+    start = _date_arg('start')
+    end = _date_arg('end')
+
+    conditions = [f"r.status IN ({', '.join(['%s'] * len(statuses))})"]
+    params = list(statuses)
+    if start:
+        conditions.append("r.rental_date >= %s")
+        params.append(start)
+    if end:
+        conditions.append("r.rental_date <= %s")
+        params.append(end)
+
+    sql = f"""
+        SELECT
+            r.rental_id, r.rental_date, r.due_date, r.return_date, r.status,
+            r.subtotal, r.late_fee, r.total_cost, r.notes,
+            r.customer_id, c.first_name as customer_first_name, c.last_name as customer_last_name,
+            r.employee_id,
+            rd.rental_detail_id, rd.equipment_id, e.equipment_name,
+            rd.quantity, rd.daily_rate, rd.days_rented, rd.line_total
+        FROM rental r
+        JOIN customer c ON r.customer_id = c.customer_id
+        LEFT JOIN rental_detail rd ON r.rental_id = rd.rental_id
+        LEFT JOIN equipment e ON rd.equipment_id = e.equipment_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY r.rental_id, rd.rental_detail_id
+    """
+    return stream_export('rentals', fmt, sql, params, RENTAL_COLUMNS, nest=nest_rental_lines)
+
+@exports.route('/export/customers.<any(csv, json):fmt>')
+@login_required
+@conditional_get('customer')
+def export_customers(fmt):
+    """Customers, filtered by ?status=active|archived|all"""
+    sql = f"""
+        SELECT {', '.join('c.' + column for column in CUSTOMER_COLUMNS)}
+        FROM customer c
+        WHERE {_archive_condition('c')}
+        ORDER BY c.customer_id
+    """
+    return stream_export('customers', fmt, sql, (), CUSTOMER_COLUMNS)
+
+@exports.route('/export/equipment.<any(csv, json):fmt>')
+@login_required
+@conditional_get('equipment', 'rental')
+def export_equipment(fmt):
+    """Equipment, filtered by ?status=active|archived|all"""
+    sql = f"""
+        SELECT {', '.join('e.' + column for column in EQUIPMENT_COLUMNS)}
+        FROM equipment e
+        WHERE {_archive_condition('e')}
+        ORDER BY e.equipment_id
+    """
+    return stream_export('equipment', fmt, sql, (), EQUIPMENT_COLUMNS)
+
+@exports.route('/export/overdue.<any(csv, json):fmt>')
+@login_required
+@conditional_get('rental', 'customer', 'equipment')
+def export_overdue(fmt):
+    """Collections call list: overdue rentals with customer contact details, longest overdue first"""
+    sql = f"""
+        SELECT {', '.join(OVERDUE_COLUMNS)}
+        FROM overdue_rental
+        ORDER BY due_date, rental_id
+    """
+    return stream_export('overdue', fmt, sql, (), OVERDUE_COLUMNS)
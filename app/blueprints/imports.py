@@ -0,0 +1,394 @@
+from flask import Blueprint, request, redirect, url_for, flash, jsonify
+from flask_login import login_required
+from app.db_connect import get_db, run_in_transaction
+from app.functions import bump_data_version, expire_search_index, rewind_rollup_for_new_equipment
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import csv
+import hashlib
+import io
+import os
+import re
+import time
+
+import click
+
+imports = Blueprint('imports', __name__)
+
+# Rows validated, deduplicated and inserted per transaction
+IMPORT_BATCH_ROWS = int(os.getenv('IMPORT_BATCH_ROWS', 1000))
+# Row errors kept per run; any beyond this are only counted
+IMPORT_MAX_ERRORS = 1000
+# Row errors shown in the flash message after an upload
+IMPORT_FLASH_ERRORS = 5
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+CONDITION_STATUSES = ('Excellent', 'Good', 'Fair', 'Poor')
+# 'Rented' is left out: an imported item has no rental holding it
+IMPORT_AVAILABILITY_STATUSES = ('Available', 'Maintenance', 'Retired')
+
+class ImportFormatError(Exception):
+    """Raised when a CSV header is missing required columns or has unknown ones"""
+
+def _text(row, column, max_length, required=False):
+    """row[column] stripped, or None when blank; raises ValueError when it is required and blank, or too long"""
+    value = (row.get(column) or '').strip()
+    if not value:
+        if required:
+            raise ValueError(f"{column} is required")
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"{column} is longer than {max_length} characters")
+    return value
+
+def _choice(row, column, choices, default):
+    """The entry of choices row[column] names (any case), or default when blank; raises ValueError otherwise"""
+    value = (row.get(column) or '').strip()
+    if not value:
+        return default
+    for choice in choices:
+        if value.lower() == choice.lower():
+            return choice
+    raise ValueError(f"{column} must be one of: {', '.join(choices)}")
+
+def validate_customer(row):
+    """Customer column values in CUSTOMER_IMPORT_COLUMNS order; raises ValueError for a bad row"""
+    email = _text(row, 'email', 100, required=True)
+    if not EMAIL_PATTERN.match(email):
+        raise ValueError(f"email {email!r} is not a valid address")
+    state = _text(row, 'state', 2)
+    return (
+        _text(row, 'first_name', 50, required=True),
+        _text(row, 'last_name', 50, required=True),
+        email,
+        _text(row, 'phone', 20, required=True),
+        _text(row, 'address', 255),
+        _text(row, 'city', 50),
+        state.upper() if state else None,
+        _text(row, 'zip_code', 10),
+        _text(row, 'drivers_license', 50),
+    )
+
+def validate_equipment(row):
+    """Equipment column values in EQUIPMENT_IMPORT_COLUMNS order; raises ValueError for a bad row"""
+    raw_rate = _text(row, 'daily_rate', 20, required=True)
+    try:
+        daily_rate = Decimal(raw_rate.lstrip('$'))
+    except InvalidOperation:
+        raise ValueError(f"daily_rate {raw_rate!r} is not a number")
+    if not daily_rate.is_finite() or daily_rate <= 0 or daily_rate.as_tuple().exponent < -2:
+        raise ValueError(f"daily_rate {raw_rate!r} must be a positive amount with at most 2 decimals")
+
+    raw_date = _text(row, 'purchase_date', 10)
+    try:
+        purchase_date = date.fromisoformat(raw_date) if raw_date else None
+    except ValueError:
+        raise ValueError(f"purchase_date {raw_date!r} must be a date in YYYY-MM-DD format")
+
+    return (
+        _text(row, 'equipment_name', 100, required=True),
+        _text(row, 'equipment_type', 50, required=True),
+        _text(row, 'description', 65535),
+        daily_rate,
+        _choice(row, 'condition_status', CONDITION_STATUSES, 'Good'),
+        _choice(row, 'availability_status', IMPORT_AVAILABILITY_STATUSES, 'Available'),
+        purchase_date,
+        _text(row, 'serial_number', 100),
+    )
+
+CUSTOMER_IMPORT_COLUMNS = ('first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state', 'zip_code',
+                           'drivers_license')
+EQUIPMENT_IMPORT_COLUMNS = ('equipment_name', 'equipment_type', 'description', 'daily_rate', 'condition_status',
+                            'availability_status', 'purchase_date', 'serial_number')
+
+def _rewind_rollup_for_equipment(cursor, rows):
+    """Let the utilization rollup fill in the days imported equipment already owned (see validate_equipment)"""
+    purchase_dates = [values[EQUIPMENT_IMPORT_COLUMNS.index('purchase_date')] for values in rows]
+    rewind_rollup_for_new_equipment(cursor, None if None in purchase_dates else min(purchase_dates))
+
+# kind -> what to import and how. `key` is the unique column rows are deduplicated on
+# (blank serial numbers are never duplicates); `search` is the typeahead index to resync;
+# `inserted(cursor, rows)`, when set, runs in each batch's transaction after its insert.
+IMPORT_KINDS = {
+    'customers': {
+        'table': 'customer',
+        'columns': CUSTOMER_IMPORT_COLUMNS,
+        'required': ('first_name', 'last_name', 'email', 'phone'),
+        'key': 'email',
+        'validate': validate_customer,
+        'search': 'customer',
+        'inserted': None,
+    },
+    'equipment': {
+        'table': 'equipment',
+        'columns': EQUIPMENT_IMPORT_COLUMNS,
+        'required': ('equipment_name', 'equipment_type', 'daily_rate'),
+        'key': 'serial_number',
+        'validate': validate_equipment,
+        'search': 'equipment',
+        'inserted': _rewind_rollup_for_equipment,
+    },
+}
+
+def check_import_header(kind, fieldnames):
+    """Raise ImportFormatError unless the CSV header has every required column and no unknown ones"""
+    spec = IMPORT_KINDS[kind]
+    fieldnames = [name.strip() for name in fieldnames or ()]
+    missing = [column for column in spec['required'] if column not in fieldnames]
+    unknown = [name for name in fieldnames if name not in spec['columns']]
+    if missing:
+        raise ImportFormatError(f"missing column(s): {', '.join(missing)}")
+    if unknown:
+        raise ImportFormatError(f"unknown column(s): {', '.join(unknown)} "
+                                f"(expected some of: {', '.join(spec['columns'])})")
+
+def import_key_for(kind, stream):
+    """sha256 of the kind and the file's bytes, identifying one import for resuming; rewinds stream"""
+    digest = hashlib.sha256(kind.encode() + b'\0')
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def new_import_stats():
+    """Zeroed counters for one import run, as import_csv returns them"""
+    return {'rows': 0, 'resumed_from': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': [],
+            'already_imported': False, 'elapsed': 0.0}
+
+def _record_error(stats, line, message):
+    """Count an invalid row, keeping its message while fewer than IMPORT_MAX_ERRORS are kept"""
+    stats['invalid'] += 1
+    if len(stats['errors']) < IMPORT_MAX_ERRORS:
+        stats['errors'].append({'line': line, 'error': message})
+
+def _load_progress(cursor, import_key):
+    """The import_progress row saved for import_key, or None for a file never imported"""
+    cursor.execute("""
+        SELECT rows_done, inserted, duplicates, invalid, completed
+        FROM import_progress
+        WHERE import_key = %s
+    """, (import_key,))
+    return cursor.fetchone()
+
+def _save_progress(cursor, import_key, kind, source, stats, completed=False):
+    """Record how far the import identified by import_key got, in the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO import_progress (import_key, kind, source, rows_done, inserted, duplicates, invalid, completed)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE rows_done = VALUES(rows_done), inserted = VALUES(inserted),
+            duplicates = VALUES(duplicates), invalid = VALUES(invalid), completed = VALUES(completed)
+    """, (import_key, kind, (source or '')[:255], stats['rows'], stats['inserted'], stats['duplicates'],
+          stats['invalid'], completed))
+
+def _import_batch(db, kind, batch, seen, stats, import_key, source):
+    """
+    Validate one batch of (line, row) pairs and insert the new rows in one transaction.
+
+    Rows are deduplicated against the rest of the file (seen) and the table;
+    the insert's ON DUPLICATE KEY no-op also absorbs rows another writer
+    added in the meantime. The progress row moves in the same transaction,
+    so a resumed import starts exactly after the last committed batch.
+    """
+    spec = IMPORT_KINDS[kind]
+    key_index = spec['columns'].index(spec['key'])
+    valid = []
+    duplicates = 0
+    for line, row in batch:
+        try:
+            values = spec['validate'](row)
+        except ValueError as e:
+            _record_error(stats, line, str(e))
+            continue
+        key = values[key_index]
+        if key is not None:
+            if key.lower() in seen:
+                duplicates += 1
+                continue
+            seen.add(key.lower())
+        valid.append(values)
+
+    table, key_column = spec['table'], spec['key']
+    columns = ', '.join(spec['columns'])
+    placeholders = ', '.join(['%s'] * len(spec['columns']))
+
+    def work(cursor):
+        keys = [values[key_index] for values in valid if values[key_index] is not None]
+        existing = set()
+        if keys:
+            cursor.execute(f"SELECT {key_column} FROM {table} WHERE {key_column} IN ({', '.join(['%s'] * len(keys))})",
+                           keys)
+            existing = {row[key_column].lower() for row in cursor.fetchall()}
+        fresh = [values for values in valid if values[key_index] is None or values[key_index].lower() not in existing]
+        inserted = 0
+        if fresh:
+            cursor.executemany(f"""
+                INSERT INTO {table} ({columns})
+                VALUES ({placeholders})
+                ON DUPLICATE KEY UPDATE {key_column} = {key_column}
+            """, fresh)
+            inserted = cursor.rowcount
+            if spec['inserted']:
+                spec['inserted'](cursor, fresh)
+        if import_key:
+            _save_progress(cursor, import_key, kind, source, dict(stats, inserted=stats['inserted'] + inserted,
+                                                                  duplicates=stats['duplicates'] + duplicates +
+                                                                  len(valid) - inserted))
+        return inserted
+
+    inserted = run_in_transaction(db, work)
+    stats['inserted'] += inserted
+    stats['duplicates'] += duplicates + len(valid) - inserted
+
+def import_csv(db, kind, text_stream, import_key=None, source=None, batch_size=IMPORT_BATCH_ROWS, progress=None):
+    """
+    Stream a CSV of customers or equipment into the database.
+
+    Reads the file batch_size rows at a time, never holding more than one
+    batch. With an import_key (see import_key_for), progress is recorded in
+    import_progress and a rerun of the same file skips the rows already
+    committed; a file that finished importing is not imported again.
+    progress(stats), when given, is called after every batch. Returns the
+    stats dict: counters for the whole file, errors for this run only.
+    Raises ImportFormatError for an unusable header.
+    """
+    started = time.perf_counter()
+    reader = csv.DictReader(text_stream, skipinitialspace=True)
+    check_import_header(kind, reader.fieldnames)
+    reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+    stats = new_import_stats()
+    done = 0
+    if import_key:
+        cursor = db.cursor()
+        previous = _load_progress(cursor, import_key)
+        cursor.close()
+        if previous:
+            if previous['completed']:
+                stats.update(rows=previous['rows_done'], inserted=previous['inserted'],
+                             duplicates=previous['duplicates'], invalid=previous['invalid'], already_imported=True)
+                return stats
+            done = previous['rows_done']
+            stats.update(resumed_from=done, inserted=previous['inserted'], duplicates=previous['duplicates'],
+                         invalid=previous['invalid'])
+
+    seen = set()
+    batch = []
+    for row in reader:
+        stats['rows'] += 1
+        if stats['rows'] <= done:
+            continue
+        batch.append((reader.line_num, row))
+        if len(batch) >= batch_size:
+            _import_batch(db, kind, batch, seen, stats, import_key, source)
+            batch = []
+            stats['elapsed'] = time.perf_counter() - started
+            if progress:
+                progress(stats)
+    if batch:
+        _import_batch(db, kind, batch, seen, stats, import_key, source)
+
+    if import_key:
+        run_in_transaction(db, lambda cursor: _save_progress(cursor, import_key, kind, source, stats, completed=True))
+    stats['elapsed'] = time.perf_counter() - started
+    bump_data_version(IMPORT_KINDS[kind]['table'], db=db)
+    expire_search_index(IMPORT_KINDS[kind]['search'])
+    return stats
+
+def describe_import(stats):
+    """One-line summary of an import's counters"""
+    summary = (f"{stats['inserted']} inserted, {stats['duplicates']} duplicate(s) skipped, "
+               f"{stats['invalid']} invalid row(s)")
+    if stats['resumed_from']:
+        summary += f" (resumed after row {stats['resumed_from']})"
+    return summary
+
+@imports.cli.command('load')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, default=IMPORT_BATCH_ROWS, show_default=True,
+              help='Rows per transaction.')
+@click.option('--restart', is_flag=True, help='Ignore saved progress and start from the first row.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Write rejected rows (line, error) to this CSV file.')
+def import_command(kind, path, batch_size, restart, errors_path):
+    """Bulk import customers or equipment from a CSV file, resuming an interrupted run."""
+    db = get_db()
+    with open(path, 'rb') as raw:
+        import_key = import_key_for(kind, raw)
+    if restart:
+        run_in_transaction(db, lambda cursor: cursor.execute(
+            "DELETE FROM import_progress WHERE import_key = %s", (import_key,)))
+
+    def report(stats):
+        rate = (stats['rows'] - stats['resumed_from']) / stats['elapsed'] if stats['elapsed'] else 0
+        print(f"[INFO] {stats['rows']} rows: {describe_import(stats)} ({rate:,.0f} rows/s)")
+
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as text_stream:
+            stats = import_csv(db, kind, text_stream, import_key=import_key, source=os.path.basename(path),
+                               batch_size=batch_size, progress=report)
+    except ImportFormatError as e:
+        print(f"[ERROR] {path}: {e}")
+        raise SystemExit(1)
+    except Exception as e:
+        print(f"[ERROR] Import stopped: {e}. Rerun the same command to resume after the last committed batch.")
+        raise SystemExit(1)
+
+    if stats['already_imported']:
+        print(f"[INFO] {path} was already imported: {describe_import(stats)}. Use --restart to import it again.")
+        return
+    for error in stats['errors'][:20]:
+        print(f"  line {error['line']}: {error['error']}")
+    if errors_path and stats['errors']:
+        with open(errors_path, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(('line', 'error'))
+            writer.writerows((error['line'], error['error']) for error in stats['errors'])
+        print(f"[INFO] {len(stats['errors'])} row error(s) written to {errors_path}")
+    rate = (stats['rows'] - stats['resumed_from']) / stats['elapsed'] if stats['elapsed'] else 0
+    print(f"[OK] {kind}: {describe_import(stats)} in {stats['elapsed']:.1f}s ({rate:,.0f} rows/s)")
+
+@imports.route('/import/<any(customers, equipment):kind>', methods=['POST'])
+@login_required
+def import_upload(kind):
+    """
+    Import an uploaded CSV (form field `file`). Re-uploading a file after an
+    interrupted import resumes it. Answers with JSON for ?format=json,
+    otherwise flashes a summary and returns to the list page.
+    """
+    wants_json = request.args.get('format') == 'json'
+    list_page = url_for('rentals.list_customers' if kind == 'customers' else 'rentals.list_equipment')
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        if wants_json:
+            return jsonify({'error': 'no file uploaded'}), 400
+        flash('Choose a CSV file to import.', 'warning')
+        return redirect(list_page)
+
+    import_key = import_key_for(kind, upload.stream)
+    try:
+        stats = import_csv(get_db(), kind, io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''),
+                           import_key=import_key, source=upload.filename)
+    except ImportFormatError as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(f'Cannot import {upload.filename}: {e}', 'danger')
+        return redirect(list_page)
+    except Exception as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 500
+        flash(f'Import of {upload.filename} stopped: {e}. Upload the same file again to resume.', 'danger')
+        return redirect(list_page)
+
+    if wants_json:
+        return jsonify(stats)
+    if stats['already_imported']:
+        flash(f'{upload.filename} was already imported: {describe_import(stats)}.', 'info')
+        return redirect(list_page)
+    flash(f'Imported {upload.filename}: {describe_import(stats)}.',
+          'success' if not stats['invalid'] else 'warning')
+    for error in stats['errors'][:IMPORT_FLASH_ERRORS]:
+        flash(f"Line {error['line']}: {error['error']}", 'warning')
+    if len(stats['errors']) > IMPORT_FLASH_ERRORS:
+        flash(f"...and {len(stats['errors']) - IMPORT_FLASH_ERRORS} more row error(s).", 'warning')
+    return redirect(list_page)
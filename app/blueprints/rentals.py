@@ -1,7 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from app.db_connect import get_db
-from datetime import datetime, date
+from markupsafe import Markup
+from app.db_connect import get_db, run_in_transaction
+from app.functions import (bump_data_version, cached_fragment, conditional_get, ensure_search_index, expire_search_index,
+                           fetch_keyset_page, parse_page_size, refresh_search_entries, refresh_search_entry,
+                           register_search_source, rewind_rental_months, rewind_rollup_for_new_equipment,
+                           rewind_rollup_for_purchase_date, rewind_rollup_watermark, search_index_query)
+from app.models import Customer, Equipment, Rental, fetch_models, tuple_cursor
+from app.summaries import (LATE_FEE_RATE, OVERDUE_COLUMNS, OVERDUE_SOURCE, check_overdue_rentals, check_rental_summaries,
+                           rebuild_overdue_rentals, rebuild_rental_summaries)
+from datetime import datetime, date, timedelta
+from bisect import bisect_right
+from collections import Counter
+import os
+import threading
+import time
 
 rentals = Blueprint('rentals', __name__)
 
@@ -14,79 +27,960 @@ def calculate_late_fee(subtotal, due_date, return_date=None):
 
     if check_date > due_date:
         # Apply 10% late fee
-        return round(subtotal * 0.10, 2)
+        return round(subtotal * LATE_FEE_RATE, 2)
     return 0.00
 
-@rentals.route('/rentals')
-@login_required
-def list_rentals():
+def apply_rentals_to_summaries(cursor, rental_ids, sign, include_lines=True):
+    """
+    Add (sign=1) or remove (sign=-1) the given rentals' contribution to the summary tables.
+
+    Call with -1 before a write changes the rentals and with 1 after it, inside
+    the same transaction, so rental_status_summary, rental_customer_summary and
+    (unless include_lines is False, for writes that leave rental_detail alone)
+    rental_equipment_summary move atomically with the rentals themselves.
+    Costs three statements however many rentals are passed.
+    """
+    if not rental_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(rental_ids))
+    rental_ids = list(rental_ids)
+
+    cursor.execute(f"""
+        INSERT INTO rental_status_summary (status, rental_count, total_cost, late_fee_total)
+        SELECT * FROM (
+            SELECT status, %s * COUNT(*) as delta_count, %s * SUM(total_cost) as delta_cost,
+                   %s * SUM(late_fee) as delta_fee
+            FROM rental
+            WHERE rental_id IN ({placeholders})
+            GROUP BY status
+        ) as src
+        ON DUPLICATE KEY UPDATE
+            rental_count = rental_count + src.delta_count,
+            total_cost = total_cost + src.delta_cost,
+            late_fee_total = late_fee_total + src.delta_fee
+    """, [sign, sign, sign] + rental_ids)
+
+    cursor.execute(f"""
+        INSERT INTO rental_customer_summary (customer_id, total_rentals, total_spent)
+        SELECT * FROM (
+            SELECT customer_id, %s * COUNT(*) as delta_rentals, %s * SUM(total_cost) as delta_spent
+            FROM rental
+            WHERE rental_id IN ({placeholders})
+            GROUP BY customer_id
+        ) as src
+        ON DUPLICATE KEY UPDATE
+            total_rentals = total_rentals + src.delta_rentals,
+            total_spent = total_spent + src.delta_spent
+    """, [sign, sign] + rental_ids)
+
+    if include_lines:
+        cursor.execute(f"""
+            INSERT INTO rental_equipment_summary (equipment_id, times_rented, total_revenue)
+            SELECT * FROM (
+                SELECT equipment_id, %s * COUNT(*) as delta_lines, %s * SUM(line_total) as delta_revenue
+                FROM rental_detail
+                WHERE rental_id IN ({placeholders})
+                GROUP BY equipment_id
+            ) as src
+            ON DUPLICATE KEY UPDATE
+                times_rented = times_rented + src.delta_lines,
+                total_revenue = total_revenue + src.delta_revenue
+        """, [sign, sign] + rental_ids)
+
+def apply_rental_to_summaries(cursor, rental_id, sign, include_lines=True):
+    """Single-rental form of apply_rentals_to_summaries"""
+    apply_rentals_to_summaries(cursor, [rental_id], sign, include_lines)
+
+# Materialized overdue list (overdue_rental): one row per Overdue rental with
+# the customer's contact details and the equipment names already joined, so
+# the dashboard and the collections export read it in due-date order off
+# idx_overdue_due instead of grouping four tables on every load. Its columns,
+# source query and full rebuild live in app.summaries, which bulk loaders share.
+OVERDUE_REFRESH_INTERVAL = int(os.getenv('OVERDUE_REFRESH_INTERVAL', 0))
+
+def refresh_overdue_rentals(cursor, rental_ids):
+    """
+    Re-derive the overdue_rental rows of the given rentals from the live join.
+
+    Call after a write that changes a rental's status, totals or lines, inside
+    the same transaction. Rentals that are no longer Overdue (or no longer
+    exist) lose their row. Costs two statements however many ids are passed.
+    """
+    if not rental_ids:
+        return
+    rental_ids = list(rental_ids)
+    placeholders = ', '.join(['%s'] * len(rental_ids))
+    cursor.execute(f"DELETE FROM overdue_rental WHERE rental_id IN ({placeholders})", rental_ids)
+    cursor.execute(f"INSERT INTO overdue_rental ({', '.join(OVERDUE_COLUMNS)}) "
+                   + OVERDUE_SOURCE.format(condition=f"AND r.rental_id IN ({placeholders})"), rental_ids)
+
+def refresh_overdue_for(cursor, column, value):
+    """Refresh the overdue rows that show a customer (column='customer_id') or an equipment item (column='equipment_id')"""
+    if column == 'customer_id':
+        cursor.execute("SELECT rental_id FROM overdue_rental WHERE customer_id = %s", (value,))
+    else:
+        cursor.execute("""
+            SELECT DISTINCT o.rental_id
+            FROM rental_detail rd
+            JOIN overdue_rental o ON rd.rental_id = o.rental_id
+            WHERE rd.equipment_id = %s
+        """, (value,))
+    refresh_overdue_rentals(cursor, [row['rental_id'] for row in cursor.fetchall()])
+
+@rentals.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    """Recompute the rental summary tables from scratch, then verify them."""
     db = get_db()
     cursor = db.cursor()
+    try:
+        rebuild_rental_summaries(cursor)
+        db.commit()
+        print("[OK] Summary tables rebuilt")
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Rebuild failed: {e}")
+        raise SystemExit(1)
+    bump_data_version('rental', db=db)
+    check_summaries_command.callback()
+
+# Overdue sweeper. Rentals still out after their due date are moved from
+# 'Active' to 'Overdue' in chunks, each its own short transaction, with the
+# flat late fee written at the same time so pages can read it instead of
+# recomputing it.
+OVERDUE_SWEEP_BATCH = int(os.getenv('OVERDUE_SWEEP_BATCH', 500))
+OVERDUE_SWEEP_INTERVAL = int(os.getenv('OVERDUE_SWEEP_INTERVAL', 0))
+
+def _sweep_overdue_chunk(cursor, today, batch_size, skip_locked=True):
+    """Mark up to batch_size past-due Active rentals Overdue; returns the ids changed"""
+    # rental_date <= due_date, so the range on idx_rental_dates(rental_date, due_date)
+    # bounds the scan and due_date is filtered from the same index entries.
+    # SKIP LOCKED lets several workers' sweepers run side by side, and steps over a
+    # rental that a return or reactivation has locked (see _lock_rental).
+    cursor.execute(f"""
+        SELECT rental_id, rental_date
+        FROM rental
+        WHERE rental_date < %s AND due_date < %s AND status = 'Active'
+        ORDER BY rental_date, due_date
+        LIMIT %s
+        FOR UPDATE{' SKIP LOCKED' if skip_locked else ''}
+    """, (today, today, batch_size))
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+    rental_ids = [row['rental_id'] for row in rows]
+
+    placeholders = ', '.join(['%s'] * len(rental_ids))
+    apply_rentals_to_summaries(cursor, rental_ids, -1, include_lines=False)
+    cursor.execute(f"""
+        UPDATE rental
+        SET status = 'Overdue',
+            late_fee = ROUND(subtotal * %s, 2),
+            total_cost = subtotal + ROUND(subtotal * %s, 2)
+        WHERE rental_id IN ({placeholders})
+    """, [LATE_FEE_RATE, LATE_FEE_RATE] + rental_ids)
+    apply_rentals_to_summaries(cursor, rental_ids, 1, include_lines=False)
+    refresh_overdue_rentals(cursor, rental_ids)
+    # The late fees count in the months the rentals started (rows are in rental_date order)
+    rewind_rental_months(cursor, rows[0]['rental_date'], today)
+    return rental_ids
+
+def _start_due_bookings(cursor, today):
+    """
+    Mark Rented the Available equipment of every unreturned rental that has
+    started by today (future bookings leave the flag alone until then).
+    Returns the number of items changed.
+    """
+    cursor.execute("""
+        UPDATE equipment
+        SET availability_status = 'Rented'
+        WHERE availability_status = 'Available'
+          AND equipment_id IN (
+              SELECT rd.equipment_id
+              FROM rental r
+              JOIN rental_detail rd ON r.rental_id = rd.rental_id
+              WHERE r.status IN ('Active', 'Overdue') AND r.rental_date <= %s
+          )
+    """, (today,))
+    return cursor.rowcount
+
+def sweep_overdue_rentals(db, batch_size=OVERDUE_SWEEP_BATCH, today=None):
+    """
+    Move every past-due Active rental to Overdue, committing one chunk at a time.
 
+    Chunks skip rows other transactions hold until none are left, then a
+    last pass waits for those locks and picks up whatever is still due.
+    Also marks Rented the equipment of bookings that have started since the
+    last sweep (see _start_due_bookings). Returns the number of rentals
+    marked overdue.
+    """
+    today = today or date.today()
+    if run_in_transaction(db, lambda cursor: _start_due_bookings(cursor, today)):
+        bump_data_version('equipment', db=db)
+        expire_search_index('equipment')
+    swept = 0
+    skip_locked = True
+    while True:
+        rental_ids = run_in_transaction(
+            db, lambda cursor: _sweep_overdue_chunk(cursor, today, batch_size, skip_locked))
+        swept += len(rental_ids)
+        if rental_ids:
+            continue
+        if not skip_locked:
+            break
+        # A short or empty chunk may only mean rows were locked and skipped: finish
+        # with a pass that waits for those locks, so no past-due rental is left behind
+        skip_locked = False
+    if swept:
+        bump_data_version('rental', db=db)
+    return swept
+
+@rentals.cli.command('sweep-overdue')
+def sweep_overdue_command():
+    """Mark past-due Active rentals Overdue and apply their late fees."""
+    try:
+        swept = sweep_overdue_rentals(get_db())
+    except Exception as e:
+        print(f"[ERROR] Overdue sweep failed: {e}")
+        raise SystemExit(1)
+    print(f"[OK] {swept} rental(s) marked overdue")
+
+def start_overdue_sweeper(app, interval=OVERDUE_SWEEP_INTERVAL):
+    """
+    Run sweep_overdue_rentals every `interval` seconds on a daemon thread.
+
+    Does nothing when interval is 0 (the default), leaving the sweep to the
+    CLI command or cron. Returns the thread, or None if none was started.
+    """
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    swept = sweep_overdue_rentals(get_db())
+                    if swept:
+                        print(f"[INFO] Overdue sweeper marked {swept} rental(s) overdue")
+                except Exception as e:
+                    print(f"[ERROR] Overdue sweep failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='overdue-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+def repair_overdue_rentals(db):
+    """
+    Rebuild overdue_rental if it has drifted from the live join, e.g. after
+    writes made outside the app. Returns the mismatches that were found.
+    """
+    cursor = db.cursor()
+    mismatches = check_overdue_rentals(cursor)
+    cursor.close()
+    db.commit()  # end the read snapshot before rebuilding
+    if mismatches:
+        run_in_transaction(db, rebuild_overdue_rentals)
+        bump_data_version('rental', db=db)
+    return mismatches
+
+def start_overdue_refresher(app, interval=OVERDUE_REFRESH_INTERVAL):
+    """
+    Run repair_overdue_rentals every `interval` seconds on a daemon thread.
+
+    Does nothing when interval is 0 (the default), leaving it to
+    `flask rentals refresh-overdue` or cron. Returns the thread, or None.
+    """
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    mismatches = repair_overdue_rentals(get_db())
+                    if mismatches:
+                        print(f"[INFO] Overdue refresher rebuilt overdue_rental ({len(mismatches)} mismatch(es))")
+                except Exception as e:
+                    print(f"[ERROR] Overdue refresh failed: {e}")
+
+    thread = threading.Thread(target=run, name='overdue-refresher', daemon=True)
+    thread.start()
+    return thread
+
+@rentals.cli.command('refresh-overdue')
+def refresh_overdue_command():
+    """Rebuild the overdue_rental table from the live join, then verify it."""
+    db = get_db()
+    try:
+        run_in_transaction(db, rebuild_overdue_rentals)
+    except Exception as e:
+        print(f"[ERROR] Overdue refresh failed: {e}")
+        raise SystemExit(1)
+    bump_data_version('rental', db=db)
+    print("[OK] overdue_rental rebuilt")
+    check_overdue_command.callback()
+
+@rentals.cli.command('check-overdue')
+def check_overdue_command():
+    """Verify the overdue_rental table against the live join."""
+    cursor = get_db().cursor()
+    mismatches = check_overdue_rentals(cursor)
+    cursor.close()
+    for mismatch in mismatches:
+        print(f"[ERROR] {mismatch}")
+    if mismatches:
+        raise SystemExit(1)
+    print("[OK] overdue_rental matches the live join")
+
+@rentals.cli.command('check-summaries')
+def check_summaries_command():
+    """Verify the rental summary tables against live GROUP BY results."""
+    cursor = get_db().cursor()
+    mismatches = check_rental_summaries(cursor)
+    cursor.close()
+    for mismatch in mismatches:
+        print(f"[ERROR] {mismatch}")
+    if mismatches:
+        raise SystemExit(1)
+    print("[OK] Summary tables match live aggregates")
+
+@rentals.route('/rentals')
+@login_required
+@conditional_get('rental', 'customer')
+def list_rentals():
     # Get status filter from query parameter (default to 'active')
     status_filter = request.args.get('status', 'active').lower()
+    per_page = parse_page_size(request.args.get('per_page'))
 
     # Build WHERE clause based on filter
     if status_filter == 'completed':
-        where_clause = "WHERE r.status = 'Completed'"
+        status_condition = "r.status = 'Completed'"
     else:
-        where_clause = "WHERE r.status IN ('Active', 'Overdue')"
+        status_condition = "r.status IN ('Active', 'Overdue')"
+
+    token = request.args.get('page')
+
+    def render_table():
+        db = get_db()
+        cursor = tuple_cursor(db)
+
+        # Get one page of rentals with customer and employee information
+        page = fetch_keyset_page(cursor, """
+            SELECT
+                r.rental_id,
+                r.rental_date,
+                r.due_date,
+                r.return_date,
+                r.status,
+                r.subtotal,
+                r.late_fee,
+                r.total_cost,
+                r.notes,
+                c.first_name as customer_first_name,
+                c.last_name as customer_last_name,
+                c.phone as customer_phone,
+                c.email as customer_email,
+                e.first_name as employee_first_name,
+                e.last_name as employee_last_name
+            FROM rental r
+            JOIN customer c ON r.customer_id = c.customer_id
+            JOIN employee e ON r.employee_id = e.employee_id
+        """, [status_condition],
+            order_columns=['r.rental_date', 'r.rental_id'], key_fields=['rental_date', 'rental_id'],
+            descending=True, page_size=per_page, token=token,
+            fetch_rows=lambda cursor: fetch_models(cursor, Rental))
+        cursor.close()
+        return Markup(render_template('rentals/rentals_table.html', rentals=page['rows'], page=page,
+                                      per_page=per_page, status_filter=status_filter))
+
+    # Overdue badges count days up to today, so the date is part of the key
+    table_html = cached_fragment('rentals', (status_filter, per_page, token, date.today()),
+                                 ('rental', 'customer'), render_table)
+    return render_template('rentals/list.html', table_html=table_html, status_filter=status_filter)
 
-    # Get rentals with customer and employee information
+def is_bookable(availability_status, is_archived):
+    """
+    The in-service rule every booking path shares: a non-archived item that is
+    Available or Rented can take bookings (Maintenance and Retired items
+    cannot). Whether it is free for a given window is decided by its rentals,
+    not by this flag: a Rented item can still be booked after it comes back.
+    """
+    return availability_status in ('Available', 'Rented') and not is_archived
+
+class EquipmentUnavailableError(Exception):
+    """Raised when equipment being claimed for a rental is missing, out of service or already booked"""
+
+    def __init__(self, equipment_ids):
+        self.equipment_ids = sorted(equipment_ids)
+        super().__init__('Equipment no longer available: ' +
+                         ', '.join(f'#{equip_id}' for equip_id in self.equipment_ids))
+
+def booked_equipment(cursor, equipment_ids, start, end, today=None, exclude_rental_id=None):
+    """
+    Ids among equipment_ids with a rental overlapping the inclusive window [start, end].
+
+    A returned rental holds its items from rental_date until the day before
+    return_date (they are back on the day they come in); an unreturned one,
+    future bookings included, holds them through its due date, or through
+    today if it is running late. This is the rule the availability index
+    mirrors. The read is a locking one (FOR SHARE) so it sees rentals
+    committed after the transaction's snapshot was taken.
+    """
+    today = today or date.today()
+    placeholders = ', '.join(['%s'] * len(equipment_ids))
+    params = list(equipment_ids) + [end, start, today, start]
+    exclude_sql = ''
+    if exclude_rental_id is not None:
+        exclude_sql = 'AND r.rental_id <> %s'
+        params.append(exclude_rental_id)
     cursor.execute(f"""
-        SELECT
-            r.rental_id,
-            r.rental_date,
-            r.due_date,
-            r.return_date,
-            r.status,
-            r.subtotal,
-            r.late_fee,
-            r.total_cost,
-            r.notes,
-            c.first_name as customer_first_name,
-            c.last_name as customer_last_name,
-            c.phone as customer_phone,
-            c.email as customer_email,
-            e.first_name as employee_first_name,
-            e.last_name as employee_last_name,
-            DATEDIFF(CURDATE(), r.due_date) as days_overdue
-        FROM rental r
-        JOIN customer c ON r.customer_id = c.customer_id
-        JOIN employee e ON r.employee_id = e.employee_id
-        {where_clause}
-        ORDER BY r.rental_date DESC
-    """)
+        SELECT DISTINCT rd.equipment_id
+        FROM rental_detail rd
+        JOIN rental r ON r.rental_id = rd.rental_id
+        WHERE rd.equipment_id IN ({placeholders})
+          AND r.rental_date <= %s
+          AND (r.return_date > GREATEST(r.rental_date, %s)
+               OR (r.return_date IS NULL AND GREATEST(r.due_date, %s) >= %s))
+          {exclude_sql}
+        FOR SHARE
+    """, params)
+    return {row['equipment_id'] for row in cursor.fetchall()}
+
+def claim_equipment(cursor, equipment_ids, start, end, today=None, exclude_rental_id=None):
+    """
+    Atomically book a set of equipment for the window [start, end], or nothing.
+
+    The equipment rows are locked in equipment_id order (so concurrent claims
+    queue instead of deadlocking, and the second one sees the first one's
+    rental), then every item must be in service (is_bookable) and have no
+    rental overlapping the window (booked_equipment). Items whose booking has
+    already started are marked Rented; a future booking leaves the flag alone
+    until the overdue sweeper starts it. Raises EquipmentUnavailableError with
+    the offending ids; the caller rolls back. Returns {equipment_id: daily_rate}.
+    """
+    today = today or date.today()
+    unique_ids = sorted({int(equip_id) for equip_id in equipment_ids})
+    if not unique_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(unique_ids))
+    cursor.execute(f"""
+        SELECT equipment_id, daily_rate, availability_status, is_archived
+        FROM equipment
+        WHERE equipment_id IN ({placeholders})
+        ORDER BY equipment_id
+        FOR UPDATE
+    """, unique_ids)
+    rows = cursor.fetchall()
+    claimable = {row['equipment_id']: float(row['daily_rate']) for row in rows
+                 if is_bookable(row['availability_status'], row['is_archived'])}
+    unavailable = set(unique_ids) - set(claimable)
+    if claimable:
+        unavailable |= booked_equipment(cursor, sorted(claimable), start, end, today, exclude_rental_id)
+    if unavailable:
+        raise EquipmentUnavailableError(unavailable)
+
+    if start <= today:
+        cursor.execute(f"UPDATE equipment SET availability_status = 'Rented' WHERE equipment_id IN ({placeholders})",
+                       unique_ids)
+    return claimable
+
+def _as_date(value):
+    """A date from a date or a YYYY-MM-DD string (form fields arrive as strings)"""
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+def insert_rental(cursor, customer_id, employee_id, rental_date, due_date, notes, equipment_ids, days_rented):
+    """
+    Write a rental, its detail lines and the equipment status changes.
+
+    The statement count does not depend on the number of items:
+    claim_equipment() locks and checks every item for the rental's dates
+    while reading its daily rate, and one multi-row INSERT adds the detail
+    lines. rental_date and due_date are dates or YYYY-MM-DD strings;
+    days_rented lines up with equipment_ids (missing entries default to 1
+    day). Returns the new rental_id; raises ValueError if an item is listed
+    twice or the dates are reversed, and EquipmentUnavailableError if any
+    item cannot be claimed. The caller owns the transaction.
+    """
+    counts = Counter(int(equip_id) for equip_id in equipment_ids)
+    repeated = sorted(equip_id for equip_id, count in counts.items() if count > 1)
+    if repeated:
+        raise ValueError('Equipment selected more than once: ' + ', '.join(f'#{equip_id}' for equip_id in repeated))
+    rental_date = _as_date(rental_date)
+    due_date = _as_date(due_date)
+    if due_date < rental_date:
+        raise ValueError('The due date must not be before the rental date.')
+    rates = claim_equipment(cursor, equipment_ids, rental_date, due_date)
+
+    # Calculate subtotal
+    subtotal = 0
+    rental_details = []
+
+    for i, equip_id in enumerate(equipment_ids):
+        daily_rate = rates[int(equip_id)]
+        days = int(days_rented[i]) if i < len(days_rented) else 1
+        line_total = daily_rate * days
+        subtotal += line_total
+        rental_details.append((int(equip_id), daily_rate, days, line_total))
+
+    # Create rental record
+    cursor.execute("""
+        INSERT INTO rental (customer_id, employee_id, rental_date, due_date, status, subtotal, late_fee, total_cost, notes)
+        VALUES (%s, %s, %s, %s, 'Active', %s, 0.00, %s, %s)
+    """, (customer_id, employee_id, rental_date, due_date, subtotal, subtotal, notes))
+
+    rental_id = cursor.lastrowid
+
+    # Create all rental detail records in one multi-row INSERT
+    # (every VALUES slot is a placeholder so PyMySQL can batch the rows)
+    cursor.executemany("""
+        INSERT INTO rental_detail (rental_id, equipment_id, quantity, daily_rate, days_rented, line_total)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(rental_id, equip_id, 1, daily_rate, days, line_total)
+          for equip_id, daily_rate, days, line_total in rental_details])
+
+    apply_rental_to_summaries(cursor, rental_id, 1)
+    # A back-dated rental changes days the utilization rollup and the analytics cache already cover
+    rewind_rollup_watermark(cursor, rental_date)
+    rewind_rental_months(cursor, rental_date)
+    return rental_id
+
+class RentalStatusError(Exception):
+    """Raised when a rental is not in a status the requested change applies to"""
+
+def _lock_rental(cursor, rental_id):
+    """
+    Read a rental's row under an exclusive lock (None if it does not exist).
 
-    filtered_rentals = cursor.fetchall()
+    Every status change goes through this first, so two requests changing
+    the same rental (or one and the overdue sweeper) queue on the row and
+    the second one sees the first one's result.
+    """
+    cursor.execute("""
+        SELECT rental_id, rental_date, due_date, return_date, subtotal, status
+        FROM rental
+        WHERE rental_id = %s
+        FOR UPDATE
+    """, (rental_id,))
+    return cursor.fetchone()
 
-    # Get customers for dropdown (only non-archived)
+def complete_rental(cursor, rental_id, return_date):
+    """
+    Return a rental: set its return date, late fee and total, move its totals
+    between summary rows and make its equipment Available again (unless
+    another started rental has it out). Returns the late fee, or None if the
+    rental does not exist; raises RentalStatusError if it was already
+    returned. The caller owns the transaction.
+    """
+    rental = _lock_rental(cursor, rental_id)
+    if rental is None:
+        return None
+    if rental['status'] == 'Completed':
+        raise RentalStatusError('This rental has already been returned.')
+
+    late_fee = calculate_late_fee(rental['subtotal'], rental['due_date'], return_date)
+    apply_rental_to_summaries(cursor, rental_id, -1, include_lines=False)
     cursor.execute("""
-        SELECT customer_id, first_name, last_name, email
-        FROM customer
-        WHERE is_archived = FALSE
-        ORDER BY last_name, first_name
+        UPDATE rental
+        SET return_date = %s,
+            status = 'Completed',
+            late_fee = %s,
+            total_cost = %s
+        WHERE rental_id = %s
+    """, (return_date, late_fee, rental['subtotal'] + late_fee, rental_id))
+    apply_rental_to_summaries(cursor, rental_id, 1, include_lines=False)
+    refresh_overdue_rentals(cursor, [rental_id])
+    # The fee counts in the month the rental started, its equipment days up to the return
+    rewind_rental_months(cursor, rental['rental_date'])
+
+    # Items go back to Available unless another started rental still has them out
+    # (returning a booking that never started must not free an item someone else holds)
+    cursor.execute("""
+        UPDATE equipment
+        SET availability_status = 'Available'
+        WHERE availability_status = 'Rented'
+          AND equipment_id IN (SELECT equipment_id FROM rental_detail WHERE rental_id = %s)
+          AND equipment_id NOT IN (
+              SELECT od.equipment_id
+              FROM rental_detail od
+              JOIN rental o ON o.rental_id = od.rental_id
+              WHERE o.rental_id <> %s AND o.return_date IS NULL AND o.rental_date <= %s
+          )
+    """, (rental_id, rental_id, return_date))
+    return late_fee
+
+def reopen_rental(cursor, rental_id):
+    """
+    Reactivate a returned rental: clear its return date and late fee, move its
+    totals between summary rows and claim its equipment again for the rental's
+    dates (through today if it is past due). Returns False if the rental does
+    not exist; raises RentalStatusError unless it is Completed and
+    EquipmentUnavailableError if an item has been booked since. The caller
+    owns the transaction.
+    """
+    rental = _lock_rental(cursor, rental_id)
+    if rental is None:
+        return False
+    if rental['status'] != 'Completed':
+        raise RentalStatusError('Only completed rentals can be reactivated.')
+
+    apply_rental_to_summaries(cursor, rental_id, -1, include_lines=False)
+    cursor.execute("""
+        UPDATE rental
+        SET status = 'Active',
+            return_date = NULL,
+            late_fee = 0.00,
+            total_cost = subtotal
+        WHERE rental_id = %s
+    """, (rental_id,))
+    apply_rental_to_summaries(cursor, rental_id, 1, include_lines=False)
+    if rental['return_date']:
+        # The equipment now counts as out since the old return date
+        rewind_rollup_watermark(cursor, rental['return_date'])
+    rewind_rental_months(cursor, rental['rental_date'])
+
+    cursor.execute("SELECT equipment_id FROM rental_detail WHERE rental_id = %s", (rental_id,))
+    today = date.today()
+    claim_equipment(cursor, [row['equipment_id'] for row in cursor.fetchall()], rental['rental_date'],
+                    max(rental['due_date'], today), today, exclude_rental_id=rental_id)
+    return True
+
+def remove_rental(cursor, rental_id):
+    """
+    Delete a returned rental and take it out of the summary rows. Returns
+    False if the rental does not exist; raises RentalStatusError while it is
+    still Active or Overdue. The caller owns the transaction.
+    """
+    rental = _lock_rental(cursor, rental_id)
+    if rental is None:
+        return False
+    if rental['status'] in ('Active', 'Overdue'):
+        raise RentalStatusError('Cannot delete active rental. Please return it first.')
+
+    apply_rental_to_summaries(cursor, rental_id, -1)
+    rewind_rollup_watermark(cursor, rental['rental_date'])
+    rewind_rental_months(cursor, rental['rental_date'])
+    cursor.execute("DELETE FROM rental WHERE rental_id = %s", (rental_id,))
+    return True
+
+# Date-range availability index.
+#
+# Bookings are intervals: a rental holds its items from rental_date through
+# its due date (or through today while it is late), and a returned one until
+# the day before it came back. A rental may start in the future, in which
+# case the item stays Available until then, so availability for a window is
+# decided by these intervals, not by the Available/Rented flag.
+#
+# Each equipment item gets a bucket of closed (returned) bookings sorted by
+# start date, with a running maximum of their end dates. A window [start, end]
+# overlaps some booking exactly when, among bookings starting on or before
+# `end`, the largest end date is on or after `start`: one bisect plus one
+# lookup, whatever the history length. Unreturned rentals, future bookings
+# included, live in a small per-item dict because their end (max of due date
+# and today) moves daily.
+#
+# The index is per process: this worker's rental writes update it in place,
+# and it is rebuilt from the database every AVAILABILITY_INDEX_TTL seconds to
+# pick up other workers' writes. claim_equipment() applies the same rule in
+# SQL under row locks and stays the authority at booking time.
+AVAILABILITY_INDEX_TTL = int(os.getenv('AVAILABILITY_INDEX_TTL', 300))
+_availability_lock = threading.Lock()
+_availability = {
+    'loaded_at': None,
+    'closed': {},      # equipment_id -> interval bucket (see new_interval_bucket)
+    'open': {},        # equipment_id -> {rental_id: (start, due_date)}
+    'by_rental': {},   # rental_id -> equipment ids it books
+}
+
+def new_interval_bucket():
+    """Empty sorted-interval bucket: parallel lists ordered by start date"""
+    return {'starts': [], 'ends': [], 'max_ends': [], 'ids': []}
+
+def _refresh_max_ends(bucket, index):
+    """Recompute the running max of end dates from position index onwards"""
+    ends, max_ends = bucket['ends'], bucket['max_ends']
+    del max_ends[index:]
+    running = max_ends[-1] if max_ends else None
+    for end in ends[index:]:
+        running = end if running is None or end > running else running
+        max_ends.append(running)
+
+def build_interval_bucket(intervals):
+    """Bucket from an iterable of (start, end, rental_id) tuples, sorted once up front"""
+    bucket = new_interval_bucket()
+    for start, end, rental_id in sorted(intervals, key=lambda interval: (interval[0], interval[2])):
+        bucket['starts'].append(start)
+        bucket['ends'].append(end)
+        bucket['ids'].append(rental_id)
+    _refresh_max_ends(bucket, 0)
+    return bucket
+
+def interval_add(bucket, start, end, rental_id):
+    """Insert a booking, keeping the bucket sorted by start date"""
+    index = bisect_right(bucket['starts'], start)
+    bucket['starts'].insert(index, start)
+    bucket['ends'].insert(index, end)
+    bucket['ids'].insert(index, rental_id)
+    _refresh_max_ends(bucket, index)
+
+def interval_remove(bucket, rental_id):
+    """Drop a booking by rental id (no-op if it is not in the bucket)"""
+    try:
+        index = bucket['ids'].index(rental_id)
+    except ValueError:
+        return
+    for key in ('starts', 'ends', 'ids'):
+        del bucket[key][index]
+    _refresh_max_ends(bucket, index)
+
+def interval_overlaps(bucket, start, end):
+    """True if any booking in the bucket overlaps the inclusive window [start, end]"""
+    count = bisect_right(bucket['starts'], end)
+    return count > 0 and bucket['max_ends'][count - 1] >= start
+
+def _last_day_out(return_date):
+    """
+    Last day a returned rental holds its items: they are free again on the day
+    they come back, so one returned on its rental date holds nothing.
+    """
+    return return_date - timedelta(days=1)
+
+def _index_rental_rows(rows):
+    """Add (equipment_id, rental_id, rental_date, due_date, return_date) rows to the index (caller holds the lock)"""
+    for row in rows:
+        equipment_id, rental_id = row['equipment_id'], row['rental_id']
+        _availability['by_rental'].setdefault(rental_id, set()).add(equipment_id)
+        if row['return_date'] is None:
+            _availability['open'].setdefault(equipment_id, {})[rental_id] = (row['rental_date'], row['due_date'])
+        elif row['return_date'] > row['rental_date']:
+            bucket = _availability['closed'].setdefault(equipment_id, new_interval_bucket())
+            interval_add(bucket, row['rental_date'], _last_day_out(row['return_date']), rental_id)
+
+def _load_availability_index(cursor):
+    """Rebuild the whole index from rental/rental_detail in one query"""
+    cursor.execute("""
+        SELECT rd.equipment_id, r.rental_id, r.rental_date, r.due_date, r.return_date
+        FROM rental r
+        JOIN rental_detail rd ON r.rental_id = rd.rental_id
     """)
-    customers = cursor.fetchall()
+    closed, open_rentals, by_rental = {}, {}, {}
+    for row in cursor.fetchall():
+        equipment_id, rental_id = row['equipment_id'], row['rental_id']
+        by_rental.setdefault(rental_id, set()).add(equipment_id)
+        if row['return_date'] is None:
+            open_rentals.setdefault(equipment_id, {})[rental_id] = (row['rental_date'], row['due_date'])
+        elif row['return_date'] > row['rental_date']:
+            closed.setdefault(equipment_id, []).append((row['rental_date'], _last_day_out(row['return_date']),
+                                                        rental_id))
+
+    buckets = {equipment_id: build_interval_bucket(intervals) for equipment_id, intervals in closed.items()}
+    with _availability_lock:
+        _availability['closed'] = buckets
+        _availability['open'] = open_rentals
+        _availability['by_rental'] = by_rental
+        _availability['loaded_at'] = time.monotonic()
+
+def refresh_rental_availability(cursor, rental_id):
+    """
+    Re-index one rental after a committed write (create, return, reactivate, delete).
 
-    # Get available equipment for dropdown (only non-archived)
+    Skipped while the index has not been loaded yet; the next query loads it fresh.
+    """
+    if _availability['loaded_at'] is None:
+        return
     cursor.execute("""
-        SELECT equipment_id, equipment_name, equipment_type, daily_rate, availability_status
+        SELECT rd.equipment_id, r.rental_id, r.rental_date, r.due_date, r.return_date
+        FROM rental r
+        JOIN rental_detail rd ON r.rental_id = rd.rental_id
+        WHERE r.rental_id = %s
+    """, (rental_id,))
+    rows = cursor.fetchall()
+    with _availability_lock:
+        for equipment_id in _availability['by_rental'].pop(rental_id, ()):
+            _availability['open'].get(equipment_id, {}).pop(rental_id, None)
+            if equipment_id in _availability['closed']:
+                interval_remove(_availability['closed'][equipment_id], rental_id)
+        _index_rental_rows(rows)
+
+def is_equipment_free(equipment_id, start, end, today=None):
+    """True if no indexed rental books equipment_id anywhere in the inclusive window [start, end]"""
+    today = today or date.today()
+    bucket = _availability['closed'].get(equipment_id)
+    if bucket is not None and interval_overlaps(bucket, start, end):
+        return False
+    for rental_start, due_date in _availability['open'].get(equipment_id, {}).values():
+        # An unreturned rental holds the item until it comes back, even past its due date
+        if rental_start <= end and max(due_date, today) >= start:
+            return False
+    return True
+
+def _ensure_availability_index(cursor):
+    """Load the index when missing or older than AVAILABILITY_INDEX_TTL"""
+    loaded_at = _availability['loaded_at']
+    if loaded_at is None or time.monotonic() - loaded_at > AVAILABILITY_INDEX_TTL:
+        _load_availability_index(cursor)
+
+def find_available_equipment(cursor, start, end):
+    """
+    List rentable equipment that is free for the whole window [start, end].
+
+    Every in-service item (is_bookable: not archived, Available or Rented) is
+    considered, and the index drops any with a booking in the window, so an
+    item out today is offered for a window after it comes back and an
+    Available item with a future booking is not offered over it. Returns
+    equipment dicts ordered by type, then name.
+    """
+    _ensure_availability_index(cursor)
+
+    cursor.execute("""
+        SELECT equipment_id, equipment_name, equipment_type, daily_rate
         FROM equipment
-        WHERE availability_status = 'Available' AND is_archived = FALSE
+        WHERE is_archived = FALSE AND availability_status IN ('Available', 'Rented')
         ORDER BY equipment_type, equipment_name
     """)
-    equipment = cursor.fetchall()
+    today = date.today()
+    with _availability_lock:
+        return [row for row in cursor.fetchall()
+                if is_equipment_free(row['equipment_id'], start, end, today)]
+
+@rentals.route('/rentals/availability')
+@login_required
+def equipment_availability():
+    """JSON list of equipment free between the start and end query dates (YYYY-MM-DD)"""
+    try:
+        start = date.fromisoformat(request.args.get('start', ''))
+        end = date.fromisoformat(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+
+    cursor = get_db().cursor()
+    available = find_available_equipment(cursor, start, end)
+    cursor.close()
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'equipment': [{
+            'equipment_id': row['equipment_id'],
+            'equipment_name': row['equipment_name'],
+            'equipment_type': row['equipment_type'],
+            'daily_rate': float(row['daily_rate']),
+        } for row in available],
+    })
+
+# Typeahead search for the rental form's customer and equipment pickers.
+#
+# Both indexes are per process, like the availability index, and are kept in
+# sync by the search source helpers in app.functions. Archived customers are
+# left out, and so is any equipment is_bookable() rejects (archived, in
+# Maintenance or Retired). Equipment hits are further filtered through the
+# availability index for the requested dates, so the picker only offers
+# items free for the whole rental.
+SEARCH_RESULT_LIMIT = 10
+MAX_SEARCH_RESULT_LIMIT = 50
+
+def _customer_document(row):
+    """(id, fields, sort_key, payload) for a customer row, None if it is archived"""
+    if row['is_archived']:
+        return None
+    payload = {
+        'customer_id': row['customer_id'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'email': row['email'],
+        'phone': row['phone'],
+    }
+    fields = (row['first_name'], row['last_name'], row['email'], row['phone'], row['drivers_license'])
+    sort_key = ((row['last_name'] or '').lower(), (row['first_name'] or '').lower(), row['customer_id'])
+    return row['customer_id'], fields, sort_key, payload
+
+def _equipment_document(row):
+    """(id, fields, sort_key, payload) for an equipment row, None if it is out of service (see is_bookable)"""
+    if not is_bookable(row['availability_status'], row['is_archived']):
+        return None
+    payload = {
+        'equipment_id': row['equipment_id'],
+        'equipment_name': row['equipment_name'],
+        'equipment_type': row['equipment_type'],
+        'serial_number': row['serial_number'],
+        'daily_rate': float(row['daily_rate']),
+    }
+    fields = (row['equipment_name'], row['equipment_type'], row['serial_number'])
+    sort_key = ((row['equipment_type'] or '').lower(), (row['equipment_name'] or '').lower(), row['equipment_id'])
+    return row['equipment_id'], fields, sort_key, payload
+
+_customer_search = register_search_source('customer', """
+    SELECT customer_id, first_name, last_name, email, phone, drivers_license, is_archived
+    FROM customer
+""", 'customer_id', _customer_document)
+_equipment_search = register_search_source('equipment', """
+    SELECT equipment_id, equipment_name, equipment_type, serial_number, daily_rate,
+           availability_status, is_archived
+    FROM equipment
+""", 'equipment_id', _equipment_document)
+
+def refresh_rental_search_entries(cursor, rental_id):
+    """
+    Re-index the equipment on one rental after a committed write changed its
+    status (create, return, reactivate), in one query. Skipped while the
+    equipment index has not been loaded yet.
+    """
+    refresh_search_entries(cursor, 'equipment',
+                           "equipment_id IN (SELECT equipment_id FROM rental_detail WHERE rental_id = %s)",
+                           (rental_id,))
+
+def _search_limit():
+    """The limit query argument clamped to 1..MAX_SEARCH_RESULT_LIMIT (SEARCH_RESULT_LIMIT when absent or bad)"""
+    try:
+        limit = int(request.args.get('limit', SEARCH_RESULT_LIMIT))
+    except ValueError:
+        return SEARCH_RESULT_LIMIT
+    return min(max(limit, 1), MAX_SEARCH_RESULT_LIMIT)
+
+@rentals.route('/customers/search')
+@login_required
+def search_customers():
+    """JSON typeahead: non-archived customers matching q by name, email, phone or driver's license"""
+    query = request.args.get('q', '')
+    cursor = get_db().cursor()
+    index = ensure_search_index(cursor, 'customer')
+    cursor.close()
+    return jsonify({'query': query, 'results': search_index_query(index, query, _search_limit())})
 
+@rentals.route('/equipment/search')
+@login_required
+def search_equipment():
+    """
+    JSON typeahead: rentable equipment matching q by name, type or serial
+    number, limited to items free between the optional start and end dates
+    (today when omitted).
+    """
+    query = request.args.get('q', '')
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else date.today()
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else start
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+
+    cursor = get_db().cursor()
+    index = ensure_search_index(cursor, 'equipment')
+    _ensure_availability_index(cursor)
     cursor.close()
 
-    return render_template('rentals/list.html', rentals=filtered_rentals, customers=customers, equipment=equipment, status_filter=status_filter)
+    today = date.today()
+    with _availability_lock:
+        results = search_index_query(index, query, _search_limit(),
+                                     accept=lambda equipment_id: is_equipment_free(equipment_id, start, end, today))
+    return jsonify({'query': query, 'start': start.isoformat(), 'end': end.isoformat(), 'results': results})
 
 @rentals.route('/rentals/create', methods=['POST'])
 @login_required
 def create_rental():
     db = get_db()
-    cursor = db.cursor()
 
     try:
         customer_id = request.form.get('customer_id')
@@ -102,60 +996,27 @@ def create_rental():
             flash('Please fill in all required fields and select at least one equipment item.', 'danger')
             return redirect(url_for('rentals.list_rentals'))
 
-        # Calculate subtotal
-        subtotal = 0
-        rental_details = []
-
-        for i, equip_id in enumerate(equipment_ids):
-            cursor.execute("SELECT daily_rate FROM equipment WHERE equipment_id = %s", (equip_id,))
-            equipment = cursor.fetchone()
-            if equipment:
-                daily_rate = float(equipment['daily_rate'])
-                days = int(days_rented[i]) if i < len(days_rented) else 1
-                line_total = daily_rate * days
-                subtotal += line_total
-                rental_details.append({
-                    'equipment_id': equip_id,
-                    'daily_rate': daily_rate,
-                    'days_rented': days,
-                    'line_total': line_total
-                })
-
-        # Create rental record
-        cursor.execute("""
-            INSERT INTO rental (customer_id, employee_id, rental_date, due_date, status, subtotal, late_fee, total_cost, notes)
-            VALUES (%s, %s, %s, %s, 'Active', %s, 0.00, %s, %s)
-        """, (customer_id, current_user.employee_id, rental_date, due_date, subtotal, subtotal, notes))
-
-        rental_id = cursor.lastrowid
-
-        # Create rental detail records
-        for detail in rental_details:
-            cursor.execute("""
-                INSERT INTO rental_detail (rental_id, equipment_id, quantity, daily_rate, days_rented, line_total)
-                VALUES (%s, %s, 1, %s, %s, %s)
-            """, (rental_id, detail['equipment_id'], detail['daily_rate'], detail['days_rented'], detail['line_total']))
-
-            # Update equipment availability
-            cursor.execute("""
-                UPDATE equipment
-                SET availability_status = 'Rented'
-                WHERE equipment_id = %s
-            """, (detail['equipment_id'],))
-
-        db.commit()
+        # Claim the equipment and write the rental, retrying on deadlock
+        rental_id = run_in_transaction(db, lambda cursor: insert_rental(
+            cursor, customer_id, current_user.employee_id, rental_date, due_date,
+            notes, equipment_ids, days_rented))
+        bump_data_version('rental', db=db)
+        cursor = db.cursor()
+        refresh_rental_availability(cursor, rental_id)
+        refresh_rental_search_entries(cursor, rental_id)
+        cursor.close()
         flash(f'Rental #{rental_id} created successfully!', 'success')
 
+    except EquipmentUnavailableError as e:
+        flash(f'{e}. Another rental may have just claimed it; please choose again.', 'warning')
     except Exception as e:
-        db.rollback()
         flash(f'Error creating rental: {str(e)}', 'danger')
-    finally:
-        cursor.close()
 
     return redirect(url_for('rentals.list_rentals'))
 
 @rentals.route('/rentals/<int:rental_id>')
 @login_required
+@conditional_get('rental', 'customer', 'equipment')
 def view_rental(rental_id):
     db = get_db()
     cursor = db.cursor()
@@ -184,8 +1045,7 @@ def view_rental(rental_id):
             c.drivers_license,
             e.employee_id,
             e.first_name as employee_first_name,
-            e.last_name as employee_last_name,
-            DATEDIFF(CURDATE(), r.due_date) as days_overdue
+            e.last_name as employee_last_name
         FROM rental r
         JOIN customer c ON r.customer_id = c.customer_id
         JOIN employee e ON r.employee_id = e.employee_id
@@ -224,55 +1084,21 @@ def view_rental(rental_id):
 @login_required
 def return_rental(rental_id):
     db = get_db()
-    cursor = db.cursor()
 
-    # Get rental information
-    cursor.execute("""
-        SELECT rental_id, due_date, subtotal, status
-        FROM rental
-        WHERE rental_id = %s
-    """, (rental_id,))
-
-    rental = cursor.fetchone()
+    try:
+        late_fee = run_in_transaction(db, lambda cursor: complete_rental(cursor, rental_id, date.today()))
+    except RentalStatusError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('rentals.view_rental', rental_id=rental_id))
 
-    if not rental:
+    if late_fee is None:
         flash('Rental not found.', 'danger')
         return redirect(url_for('rentals.list_rentals'))
 
-    if rental['status'] == 'Completed':
-        flash('This rental has already been returned.', 'warning')
-        return redirect(url_for('rentals.view_rental', rental_id=rental_id))
-
-    return_date = date.today()
-    due_date = rental['due_date']
-    subtotal = rental['subtotal']
-
-    # Calculate late fee (10% if overdue)
-    late_fee = calculate_late_fee(subtotal, due_date, return_date)
-    total_cost = subtotal + late_fee
-
-    # Determine status
-    status = 'Completed'
-
-    # Update rental
-    cursor.execute("""
-        UPDATE rental
-        SET return_date = %s,
-            status = %s,
-            late_fee = %s,
-            total_cost = %s
-        WHERE rental_id = %s
-    """, (return_date, status, late_fee, total_cost, rental_id))
-
-    # Update equipment availability
-    cursor.execute("""
-        UPDATE equipment e
-        JOIN rental_detail rd ON e.equipment_id = rd.equipment_id
-        SET e.availability_status = 'Available'
-        WHERE rd.rental_id = %s
-    """, (rental_id,))
-
-    db.commit()
+    bump_data_version('rental', db=db)
+    cursor = db.cursor()
+    refresh_rental_availability(cursor, rental_id)
+    refresh_rental_search_entries(cursor, rental_id)
     cursor.close()
 
     if late_fee > 0:
@@ -284,67 +1110,79 @@ def return_rental(rental_id):
 
 @rentals.route('/customers')
 @login_required
+@conditional_get('customer', 'rental')
 def list_customers():
-    db = get_db()
-    cursor = db.cursor()
-
     # Get status filter from query parameter (default to 'active')
     status_filter = request.args.get('status', 'active').lower()
+    per_page = parse_page_size(request.args.get('per_page'))
 
     # Build WHERE clause based on filter
     if status_filter == 'archived':
-        archive_filter = "WHERE c.is_archived = TRUE"
+        archive_condition = "c.is_archived = TRUE"
     else:
-        archive_filter = "WHERE c.is_archived = FALSE"
-
-    cursor.execute(f"""
-        SELECT
-            c.*,
-            COUNT(r.rental_id) as total_rentals,
-            COALESCE(SUM(r.total_cost), 0) as total_spent
-        FROM customer c
-        LEFT JOIN rental r ON c.customer_id = r.customer_id
-        {archive_filter}
-        GROUP BY c.customer_id
-        ORDER BY c.last_name, c.first_name
-    """)
-
-    customers = cursor.fetchall()
-    cursor.close()
+        archive_condition = "c.is_archived = FALSE"
+
+    token = request.args.get('page')
+
+    def render_table():
+        db = get_db()
+        cursor = tuple_cursor(db)
+        page = fetch_keyset_page(cursor, """
+            SELECT
+                c.*,
+                COALESCE(s.total_rentals, 0) as total_rentals,
+                COALESCE(s.total_spent, 0) as total_spent
+            FROM customer c
+            LEFT JOIN rental_customer_summary s ON c.customer_id = s.customer_id
+        """, [archive_condition],
+            order_columns=['c.last_name', 'c.first_name', 'c.customer_id'],
+            key_fields=['last_name', 'first_name', 'customer_id'],
+            page_size=per_page, token=token,
+            fetch_rows=lambda cursor: fetch_models(cursor, Customer))
+        cursor.close()
+        return Markup(render_template('rentals/customers_table.html', customers=page['rows'], page=page,
+                                      per_page=per_page, status_filter=status_filter))
 
-    return render_template('rentals/customers.html', customers=customers, status_filter=status_filter)
+    table_html = cached_fragment('customers', (status_filter, per_page, token), ('customer', 'rental'), render_table)
+    return render_template('rentals/customers.html', table_html=table_html, status_filter=status_filter)
 
 @rentals.route('/equipment')
 @login_required
+@conditional_get('equipment', 'rental')
 def list_equipment():
-    db = get_db()
-    cursor = db.cursor()
-
     # Get status filter from query parameter (default to 'active')
     status_filter = request.args.get('status', 'active').lower()
+    per_page = parse_page_size(request.args.get('per_page'))
 
     # Build WHERE clause based on filter
     if status_filter == 'archived':
-        archive_filter = "WHERE e.is_archived = TRUE"
+        archive_condition = "e.is_archived = TRUE"
     else:
-        archive_filter = "WHERE e.is_archived = FALSE"
-
-    cursor.execute(f"""
-        SELECT
-            e.*,
-            COUNT(rd.rental_detail_id) as times_rented,
-            COALESCE(SUM(rd.line_total), 0) as total_revenue
-        FROM equipment e
-        LEFT JOIN rental_detail rd ON e.equipment_id = rd.equipment_id
-        {archive_filter}
-        GROUP BY e.equipment_id
-        ORDER BY e.equipment_type, e.equipment_name
-    """)
-
-    equipment_list = cursor.fetchall()
-    cursor.close()
+        archive_condition = "e.is_archived = FALSE"
+
+    token = request.args.get('page')
+
+    def render_table():
+        db = get_db()
+        cursor = tuple_cursor(db)
+        page = fetch_keyset_page(cursor, """
+            SELECT
+                e.*,
+                COALESCE(s.times_rented, 0) as times_rented,
+                COALESCE(s.total_revenue, 0) as total_revenue
+            FROM equipment e
+            LEFT JOIN rental_equipment_summary s ON e.equipment_id = s.equipment_id
+        """, [archive_condition],
+            order_columns=['e.equipment_type', 'e.equipment_name', 'e.equipment_id'],
+            key_fields=['equipment_type', 'equipment_name', 'equipment_id'],
+            page_size=per_page, token=token,
+            fetch_rows=lambda cursor: fetch_models(cursor, Equipment))
+        cursor.close()
+        return Markup(render_template('rentals/equipment_table.html', equipment_list=page['rows'], page=page,
+                                      per_page=per_page, status_filter=status_filter))
 
-    return render_template('rentals/equipment.html', equipment_list=equipment_list, status_filter=status_filter)
+    table_html = cached_fragment('equipment', (status_filter, per_page, token), ('equipment', 'rental'), render_table)
+    return render_template('rentals/equipment.html', table_html=table_html, status_filter=status_filter)
 
 # Customer CRUD Operations
 @rentals.route('/customers/create', methods=['POST'])
@@ -369,6 +1207,8 @@ def create_customer():
             request.form.get('drivers_license')
         ))
         db.commit()
+        bump_data_version('customer', db=db)
+        refresh_search_entry(cursor, 'customer', cursor.lastrowid)
         flash('Customer created successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -402,7 +1242,10 @@ def edit_customer(customer_id):
             request.form.get('drivers_license'),
             customer_id
         ))
+        refresh_overdue_for(cursor, 'customer_id', customer_id)
         db.commit()
+        bump_data_version('customer', db=db)
+        refresh_search_entry(cursor, 'customer', customer_id)
         flash('Customer updated successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -421,6 +1264,8 @@ def archive_customer(customer_id):
     try:
         cursor.execute("UPDATE customer SET is_archived = TRUE WHERE customer_id = %s", (customer_id,))
         db.commit()
+        bump_data_version('customer', db=db)
+        refresh_search_entry(cursor, 'customer', customer_id)
         flash('Customer archived successfully! Historical rental data preserved.', 'success')
     except Exception as e:
         db.rollback()
@@ -439,6 +1284,8 @@ def unarchive_customer(customer_id):
     try:
         cursor.execute("UPDATE customer SET is_archived = FALSE WHERE customer_id = %s", (customer_id,))
         db.commit()
+        bump_data_version('customer', db=db)
+        refresh_search_entry(cursor, 'customer', customer_id)
         flash('Customer restored successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -473,6 +1320,8 @@ def delete_customer(customer_id):
             else:
                 cursor.execute("DELETE FROM customer WHERE customer_id = %s", (customer_id,))
                 db.commit()
+                bump_data_version('customer', db=db)
+                refresh_search_entry(cursor, 'customer', customer_id)
                 flash('Customer deleted successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -490,6 +1339,8 @@ def create_equipment():
     cursor = db.cursor()
 
     try:
+        purchase_date = request.form.get('purchase_date')
+        purchase_date = date.fromisoformat(purchase_date) if purchase_date else None
         cursor.execute("""
             INSERT INTO equipment (equipment_name, equipment_type, description, daily_rate,
                                  condition_status, availability_status, serial_number, purchase_date)
@@ -502,9 +1353,13 @@ def create_equipment():
             request.form.get('condition_status'),
             request.form.get('availability_status'),
             request.form.get('serial_number'),
-            request.form.get('purchase_date') if request.form.get('purchase_date') else None
+            purchase_date
         ))
+        equipment_id = cursor.lastrowid
+        rewind_rollup_for_new_equipment(cursor, purchase_date)
         db.commit()
+        bump_data_version('equipment', db=db)
+        refresh_search_entry(cursor, 'equipment', equipment_id)
         flash('Equipment created successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -521,6 +1376,11 @@ def edit_equipment(equipment_id):
     cursor = db.cursor()
 
     try:
+        purchase_date = request.form.get('purchase_date')
+        purchase_date = date.fromisoformat(purchase_date) if purchase_date else None
+        cursor.execute("SELECT purchase_date FROM equipment WHERE equipment_id = %s FOR UPDATE", (equipment_id,))
+        current = cursor.fetchone()
+
         cursor.execute("""
             UPDATE equipment
             SET equipment_name = %s, equipment_type = %s, description = %s, daily_rate = %s,
@@ -534,10 +1394,15 @@ def edit_equipment(equipment_id):
             request.form.get('condition_status'),
             request.form.get('availability_status'),
             request.form.get('serial_number'),
-            request.form.get('purchase_date') if request.form.get('purchase_date') else None,
+            purchase_date,
             equipment_id
         ))
+        if current is not None:
+            rewind_rollup_for_purchase_date(cursor, equipment_id, current['purchase_date'], purchase_date)
+        refresh_overdue_for(cursor, 'equipment_id', equipment_id)
         db.commit()
+        bump_data_version('equipment', db=db)
+        refresh_search_entry(cursor, 'equipment', equipment_id)
         flash('Equipment updated successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -568,6 +1433,8 @@ def archive_equipment(equipment_id):
         else:
             cursor.execute("UPDATE equipment SET is_archived = TRUE WHERE equipment_id = %s", (equipment_id,))
             db.commit()
+            bump_data_version('equipment', db=db)
+            refresh_search_entry(cursor, 'equipment', equipment_id)
             flash('Equipment archived successfully! Historical data preserved.', 'success')
     except Exception as e:
         db.rollback()
@@ -586,6 +1453,8 @@ def unarchive_equipment(equipment_id):
     try:
         cursor.execute("UPDATE equipment SET is_archived = FALSE WHERE equipment_id = %s", (equipment_id,))
         db.commit()
+        bump_data_version('equipment', db=db)
+        refresh_search_entry(cursor, 'equipment', equipment_id)
         flash('Equipment restored successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -620,6 +1489,8 @@ def delete_equipment(equipment_id):
             else:
                 cursor.execute("DELETE FROM equipment WHERE equipment_id = %s", (equipment_id,))
                 db.commit()
+                bump_data_version('equipment', db=db)
+                refresh_search_entry(cursor, 'equipment', equipment_id)
                 flash('Equipment deleted successfully!', 'success')
     except Exception as e:
         db.rollback()
@@ -634,24 +1505,18 @@ def delete_equipment(equipment_id):
 @login_required
 def delete_rental(rental_id):
     db = get_db()
-    cursor = db.cursor()
 
     try:
-        # Check if rental is active
-        cursor.execute("SELECT status FROM rental WHERE rental_id = %s", (rental_id,))
-        rental = cursor.fetchone()
-
-        if rental and rental['status'] == 'Active':
-            flash('Cannot delete active rental. Please return it first.', 'danger')
-        else:
-            cursor.execute("DELETE FROM rental WHERE rental_id = %s", (rental_id,))
-            db.commit()
-            flash('Rental deleted successfully!', 'success')
+        run_in_transaction(db, lambda cursor: remove_rental(cursor, rental_id))
+        bump_data_version('rental', db=db)
+        cursor = db.cursor()
+        refresh_rental_availability(cursor, rental_id)
+        cursor.close()
+        flash('Rental deleted successfully!', 'success')
+    except RentalStatusError as e:
+        flash(str(e), 'danger')
     except Exception as e:
-        db.rollback()
         flash(f'Error deleting rental: {str(e)}', 'danger')
-    finally:
-        cursor.close()
 
     return redirect(url_for('rentals.list_rentals', status='completed'))
 
@@ -660,42 +1525,22 @@ def delete_rental(rental_id):
 @login_required
 def reactivate_rental(rental_id):
     db = get_db()
-    cursor = db.cursor()
 
     try:
-        # Get rental information
-        cursor.execute("SELECT status, return_date FROM rental WHERE rental_id = %s", (rental_id,))
-        rental = cursor.fetchone()
-
-        if not rental:
+        if not run_in_transaction(db, lambda cursor: reopen_rental(cursor, rental_id)):
             flash('Rental not found.', 'danger')
-        elif rental['status'] != 'Completed':
-            flash('Only completed rentals can be reactivated.', 'warning')
         else:
-            # Clear return date and reset status to Active
-            cursor.execute("""
-                UPDATE rental
-                SET status = 'Active',
-                    return_date = NULL,
-                    late_fee = 0.00,
-                    total_cost = subtotal
-                WHERE rental_id = %s
-            """, (rental_id,))
-
-            # Set equipment back to rented status
-            cursor.execute("""
-                UPDATE equipment e
-                JOIN rental_detail rd ON e.equipment_id = rd.equipment_id
-                SET e.availability_status = 'Rented'
-                WHERE rd.rental_id = %s
-            """, (rental_id,))
-
-            db.commit()
+            bump_data_version('rental', db=db)
+            cursor = db.cursor()
+            refresh_rental_availability(cursor, rental_id)
+            refresh_rental_search_entries(cursor, rental_id)
+            cursor.close()
             flash('Rental reactivated successfully!', 'success')
+    except RentalStatusError as e:
+        flash(str(e), 'warning')
+    except EquipmentUnavailableError as e:
+        flash(f'Cannot reactivate: {e}.', 'danger')
     except Exception as e:
-        db.rollback()
         flash(f'Error reactivating rental: {str(e)}', 'danger')
-    finally:
-        cursor.close()
 
     return redirect(url_for('rentals.list_rentals', status='active'))
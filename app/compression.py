@@ -0,0 +1,178 @@
+"""
+Response compression and precompressed static assets.
+
+Dynamic responses are compressed in an after_request hook, negotiated on
+Accept-Encoding (brotli when the optional `brotli` package is installed,
+otherwise gzip). Streamed responses are compressed chunk by chunk and flushed
+after each chunk, so the client still receives rows as they are produced.
+
+Files under app/static/assets are read once at startup, given a content
+hash in their URL (/assets/<name>.<hash>.<ext>) and kept with gzip/brotli
+variants built at the highest levels, so they can be cached for a year.
+"""
+import hashlib
+import mimetypes
+import os
+import zlib
+
+from flask import Response, abort, current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Dynamic responses: bodies under COMPRESS_MIN_SIZE bytes are sent as they are;
+# set COMPRESS_RESPONSES=0 when a proxy in front of the app already compresses
+COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', '1') == '1'
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+                      'application/javascript', 'application/json', 'image/svg+xml')
+
+# Static assets are compressed once, so they use the slowest, smallest settings.
+# A variant is only kept when it saves at least ASSET_MIN_SAVING of the file.
+ASSET_GZIP_LEVEL = 9
+ASSET_BROTLI_QUALITY = 11
+ASSET_MIN_SAVING = 0.1
+ASSET_MAX_AGE = 365 * 24 * 3600
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'assets')
+
+_assets = {}   # logical name -> hashed name
+_variants = {} # hashed name -> {'mimetype', 'etag', 'identity', 'gzip', 'br'}
+
+def supported_encodings():
+    """Content codings this process can produce, most preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def negotiate_encoding(available=None):
+    """Best of `available` codings (default: all supported) that the request's Accept-Encoding allows, or None"""
+    return request.accept_encodings.best_match(available or supported_encodings())
+
+def _compressor(encoding, level):
+    """Return (compress(bytes) -> bytes, flush() -> bytes, finish() -> bytes) for one stream"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compressor.flush(zlib.Z_FINISH))
+
+def compress_bytes(data, encoding, level):
+    """Compress a whole body with gzip or brotli"""
+    compress, _, finish = _compressor(encoding, level)
+    return compress(data) + finish()
+
+def compress_chunks(chunks, encoding, level):
+    """
+    Compress an iterable of str/bytes chunks into one gzip or brotli stream,
+    flushing after every chunk. Closes the source iterable when done, so
+    stream_with_context cleanup still runs.
+    """
+    compress, flush, finish = _compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def compress_response(response):
+    """
+    after_request hook: compress a compressible response the client accepts.
+
+    Skips small bodies, non-2xx responses, file responses (direct passthrough)
+    and anything already encoded. Buffered bodies get an exact Content-Length;
+    streamed bodies are compressed as they are sent.
+    """
+    if (not COMPRESS_RESPONSES or not 200 <= response.status_code < 300 or response.status_code == 204
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    level = COMPRESS_BROTLI_QUALITY if encoding == 'br' else COMPRESS_GZIP_LEVEL
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def build_assets(directory=ASSET_DIR):
+    """
+    Read every file in directory once, naming it by a hash of its content and
+    keeping gzip/brotli variants where they pay off. Returns the number of assets.
+    """
+    _assets.clear()
+    _variants.clear()
+    if not os.path.isdir(directory):
+        return 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, extension = os.path.splitext(name)
+        hashed = f"{stem}.{digest}{extension}"
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        variants = {'mimetype': mimetype, 'etag': digest, 'identity': data}
+        if mimetype in COMPRESSIBLE_TYPES:
+            for encoding in supported_encodings():
+                level = ASSET_BROTLI_QUALITY if encoding == 'br' else ASSET_GZIP_LEVEL
+                compressed = compress_bytes(data, encoding, level)
+                if len(compressed) <= len(data) * (1 - ASSET_MIN_SAVING):
+                    variants[encoding] = compressed
+        _assets[name] = hashed
+        _variants[hashed] = variants
+    return len(_assets)
+
+def asset_url(name):
+    """
+    Template helper: the content-hashed URL of a file in app/static/assets.
+    In debug mode, or for files added after startup, the plain static URL.
+    """
+    hashed = _assets.get(name)
+    if hashed is None or current_app.debug:
+        return url_for('static', filename=f'assets/{name}')
+    return url_for('asset', filename=hashed)
+
+def serve_asset(filename):
+    """Serve a hashed asset, precompressed when the client accepts it, cacheable for a year"""
+    variants = _variants.get(filename)
+    if variants is None:
+        abort(404)
+    encodings = [encoding for encoding in supported_encodings() if encoding in variants]
+    encoding = negotiate_encoding(encodings) if encodings else None
+
+    response = Response(variants[encoding or 'identity'], mimetype=variants['mimetype'])
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(f"{variants['etag']}-{encoding or 'identity'}")
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response.make_conditional(request)
+
+def init_compression(app):
+    """Build the asset manifest, route /assets/ and register the compression hook"""
+    build_assets()
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(asset_url)
+    app.after_request(compress_response)
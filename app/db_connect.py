@@ -1,38 +1,454 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from types import SimpleNamespace
+
 import pymysql
 import pymysql.cursors
-from flask import g
-import os
+from pymysql.constants import SERVER_STATUS
+from flask import g, has_app_context, has_request_context, request
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_db():
-    if 'db' not in g or not is_connection_open(g.db):
-        print("Re-establishing closed database connection.")
+# Pool sizing and timeouts (seconds), configurable through .env
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', 10))
+# A pooled connection is only pinged on checkout once it has sat idle this long
+POOL_VALIDATION_INTERVAL = float(os.getenv('DB_POOL_VALIDATION_INTERVAL', 30))
+
+# Driver errors after which a connection must be re-validated before reuse
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+# MySQL errors where re-running the whole transaction is safe: lock wait timeout, deadlock
+RETRYABLE_ERROR_CODES = (1205, 1213)
+TRANSACTION_RETRIES = int(os.getenv('DB_TRANSACTION_RETRIES', 3))
+
+# Per-request SQL instrumentation: statements slower than SLOW_QUERY_MS are logged as they finish;
+# a request whose statements took SLOW_REQUEST_DB_MS in total, or that repeated one statement
+# shape SQL_REPEAT_THRESHOLD times (an N+1 pattern), has its summary logged at the end.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+SLOW_REQUEST_DB_MS = float(os.getenv('SLOW_REQUEST_DB_MS', 500))
+SQL_REPEAT_THRESHOLD = int(os.getenv('SQL_REPEAT_THRESHOLD', 5))
+# Statements kept per request for the summary; later ones are still counted and timed
+SQL_STATS_MAX_STATEMENTS = 200
+
+log = logging.getLogger(__name__)
+
+# JSON lines, one per slow statement or flagged request; written to SLOW_QUERY_LOG when set
+slow_query_log = logging.getLogger('app.slow_queries')
+if os.getenv('SLOW_QUERY_LOG'):
+    _handler = logging.FileHandler(os.getenv('SLOW_QUERY_LOG'))
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_query_log.addHandler(_handler)
+    slow_query_log.propagate = False
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection frees up within the wait timeout"""
+
+class DatabaseUnavailableError(Exception):
+    """Raised by a request's first query when no connection can be opened or borrowed (cause chained)"""
+
+# Process-wide pool state. Every field is guarded by _pool_lock.
+_pool_lock = threading.Condition()
+_pool = {
+    'pid': None,       # owning process; a forked gunicorn worker starts a fresh pool
+    'idle': deque(),   # (connection, returned_at, suspect) entries, most recently returned on the right
+    'size': 0,         # open connections, idle and checked out
+    'stats': {},
+}
+
+def _new_pool_stats():
+    """Zeroed lifetime counters for a new pool (see get_pool_stats)"""
+    return {
+        'created': 0,
+        'closed': 0,
+        'checkouts': 0,
+        'waits': 0,
+        'timeouts': 0,
+        'failed_health_checks': 0,
+        'pings': 0,
+        'validations_skipped': 0,
+    }
+
+def _open_connection():
+    """Open a new PyMySQL connection from the .env settings"""
+    return pymysql.connect(
+        # Database configuration from environment variables
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        cursorclass=pymysql.cursors.DictCursor  # Set the default cursor class to DictCursor
+    )
+
+def _close_quietly(conn):
+    """Close a connection that is being dropped, ignoring errors from one that is already dead"""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _ensure_pool_owner():
+    """Drop pool state inherited from a parent process (caller holds the lock).
+
+    Sockets opened before a fork are shared with the parent, so they are
+    abandoned rather than closed (closing would end the parent's sessions).
+    """
+    pid = os.getpid()
+    if _pool['pid'] != pid:
+        _pool['pid'] = pid
+        _pool['idle'] = deque()
+        _pool['size'] = 0
+        _pool['stats'] = _new_pool_stats()
+
+def _evict_idle_connections(now):
+    """Take connections idle past POOL_IDLE_TIMEOUT out of the pool (caller holds the lock).
+
+    Never shrinks the pool below POOL_MIN_SIZE. Returns the evicted
+    connections so they can be closed outside the lock.
+    """
+    evicted = []
+    idle = _pool['idle']
+    while idle and _pool['size'] > POOL_MIN_SIZE and now - idle[0][1] > POOL_IDLE_TIMEOUT:
+        conn = idle.popleft()[0]
+        evicted.append(conn)
+        _pool['size'] -= 1
+        _pool['stats']['closed'] += 1
+    return evicted
+
+def _needs_validation(returned_at, suspect, now):
+    """A pooled connection is trusted unless it hit a driver error or sat idle past POOL_VALIDATION_INTERVAL"""
+    return suspect or now - returned_at > POOL_VALIDATION_INTERVAL
+
+def acquire_connection(timeout=None):
+    """
+    Borrow a connection from the pool.
+
+    Reuses the most recently returned idle connection (pinging it first only
+    when _needs_validation says so), opens a new one while the pool is below
+    POOL_MAX_SIZE, and otherwise waits
+    up to `timeout` seconds (POOL_WAIT_TIMEOUT by default) for one to be
+    released. Raises PoolTimeoutError if the wait runs out and lets driver
+    errors from opening a connection propagate.
+    """
+    timeout = POOL_WAIT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+
+    evicted = []
+    timed_out = False
+    validate = False
+    with _pool_lock:
+        _ensure_pool_owner()
+        while True:
+            evicted.extend(_evict_idle_connections(time.monotonic()))
+            if _pool['idle']:
+                conn, returned_at, suspect = _pool['idle'].pop()
+                validate = _needs_validation(returned_at, suspect, time.monotonic())
+                if not validate:
+                    _pool['stats']['validations_skipped'] += 1
+                break
+            if _pool['size'] < POOL_MAX_SIZE:
+                # Reserve the slot now, connect outside the lock
+                _pool['size'] += 1
+                conn = None
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _pool['stats']['timeouts'] += 1
+                timed_out = True
+                break
+            _pool['stats']['waits'] += 1
+            _pool_lock.wait(remaining)
+
+    for stale in evicted:
+        _close_quietly(stale)
+    if timed_out:
+        raise PoolTimeoutError(f"No database connection available after {timeout:.1f}s "
+                               f"(pool max size {POOL_MAX_SIZE})")
+
+    if validate and not is_connection_open(conn):
+        with _pool_lock:
+            _pool['stats']['failed_health_checks'] += 1
+            _pool['stats']['closed'] += 1
+        _close_quietly(conn)
+        conn = None
+
+    if conn is None:
+        try:
+            conn = _open_connection()
+        except Exception:
+            with _pool_lock:
+                _pool['size'] -= 1
+                _pool_lock.notify()
+            raise
+        with _pool_lock:
+            _pool['stats']['created'] += 1
+
+    with _pool_lock:
+        _pool['stats']['checkouts'] += 1
+    return conn
+
+def release_connection(conn, discard=False, suspect=False):
+    """
+    Return a borrowed connection to the pool.
+
+    Any transaction left open is rolled back so the next borrower starts with
+    a clean snapshot. The connection is closed instead of pooled when
+    `discard` is set, when it is no longer open, or when the rollback fails.
+    A `suspect` connection (one that just raised a driver error) is pooled
+    but pinged before it is handed out again.
+    """
+    if not discard:
+        try:
+            if not conn.open:
+                discard = True
+            elif conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                conn.rollback()
+        except Exception:
+            discard = True
+
+    with _pool_lock:
+        if _pool['pid'] != os.getpid():
+            # Borrowed before a fork; the current pool never counted it
+            return
+        if discard:
+            _pool['size'] -= 1
+            _pool['stats']['closed'] += 1
+        else:
+            _pool['idle'].append((conn, time.monotonic(), suspect))
+        _pool_lock.notify()
+
+    if discard:
+        _close_quietly(conn)
+
+def get_pool_stats():
+    """Return a snapshot of pool sizing and lifetime counters for this process"""
+    with _pool_lock:
+        _ensure_pool_owner()
+        idle = len(_pool['idle'])
+        stats = dict(_pool['stats'])
+        stats.update({
+            'pid': _pool['pid'],
+            'size': _pool['size'],
+            'idle': idle,
+            'in_use': _pool['size'] - idle,
+            'min_size': POOL_MIN_SIZE,
+            'max_size': POOL_MAX_SIZE,
+            'validation_interval': POOL_VALIDATION_INTERVAL,
+        })
+    return stats
+
+_SQL_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_SQL_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SQL_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_SQL_SPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """
+    Statement shape: literals become ?, IN/VALUES lists of any length become
+    (...), whitespace collapses. Statements that differ only in their values
+    share a shape.
+    """
+    shape = _SQL_STRING.sub('?', sql)
+    shape = _SQL_NUMBER.sub('?', shape)
+    shape = _SQL_LIST.sub('(...)', shape)
+    return _SQL_SPACE.sub(' ', shape).strip()
+
+def _new_sql_stats():
+    """Zeroed SQL counters for one request (see record_statement)"""
+    return {'queries': 0, 'seconds': 0.0, 'rows': 0, 'shapes': Counter(), 'statements': []}
+
+def get_request_sql_stats():
+    """The current request's (or app context's) SQL counters, created on first use"""
+    if 'sql_stats' not in g:
+        g.sql_stats = _new_sql_stats()
+    return g.sql_stats
+
+def _request_label():
+    """Method, path and endpoint of the current request for log lines ({} outside a request)"""
+    if has_request_context():
+        return {'method': request.method, 'path': request.path, 'endpoint': request.endpoint}
+    return {}
+
+def record_statement(sql, seconds, rows):
+    """Add one finished statement to the context's stats and log it when it ran past SLOW_QUERY_MS"""
+    shape = normalize_sql(sql) if isinstance(sql, str) else repr(sql)
+    if has_app_context():
+        stats = get_request_sql_stats()
+        stats['queries'] += 1
+        stats['seconds'] += seconds
+        stats['rows'] += max(rows, 0)
+        stats['shapes'][shape] += 1
+        if len(stats['statements']) < SQL_STATS_MAX_STATEMENTS:
+            stats['statements'].append((shape, seconds, rows))
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning(json.dumps(dict(_request_label(), event='slow_query', statement=shape,
+                                               duration_ms=round(seconds * 1000, 2), rows=rows)))
+
+def summarize_sql_stats(stats):
+    """Query count, DB time and N+1 suspects (shapes run SQL_REPEAT_THRESHOLD+ times) for a stats dict"""
+    repeated = [{'statement': shape, 'count': count}
+                for shape, count in stats['shapes'].most_common() if count >= SQL_REPEAT_THRESHOLD]
+    slowest = sorted(stats['statements'], key=lambda statement: statement[1], reverse=True)[:3]
+    return {
+        'queries': stats['queries'],
+        'db_ms': round(stats['seconds'] * 1000, 2),
+        'rows': stats['rows'],
+        'repeated': repeated,
+        'slowest': [{'statement': shape, 'duration_ms': round(seconds * 1000, 2), 'rows': rows}
+                    for shape, seconds, rows in slowest],
+    }
+
+def log_request_sql(summary):
+    """Log a request summary when its DB time passed SLOW_REQUEST_DB_MS or it repeated a statement shape"""
+    if summary['db_ms'] >= SLOW_REQUEST_DB_MS or summary['repeated']:
+        slow_query_log.warning(json.dumps(dict(_request_label(), event='slow_request', **summary)))
+
+def instrument_cursor(cursor):
+    """
+    Time a cursor's statements and record them with record_statement, in
+    place: execute() and executemany() are replaced on this cursor instance
+    by timing wrappers, and everything else (fetches, rowcount, lastrowid,
+    iteration, close) is the PyMySQL cursor's own. Returns the cursor.
+    """
+    execute, executemany = cursor.execute, cursor.executemany
+
+    def timed_execute(query, args=None):
+        started = time.perf_counter()
+        try:
+            return execute(query, args)
+        finally:
+            record_statement(query, time.perf_counter() - started, cursor.rowcount)
+
+    def timed_executemany(query, args):
+        started = time.perf_counter()
+        # PyMySQL's executemany sends its batches through self.execute; they are
+        # this statement's round trips, not statements of their own
+        cursor.execute = execute
         try:
-            g.db = pymysql.connect(
-                # Database configuration from environment variables
-                host=os.getenv('DB_HOST'),
-                user=os.getenv('DB_USER'),
-                password=os.getenv('DB_PASSWORD'),
-                database=os.getenv('DB_NAME'),
-                cursorclass=pymysql.cursors.DictCursor  # Set the default cursor class to DictCursor
-            )
-        except Exception as e:
-            print(f"Database connection failed: {e}")
-            g.db = None
-            return None
+            return executemany(query, args)
+        finally:
+            cursor.execute = timed_execute
+            record_statement(query, time.perf_counter() - started, cursor.rowcount)
+
+    cursor.execute = timed_execute
+    cursor.executemany = timed_executemany
+    return cursor
+
+def new_lazy_connection():
+    """
+    Per-request stand-in for a pooled connection, with cursor(), commit(),
+    rollback() and detach().
+
+    Nothing is borrowed from the pool until the first cursor() call, so
+    requests that never query (static files, redirects) cost no database
+    work. If the pool cannot supply a connection, that call logs the failure
+    and raises DatabaseUnavailableError. commit() and rollback() before that
+    point are no-ops. Cursors come instrumented (instrument_cursor) so each
+    request's statements are counted and timed.
+    """
+    state = {'conn': None}
+
+    def connect():
+        if state['conn'] is None:
+            try:
+                state['conn'] = acquire_connection()
+            except Exception as e:
+                log.error("Database connection failed: %s", e)
+                raise DatabaseUnavailableError(str(e)) from e
+        return state['conn']
+
+    def cursor(cursorclass=None):
+        return instrument_cursor(connect().cursor(cursorclass))
+
+    def commit():
+        if state['conn'] is not None:
+            state['conn'].commit()
+
+    def rollback():
+        if state['conn'] is not None:
+            state['conn'].rollback()
+
+    def detach():
+        """Hand back the borrowed connection (None if none was borrowed) and forget it"""
+        conn, state['conn'] = state['conn'], None
+        return conn
+
+    return SimpleNamespace(cursor=cursor, commit=commit, rollback=rollback, detach=detach)
+
+def get_db():
+    """
+    Return the request's lazy database connection, stored on g.
+
+    Creating it does no I/O; a pooled connection is borrowed on the first
+    cursor operation. A connection failure surfaces there as
+    DatabaseUnavailableError instead of a None return; callers that must keep
+    working without the database (login, the user loader) catch it.
+    """
+    if 'db' not in g:
+        g.db = new_lazy_connection()
     return g.db
 
+def _count_ping():
+    """Count a liveness ping in the pool stats and against the current request"""
+    with _pool_lock:
+        _pool['stats']['pings'] += 1
+    if has_app_context():
+        g.db_pings = g.get('db_pings', 0) + 1
+
+def get_request_ping_count():
+    """Number of liveness pings issued on behalf of the current request (0 in steady state)"""
+    return g.get('db_pings', 0)
+
 def is_connection_open(conn):
+    """Ping conn without reconnecting; False if the server is gone"""
+    _count_ping()
     try:
-        conn.ping(reconnect=True)  # PyMySQL's way to check connection health
+        conn.ping(reconnect=False)  # PyMySQL's way to check connection health
         return True
-    except:
+    except Exception:
         return False
 
 def close_db(exception=None):
+    """Hand the request's connection back to the pool, flagged for a ping if the request died on a driver error"""
     db = g.pop('db', None)
-    if db is not None and not db._closed:
-        print("Closing database connection.")
-        db.close()
\ No newline at end of file
+    conn = db.detach() if db is not None else None
+    if conn is not None:
+        release_connection(conn, suspect=isinstance(exception, CONNECTION_ERRORS))
+
+def run_in_transaction(db, work, retries=TRANSACTION_RETRIES, backoff=0.02):
+    """
+    Call work(cursor) and commit, re-running the whole transaction when MySQL
+    reports a deadlock or lock wait timeout.
+
+    Retries up to `retries` times with jittered exponential backoff. Any other
+    error, or a retryable one after the last attempt, is rolled back and
+    re-raised. Returns whatever work returned.
+    """
+    for attempt in range(retries + 1):
+        cursor = db.cursor()
+        try:
+            result = work(cursor)
+            db.commit()
+            return result
+        except pymysql.err.OperationalError as e:
+            db.rollback()
+            if e.args[0] not in RETRYABLE_ERROR_CODES or attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
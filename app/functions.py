@@ -1 +1,789 @@
 # Function will go in here for the entire site to use
+import base64
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+from functools import wraps
+
+from flask import g, has_request_context, make_response, request, session
+from flask_login import current_user
+
+from app.db_connect import get_db, run_in_transaction
+
+def days_overdue(due_date, today=None):
+    """Whole days past due_date (0 when not yet due); registered as a template filter"""
+    return max(((today or date.today()) - due_date).days, 0)
+
+# In-process snapshot cache shared by all blueprints. An entry is rebuilt once
+# its TTL runs out or once a write bumps the data version of a table it was
+# built from, so a worker never serves its own stale writes.
+_snapshot_lock = threading.Lock()
+_snapshots = {}       # key -> (expires_at, table_versions, value)
+_data_versions = {}   # table name -> change counter for this process
+
+def bump_data_version(*tables, db=None):
+    """
+    Record that rows in the given tables changed, invalidating snapshots built
+    from them. Pass db after a committed write to also advance the shared
+    change counters every worker reads (see get_change_counters).
+    """
+    with _snapshot_lock:
+        for table in tables:
+            _data_versions[table] = _data_versions.get(table, 0) + 1
+    if db is not None:
+        bump_change_counters(db, *tables)
+
+def get_data_version(table):
+    """Return this process's change counter for a table"""
+    return _data_versions.get(table, 0)
+
+def get_snapshot(key, loader, ttl=30, tables=(), shared=False):
+    """
+    Return the cached value for key, calling loader() to rebuild it when it is
+    missing, older than ttl seconds, or older than a bump_data_version() on
+    any of tables. With shared set, the shared change counters of tables are
+    compared too, so another worker's write also invalidates it (costs the
+    per-request counter read). The versions are read before loading, so a
+    write that lands mid-load invalidates the result on the next call.
+    """
+    now = time.monotonic()
+    counters = get_change_counters(*tables) if shared else ()
+    with _snapshot_lock:
+        versions = tuple(_data_versions.get(table, 0) for table in tables) + counters
+        entry = _snapshots.get(key)
+    if entry is not None and entry[0] > now and entry[1] == versions:
+        return entry[2]
+
+    value = loader()
+    with _snapshot_lock:
+        _snapshots[key] = (now + ttl, versions, value)
+    return value
+
+# Shared change counters: one row per table in data_version, advanced in its
+# own short transaction after each committed write. Bumping after the commit
+# means a reader can see new rows under an old counter, never old rows under
+# a new one, so nothing is cached against a version it does not reflect.
+def bump_change_counters(db, *tables):
+    """Advance the shared change counters of tables, creating missing ones"""
+    tables = sorted(set(tables))
+    run_in_transaction(db, lambda cursor: cursor.execute(f"""
+        INSERT INTO data_version (table_name, version)
+        VALUES {', '.join(['(%s, 1)'] * len(tables))}
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, tables))
+    if has_request_context():
+        g.pop('change_counters', None)
+
+def get_change_counters(*tables):
+    """Return the shared change counters of tables (0 if never bumped), read once per request"""
+    counters = g.get('change_counters')
+    if counters is None:
+        cursor = get_db().cursor()
+        cursor.execute("SELECT table_name, version FROM data_version")
+        counters = g.change_counters = {row['table_name']: row['version'] for row in cursor.fetchall()}
+        cursor.close()
+    return tuple(counters.get(table, 0) for table in tables)
+
+def _build_token():
+    """Latest change to the app's code and templates, so a deploy never reuses an old ETag"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    return max((os.path.getmtime(os.path.join(directory, name))
+                for directory, _, names in os.walk(root) for name in names
+                if name.endswith(('.py', '.html'))), default=0)
+
+_BUILD_TOKEN = _build_token()
+
+def conditional_get(*tables):
+    """
+    Decorate a read-only view so it answers If-None-Match with a 304.
+
+    The weak ETag covers the URL, the employee, today's date, the code build
+    and the shared change counters of tables, so checking it costs one small
+    query and never runs the view. Only 200 responses are tagged, and requests
+    with flashed messages waiting are passed straight through.
+    """
+    def decorate(view):
+        @wraps(view)
+        def conditional_view(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            material = (request.full_path, current_user.get_id(), date.today().isoformat(), _BUILD_TOKEN,
+                        tables, get_change_counters(*tables))
+            etag = hashlib.blake2b(repr(material).encode(), digest_size=12).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            return response
+        return conditional_view
+    return decorate
+
+# Bookkeeping for the daily utilization rollup (analytics rollup-utilization).
+# The job only processes days after its watermark, so any write that changes
+# an already processed day moves the watermark back inside its own transaction.
+ROLLUP_JOB = 'equipment_daily_rollup'
+
+def rewind_rollup_watermark(cursor, day):
+    """Make the next rollup run reprocess everything from day onwards (call inside the writing transaction)"""
+    cursor.execute("""
+        UPDATE rollup_watermark
+        SET processed_through = LEAST(processed_through, %s - INTERVAL 1 DAY)
+        WHERE job_name = %s
+    """, (day, ROLLUP_JOB))
+
+def rewind_rollup_for_purchase_date(cursor, equipment_id, old_date, new_date):
+    """
+    Keep an item's rollup rows in step with a purchase_date change (call inside
+    the writing transaction). The rollup only has rows from the purchase date
+    on: rows before a later date are deleted, and an earlier or cleared date
+    rewinds the watermark so the next run fills in the missing days.
+    """
+    if old_date == new_date:
+        return
+    if new_date is not None:
+        cursor.execute("DELETE FROM equipment_daily_rollup WHERE equipment_id = %s AND rollup_date < %s",
+                       (equipment_id, new_date))
+        if old_date is not None and new_date < old_date:
+            rewind_rollup_watermark(cursor, new_date)
+        return
+    rewind_rollup_for_new_equipment(cursor, None)
+
+def rewind_rollup_for_new_equipment(cursor, purchase_date):
+    """
+    Rewind the watermark so the next rollup run fills in the days new
+    equipment already owned (call inside the inserting transaction): from its
+    purchase_date, or, without one, from the first day the rollup covers.
+    A purchase date after the watermark changes nothing.
+    """
+    if purchase_date is None:
+        cursor.execute("SELECT MIN(rental_date) as first_day FROM rental")
+        purchase_date = cursor.fetchone()['first_day']
+        if purchase_date is None:
+            return
+    rewind_rollup_watermark(cursor, purchase_date)
+
+# Invalidation of the analytics page's closed-month cache. Each closed month's
+# metrics are cached against a shared change counter of its own and one for
+# the whole rental history. A rental write changes the months from its rental
+# date on (revenue and late fees count in the month the rental started,
+# equipment days in every month it was out), so it bumps those months'
+# counters inside its own transaction, the way the rollup watermark is
+# rewound; bulk loads bump the history counter (app.summaries) instead.
+
+def rental_month_counter(month):
+    """Name of the shared change counter for the closed month starting at month"""
+    return f'rental_month:{month:%Y-%m}'
+
+def rewind_rental_months(cursor, day, today=None):
+    """
+    Invalidate the cached analytics of every closed month from day's month on
+    (call inside the writing transaction). Writes confined to the current
+    month change nothing here: its bucket is keyed on the rental data version.
+    """
+    today = today or date.today()
+    month, current = day.replace(day=1), today.replace(day=1)
+    counters = []
+    while month < current:
+        counters.append(rental_month_counter(month))
+        month = (month + timedelta(days=32)).replace(day=1)
+    if counters:
+        cursor.execute(f"""
+            INSERT INTO data_version (table_name, version)
+            VALUES {', '.join(['(%s, 1)'] * len(counters))}
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """, counters)
+
+# Bounded LRU caches with a per-entry max age, for per-process lookups such as
+# the logged-in employee. A cache is a plain dict made by new_lru_cache() and
+# passed to the lru_* helpers; it carries its own lock and hit/miss counters.
+def new_lru_cache(max_size, ttl):
+    """Create an empty LRU cache holding up to max_size entries for at most ttl seconds each"""
+    return {
+        'lock': threading.Lock(),
+        'entries': OrderedDict(),   # key -> (expires_at, value), least recently used first
+        'max_size': max_size,
+        'ttl': ttl,
+        'stats': {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0},
+    }
+
+def lru_put(cache, key, value):
+    """Store value under key with a fresh max age, evicting the least recently used entry if full"""
+    with cache['lock']:
+        cache['entries'][key] = (time.monotonic() + cache['ttl'], value)
+        cache['entries'].move_to_end(key)
+        while len(cache['entries']) > cache['max_size']:
+            cache['entries'].popitem(last=False)
+            cache['stats']['evictions'] += 1
+
+def lru_get(cache, key, loader):
+    """
+    Return the cached value for key, calling loader() on a miss or once the
+    entry has outlived the cache's ttl. None results are returned but not
+    cached, so a missing row is looked up again next time.
+    """
+    now = time.monotonic()
+    with cache['lock']:
+        entry = cache['entries'].get(key)
+        if entry is not None and entry[0] > now:
+            cache['entries'].move_to_end(key)
+            cache['stats']['hits'] += 1
+            return entry[1]
+        if entry is not None:
+            del cache['entries'][key]
+            cache['stats']['expired'] += 1
+        cache['stats']['misses'] += 1
+
+    value = loader()
+    if value is not None:
+        lru_put(cache, key, value)
+    return value
+
+def lru_invalidate(cache, key=None):
+    """Drop one key, or every entry when key is None"""
+    with cache['lock']:
+        if key is None:
+            cache['stats']['invalidations'] += len(cache['entries'])
+            cache['entries'].clear()
+        elif cache['entries'].pop(key, None) is not None:
+            cache['stats']['invalidations'] += 1
+
+def lru_stats(cache):
+    """Return a snapshot of the cache's size and counters"""
+    with cache['lock']:
+        stats = dict(cache['stats'])
+        stats.update({'size': len(cache['entries']), 'max_size': cache['max_size'], 'ttl': cache['ttl']})
+    return stats
+
+# Rendered HTML for the big listing tables. The key carries this process's
+# data versions and the shared change counters of every table the fragment
+# reads, so any worker's write retires it on the next request; the TTL only
+# bounds memory held by fragments nobody asks for again.
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', 64))
+FRAGMENT_CACHE_TTL = float(os.getenv('FRAGMENT_CACHE_TTL', 10))
+_fragment_cache = new_lru_cache(FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_TTL)
+
+def cached_fragment(name, params, tables, render):
+    """
+    Return the HTML fragment for name and params, calling render() on a miss.
+    params must hold everything the fragment depends on besides the tables.
+    """
+    with _snapshot_lock:
+        versions = tuple(_data_versions.get(table, 0) for table in tables)
+    key = (name, params, versions, get_change_counters(*tables))
+    return lru_get(_fragment_cache, key, render)
+
+def get_fragment_cache_stats():
+    """Return the fragment cache's size and counters"""
+    return lru_stats(_fragment_cache)
+
+# Sliding-window rate limiters, e.g. for login attempts. A limiter is a plain
+# dict made by new_rate_limiter(); each key keeps the times of its recent
+# events, and at most max_keys keys are tracked (least recently used dropped).
+def new_rate_limiter(limit, window, max_keys=10000):
+    """Create a limiter allowing `limit` events per key in any `window` seconds"""
+    return {
+        'lock': threading.Lock(),
+        'events': OrderedDict(),    # key -> deque of event times, least recently used key first
+        'limit': limit,
+        'window': window,
+        'max_keys': max_keys,
+        'stats': {'allowed': 0, 'rejected': 0},
+    }
+
+def _rate_limit_events(limiter, key, now):
+    """Key's event times with those older than the window dropped (caller holds the lock)"""
+    events = limiter['events'].get(key)
+    if events is None:
+        return None
+    while events and events[0] <= now - limiter['window']:
+        events.popleft()
+    return events
+
+def rate_limit_retry_after(limiter, key):
+    """Seconds until key may act again (0 if it may now); does not record an event"""
+    now = time.monotonic()
+    with limiter['lock']:
+        events = _rate_limit_events(limiter, key, now)
+        if events is None or len(events) < limiter['limit']:
+            limiter['stats']['allowed'] += 1
+            return 0
+        limiter['stats']['rejected'] += 1
+        return events[0] + limiter['window'] - now
+
+def rate_limit_hit(limiter, key):
+    """Record one event for key"""
+    now = time.monotonic()
+    with limiter['lock']:
+        events = _rate_limit_events(limiter, key, now)
+        if events is None:
+            events = limiter['events'][key] = deque()
+            while len(limiter['events']) > limiter['max_keys']:
+                limiter['events'].popitem(last=False)
+        limiter['events'].move_to_end(key)
+        events.append(now)
+
+def rate_limit_reset(limiter, key):
+    """Forget key's events, e.g. after a successful login"""
+    with limiter['lock']:
+        limiter['events'].pop(key, None)
+
+def rate_limit_forgive(limiter, key):
+    """Drop key's most recent event, e.g. a login attempt that succeeded, leaving its earlier ones"""
+    with limiter['lock']:
+        events = limiter['events'].get(key)
+        if events:
+            events.pop()
+
+def rate_limit_stats(limiter):
+    """Return a snapshot of the limiter's settings and counters"""
+    with limiter['lock']:
+        stats = dict(limiter['stats'])
+        stats.update({'keys': len(limiter['events']), 'limit': limiter['limit'], 'window': limiter['window']})
+    return stats
+
+# In-memory typeahead indexes. An index is a plain dict made by
+# new_search_index(); each document is stored under an id with the text
+# fields it should match, a sort key and the payload returned for a hit.
+#
+# Every word gets a posting list, and a sorted vocabulary turns a longer
+# prefix into a bisect range of words. Prefixes of up to SEARCH_SHORT_PREFIX
+# characters, which would span most of the vocabulary, get posting lists of
+# their own. Posting lists are kept in sort key order, so a one-word query
+# stops after `limit` hits instead of ranking every candidate. When prefix
+# matching leaves room in the result, trigram overlap fills it, which finds
+# fragments from the middle of a field (phone digits, an email domain) and
+# survives some typos.
+SEARCH_SHORT_PREFIX = 3
+# Share of the query's trigrams a document must contain to count as a fuzzy hit
+SEARCH_MIN_OVERLAP = 0.6
+# Fuzzy matching is skipped when its candidate set is larger than this; a
+# query that unselective has nothing useful to add
+SEARCH_FUZZY_CANDIDATES = 500
+# Candidate sets at most this large are sorted directly; larger ones are
+# picked out of an already ordered posting list that contains them all
+SEARCH_RANK_DIRECT = 1024
+# Multi-word queries whose every word has a posting longer than this walk a
+# ranked list instead of intersecting postings
+SEARCH_WALK_POSTINGS = 8192
+# Letters and digits split into separate words, so 'smith42' indexes as 'smith' and '42'
+_SEARCH_WORD = re.compile(r'[a-z]+|[0-9]+')
+
+def search_words(text):
+    """Lowercase words (runs of letters or of digits) of text, empty for None"""
+    return _SEARCH_WORD.findall(str(text).lower()) if text is not None else []
+
+def search_trigrams(text):
+    """Trigrams of text with punctuation and spaces removed"""
+    compact = ''.join(search_words(text))
+    return {compact[i:i + 3] for i in range(len(compact) - 2)}
+
+def new_search_index():
+    """Create an empty search index"""
+    return {
+        'lock': threading.Lock(),
+        'docs': {},       # id -> (sort_key, ' word word ', fields compacted and joined by '|', payload)
+        'words': {},      # word -> ids in sort key order
+        'vocab': [],      # sorted words
+        'short': {},      # prefix of up to SEARCH_SHORT_PREFIX characters ('' for all) -> ids in sort key order
+        'trigrams': {},   # trigram -> ids
+        'loaded_at': None,
+    }
+
+def _search_document(fields):
+    """(words, compact) for a document's fields: its distinct words space-delimited, and its fields stripped to alphanumerics"""
+    field_words = [search_words(field) for field in fields]
+    words = sorted({word for split in field_words for word in split})
+    return f" {' '.join(words)} ", '|'.join(''.join(split) for split in field_words)
+
+def _search_keys(words):
+    """Short prefix keys of a document's words, '' included"""
+    return {word[:length] for word in words for length in range(min(len(word), SEARCH_SHORT_PREFIX) + 1)} | {''}
+
+def _compact_trigrams(compact):
+    """The three-character substrings of each compacted field, for typo-tolerant matching"""
+    return {field[i:i + 3] for field in compact.split('|') for i in range(len(field) - 2)}
+
+def _ordered_insert(index, postings, key, doc_id, sort_key):
+    """Insert doc_id into a posting list, keeping it in sort key order"""
+    ids = postings.setdefault(key, [])
+    ids.insert(bisect_left(ids, sort_key, key=lambda other: index['docs'][other][0]), doc_id)
+    return len(ids) == 1
+
+def _ordered_delete(index, postings, key, doc_id, sort_key):
+    """Remove doc_id from a posting list; True when the list is now empty and was dropped"""
+    ids = postings.get(key)
+    if ids is None:
+        return False
+    position = bisect_left(ids, sort_key, key=lambda other: index['docs'][other][0])
+    if position < len(ids) and ids[position] == doc_id:
+        del ids[position]
+    if ids:
+        return False
+    del postings[key]
+    return True
+
+def search_index_load(index, documents):
+    """Replace the whole index with (id, fields, sort_key, payload) documents"""
+    docs, words_postings, short, trigram_postings = {}, {}, {}, {}
+    for doc_id, fields, sort_key, payload in sorted(documents, key=lambda document: document[2]):
+        words, compact = _search_document(fields)
+        docs[doc_id] = (sort_key, words, compact, payload)
+        split = words.split()
+        for word in split:
+            words_postings.setdefault(word, []).append(doc_id)
+        for key in _search_keys(split):
+            short.setdefault(key, []).append(doc_id)
+        for trigram in _compact_trigrams(compact):
+            trigram_postings.setdefault(trigram, []).append(doc_id)
+    with index['lock']:
+        index['docs'] = docs
+        index['words'] = words_postings
+        index['vocab'] = sorted(words_postings)
+        index['short'] = short
+        index['trigrams'] = trigram_postings
+        index['loaded_at'] = time.monotonic()
+
+def _search_index_discard(index, doc_id):
+    """Unindex one document if present (caller holds the lock)"""
+    doc = index['docs'].get(doc_id)
+    if doc is None:
+        return
+    sort_key, words, compact, _ = doc
+    split = words.split()
+    for word in split:
+        if _ordered_delete(index, index['words'], word, doc_id, sort_key):
+            del index['vocab'][bisect_left(index['vocab'], word)]
+    for key in _search_keys(split):
+        _ordered_delete(index, index['short'], key, doc_id, sort_key)
+    for trigram in _compact_trigrams(compact):
+        ids = index['trigrams'].get(trigram)
+        if ids is not None and doc_id in ids:
+            ids.remove(doc_id)
+            if not ids:
+                del index['trigrams'][trigram]
+    del index['docs'][doc_id]
+
+def search_index_put(index, doc_id, fields, sort_key, payload):
+    """Add or replace one document"""
+    words, compact = _search_document(fields)
+    split = words.split()
+    with index['lock']:
+        _search_index_discard(index, doc_id)
+        index['docs'][doc_id] = (sort_key, words, compact, payload)
+        for word in split:
+            if _ordered_insert(index, index['words'], word, doc_id, sort_key):
+                insort(index['vocab'], word)
+        for key in _search_keys(split):
+            _ordered_insert(index, index['short'], key, doc_id, sort_key)
+        for trigram in _compact_trigrams(compact):
+            index['trigrams'].setdefault(trigram, []).append(doc_id)
+
+def search_index_remove(index, doc_id):
+    """Drop one document (no-op if it is not indexed)"""
+    with index['lock']:
+        _search_index_discard(index, doc_id)
+
+def _search_prefix_ids(index, prefix):
+    """Ids of documents with a word starting with prefix: an ordered list when one is at hand, else a set"""
+    if len(prefix) <= SEARCH_SHORT_PREFIX:
+        return index['short'].get(prefix, [])
+    vocab = index['vocab']
+    start = bisect_left(vocab, prefix)
+    # '{' sorts after every character a word can contain
+    stop = bisect_left(vocab, prefix + '{', start)
+    if stop - start == 1:
+        return index['words'][vocab[start]]
+    return set().union(*(index['words'][word] for word in vocab[start:stop]))
+
+def _search_collect(ordered, limit, accept, hits, seen):
+    """Append ids from an ordered iterable to hits until there are `limit` of them"""
+    for doc_id in ordered:
+        if len(hits) >= limit:
+            return
+        if doc_id not in seen and (accept is None or accept(doc_id)):
+            hits.append(doc_id)
+            seen.add(doc_id)
+
+def _search_collect_ranked(index, candidates, ordered, limit, accept, hits, seen):
+    """Append the first candidates in sort key order; ordered is a posting list holding all of them"""
+    if len(candidates) <= SEARCH_RANK_DIRECT:
+        docs = index['docs']
+        ordered = sorted(candidates, key=lambda doc_id: docs[doc_id][0])
+    else:
+        ordered = (doc_id for doc_id in ordered if doc_id in candidates)
+    _search_collect(ordered, limit, accept, hits, seen)
+
+def _search_intersect(docs, postings):
+    """
+    Ids in every (ids, needle) posting. Long postings are not scanned: the
+    surviving candidates are checked for the needle (' prefix' or ' word ')
+    in their own space-delimited words instead.
+    """
+    postings = sorted(postings, key=lambda posting: len(posting[0]))
+    candidates = set(postings[0][0])
+    for ids, needle in postings[1:]:
+        if not candidates:
+            break
+        if len(ids) <= 4 * len(candidates):
+            candidates.intersection_update(ids)
+        else:
+            candidates = {doc_id for doc_id in candidates if needle in docs[doc_id][1]}
+    return candidates
+
+def search_index_query(index, text, limit=10, accept=None):
+    """
+    Return the payloads of the best `limit` documents for text.
+
+    Documents where every query word is a whole word come first, then those
+    where every query word is a word prefix, each group in sort key order;
+    trigram hits fill any remaining slots, most overlap first. An empty query
+    lists documents in sort key order. accept(doc_id), when given, filters
+    candidates.
+    """
+    words = search_words(text)
+    with index['lock']:
+        docs = index['docs']
+        hits = []
+        seen = set()
+        # Every match is in the short-prefix list of each query word; walk the shortest of them
+        ordered = min((index['short'].get(word[:SEARCH_SHORT_PREFIX], []) for word in words or ['']), key=len)
+
+        if len(words) <= 1:
+            word = words[0] if words else ''
+            if word in index['words']:
+                _search_collect(index['words'][word], limit, accept, hits, seen)
+            ids = _search_prefix_ids(index, word)
+            if isinstance(ids, list):
+                _search_collect(ids, limit, accept, hits, seen)
+            else:
+                _search_collect_ranked(index, ids, ordered, limit, accept, hits, seen)
+        else:
+            prefix_postings = [(_search_prefix_ids(index, word), ' ' + word) for word in words]
+            whole_postings = None
+            if all(word in index['words'] for word in words):
+                whole_postings = [(index['words'][word], f' {word} ') for word in words]
+            if min(len(ids) for ids, _ in prefix_postings) <= SEARCH_WALK_POSTINGS:
+                # Selective query: intersect the postings and sort what is left
+                candidates = _search_intersect(docs, prefix_postings)
+                if candidates and whole_postings:
+                    whole = _search_intersect(docs, whole_postings)
+                    _search_collect_ranked(index, whole, ordered, limit, accept, hits, seen)
+                _search_collect_ranked(index, candidates, ordered, limit, accept, hits, seen)
+            else:
+                # Every word is common: walk a ranked list, checking each document's own words, until `limit`
+                if whole_postings:
+                    needles = [needle for _, needle in whole_postings]
+                    ranked = min((ids for ids, _ in whole_postings), key=len)
+                    _search_collect((doc_id for doc_id in ranked
+                                     if all(needle in docs[doc_id][1] for needle in needles)),
+                                    limit, accept, hits, seen)
+                needles = [needle for _, needle in prefix_postings]
+                _search_collect((doc_id for doc_id in ordered if all(needle in docs[doc_id][1] for needle in needles)),
+                                limit, accept, hits, seen)
+
+        trigrams = search_trigrams(text)
+        if len(hits) < limit and trigrams:
+            needed = max(1, round(len(trigrams) * SEARCH_MIN_OVERLAP))
+            # A document sharing `needed` trigrams must be in one of the rarest len - needed + 1 postings
+            postings = sorted((index['trigrams'].get(trigram, []) for trigram in trigrams), key=len)
+            candidates = set().union(*postings[:len(trigrams) - needed + 1]) - seen
+            if len(candidates) > SEARCH_FUZZY_CANDIDATES:
+                candidates = ()
+            overlap = {}
+            for doc_id in candidates:
+                compact = docs[doc_id][2]
+                count = sum(trigram in compact for trigram in trigrams)
+                if count >= needed and (accept is None or accept(doc_id)):
+                    overlap[doc_id] = count
+            hits += heapq.nsmallest(limit - len(hits), overlap,
+                                    key=lambda doc_id: (-overlap[doc_id], docs[doc_id][0]))
+        return [docs[doc_id][3] for doc_id in hits]
+
+# Search indexes backed by a table, shared by every blueprint that writes it.
+# A blueprint registers each source once with register_search_source(); the
+# first search loads the whole index, and after that, every SEARCH_INDEX_TTL
+# seconds, only rows whose updated_at moved since the last sync are re-read,
+# which picks up other workers' writes without rebuilding. This worker's own
+# writes re-index the rows they touched with refresh_search_entry().
+SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', 300))
+# Re-read this many seconds before the last sync, for transactions that
+# committed after it with an earlier updated_at
+SEARCH_SYNC_OVERLAP = 60
+# name -> {'index', 'sql' (SELECT of the indexed columns), 'id_column',
+#          'to_document' (row -> (id, fields, sort_key, payload) or None), 'synced' (database time)}
+SEARCH_SOURCES = {}
+
+def register_search_source(name, sql, id_column, to_document):
+    """Register a table-backed search index under name and return the (not yet loaded) index"""
+    index = new_search_index()
+    SEARCH_SOURCES[name] = {'index': index, 'sql': sql, 'id_column': id_column,
+                            'to_document': to_document, 'synced': None}
+    return index
+
+def _apply_search_rows(source, rows):
+    """Put or drop each row's document"""
+    for row in rows:
+        document = source['to_document'](row)
+        if document is None:
+            search_index_remove(source['index'], row[source['id_column']])
+        else:
+            search_index_put(source['index'], *document)
+
+def ensure_search_index(cursor, name):
+    """Load the named index on first use, then sync changed rows once it is older than SEARCH_INDEX_TTL"""
+    source = SEARCH_SOURCES[name]
+    index = source['index']
+    loaded_at = index['loaded_at']
+    if loaded_at is not None and time.monotonic() - loaded_at <= SEARCH_INDEX_TTL:
+        return index
+
+    cursor.execute("SELECT NOW() as now")
+    now = cursor.fetchone()['now']
+    if loaded_at is None:
+        cursor.execute(source['sql'] + " WHERE is_archived = FALSE")
+        search_index_load(index, filter(None, map(source['to_document'], cursor.fetchall())))
+    else:
+        cursor.execute(source['sql'] + " WHERE updated_at >= %s",
+                       (source['synced'] - timedelta(seconds=SEARCH_SYNC_OVERLAP),))
+        _apply_search_rows(source, cursor.fetchall())
+        index['loaded_at'] = time.monotonic()
+    source['synced'] = now
+    return index
+
+def refresh_search_entry(cursor, name, row_id):
+    """
+    Re-index one row of the named source after a committed write.
+
+    Rows that no longer qualify (archived, deleted, out of service) are
+    dropped. Skipped while the index has not been loaded yet.
+    """
+    source = SEARCH_SOURCES[name]
+    if source['index']['loaded_at'] is None:
+        return
+    cursor.execute(source['sql'] + f" WHERE {source['id_column']} = %s", (row_id,))
+    row = cursor.fetchone()
+    if row is None:
+        search_index_remove(source['index'], row_id)
+    else:
+        _apply_search_rows(source, [row])
+
+def refresh_search_entries(cursor, name, condition, params=()):
+    """Re-index every row of the named source matching the SQL condition, in one query (skipped until loaded)"""
+    source = SEARCH_SOURCES[name]
+    if source['index']['loaded_at'] is None:
+        return
+    cursor.execute(source['sql'] + f" WHERE {condition}", params)
+    _apply_search_rows(source, cursor.fetchall())
+
+def expire_search_index(name):
+    """Make the next search sync the named index with the database, e.g. after a bulk import"""
+    source = SEARCH_SOURCES.get(name)
+    if source is not None and source['index']['loaded_at'] is not None:
+        source['index']['loaded_at'] = time.monotonic() - SEARCH_INDEX_TTL - 1
+
+# Keyset pagination. Listing pages seek past the last row they showed instead
+# of using OFFSET, so every page costs one short index range scan.
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = 200
+
+def parse_page_size(value):
+    """Clamp a requested page size (e.g. the per_page query argument) to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def encode_page_token(direction, values):
+    """Pack a page direction ('next'/'prev') and a row's sort-key values into an opaque URL-safe token"""
+    values = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    payload = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_page_token(token):
+    """Return (direction, values) from a page token, or (None, None) when it is missing or malformed"""
+    if not token:
+        return None, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None, None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None, None
+    return direction, values
+
+def keyset_condition(columns, descending, values):
+    """
+    Build the SQL condition selecting rows strictly after `values` in the
+    ordering of `columns` (all ascending, or all descending).
+
+    (a, b) after (x, y) expands to `a > x OR (a = x AND b > y)`, which MySQL
+    turns into an index range scan. Returns (sql, params).
+    """
+    op = '<' if descending else '>'
+    clauses = []
+    params = []
+    for i, column in enumerate(columns):
+        parts = [f"{prev} = %s" for prev in columns[:i]] + [f"{column} {op} %s"]
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+def fetch_keyset_page(cursor, query, conditions, order_columns, key_fields, descending=False,
+                      page_size=PAGE_SIZE, token=None, params=(), fetch_rows=None):
+    """
+    Run a listing query one page at a time.
+
+    `query` is the SELECT ... FROM ... JOIN part, `conditions` the filter SQL
+    fragments (ANDed together, with `params` for their placeholders),
+    `order_columns` the SQL sort columns ending in a unique id and
+    `key_fields` the matching keys of each returned row. One extra row is
+    fetched to tell whether another page exists in the direction of travel.
+    `fetch_rows(cursor)` turns the result into row objects (any that support
+    row[key], such as the models' mappers); by default the cursor's own rows
+    are used.
+
+    Returns a dict with rows (in display order), next_token and prev_token
+    (None when there is no such page).
+    """
+    direction, values = decode_page_token(token)
+    if values is not None and len(values) != len(order_columns):
+        direction, values = None, None
+    backwards = direction == 'prev'
+    scan_descending = descending != backwards
+
+    conditions = list(conditions)
+    params = list(params)
+    if values is not None:
+        seek_sql, seek_params = keyset_condition(order_columns, scan_descending, values)
+        conditions.append(seek_sql)
+        params.extend(seek_params)
+
+    where_sql = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    order_sql = ', '.join(f"{column} {'DESC' if scan_descending else 'ASC'}" for column in order_columns)
+    cursor.execute(f"{query} {where_sql} ORDER BY {order_sql} LIMIT %s", params + [page_size + 1])
+
+    rows = fetch_rows(cursor) if fetch_rows else list(cursor.fetchall())
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    has_next = values is not None if backwards else has_more
+    has_prev = has_more if backwards else values is not None
+    return {
+        'rows': rows,
+        'next_token': encode_page_token('next', [rows[-1][f] for f in key_fields]) if has_next and rows else None,
+        'prev_token': encode_page_token('prev', [rows[0][f] for f in key_fields]) if has_prev and rows else None,
+    }
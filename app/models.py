@@ -1,103 +1,246 @@
-from flask_login import UserMixin
+import os
+import tempfile
+import threading
+
+import pymysql.cursors
 from werkzeug.security import check_password_hash
 from app.db_connect import get_db
+from app.functions import lru_get, lru_invalidate, lru_put, lru_stats, new_lru_cache
 
-class Employee(UserMixin):
-    def __init__(self, employee_id, username, password_hash, first_name, last_name, email, phone, position, hire_date, is_active):
-        self.id = employee_id  # Flask-Login requires this to be 'id'
-        self.employee_id = employee_id
-        self.username = username
-        self.password_hash = password_hash
-        self.first_name = first_name
-        self.last_name = last_name
-        self.email = email
-        self.phone = phone
-        self.position = position
-        self.hire_date = hire_date
-        self._is_active = is_active  # Store as private variable
+# Per-process cache of logged-in employees, so Flask-Login's user loader does
+# not SELECT the employee row on every request. The short max age bounds how
+# long a deactivation made by another process (or directly in MySQL) takes to
+# lock the employee out; changes made through this process invalidate at once.
+EMPLOYEE_CACHE_SIZE = int(os.getenv('EMPLOYEE_CACHE_SIZE', 256))
+EMPLOYEE_CACHE_TTL = float(os.getenv('EMPLOYEE_CACHE_TTL', 60))
+_employee_cache = new_lru_cache(EMPLOYEE_CACHE_SIZE, EMPLOYEE_CACHE_TTL)
 
-    def check_password(self, password):
-        """Verify password against hash"""
-        return check_password_hash(self.password_hash, password)
+# Password checks run in the request's own thread, at most
+# PASSWORD_CHECK_CONCURRENCY at a time across every worker process on the
+# host. pbkdf2/scrypt hashing is CPU-bound, so the cap bounds how many cores
+# login hashing can take from page rendering whatever the worker model: a
+# slot is an exclusive flock() on one of the slot files in
+# PASSWORD_CHECK_LOCK_DIR, which the kernel releases if a worker dies
+# mid-check. A login that finds every slot taken is refused at once rather
+# than queued. Without fcntl (Windows) the cap falls back to a per-process
+# semaphore.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-    def get_id(self):
-        """Return the employee ID as a string (required by Flask-Login)"""
-        return str(self.employee_id)
+PASSWORD_CHECK_CONCURRENCY = int(os.getenv('PASSWORD_CHECK_CONCURRENCY', 2))
+PASSWORD_CHECK_LOCK_DIR = os.getenv('PASSWORD_CHECK_LOCK_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'rental-password-slots'))
+
+class PasswordCheckBusyError(Exception):
+    """Raised when PASSWORD_CHECK_CONCURRENCY password checks are already running"""
+
+_password_slots = threading.BoundedSemaphore(PASSWORD_CHECK_CONCURRENCY)
+_password_stats_lock = threading.Lock()
+_password_stats = {'checks': 0, 'rejected': 0}
+
+def _lock_password_slot():
+    """
+    Take a free slot file: returns its descriptor, still locked, or None when
+    every slot is held (by any thread of any worker on the host). Closing the
+    descriptor frees the slot.
+    """
+    os.makedirs(PASSWORD_CHECK_LOCK_DIR, exist_ok=True)
+    for slot in range(PASSWORD_CHECK_CONCURRENCY):
+        fd = os.open(os.path.join(PASSWORD_CHECK_LOCK_DIR, f'slot-{slot}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+def _reject_password_check():
+    """Count a login refused for want of a slot and raise PasswordCheckBusyError"""
+    with _password_stats_lock:
+        _password_stats['rejected'] += 1
+    raise PasswordCheckBusyError("Too many logins in progress")
+
+def _check_password(password_hash, password):
+    """check_password_hash, counted (the caller holds a slot)"""
+    with _password_stats_lock:
+        _password_stats['checks'] += 1
+    return check_password_hash(password_hash, password)
+
+def verify_password(password_hash, password):
+    """check_password_hash in a free slot; raises PasswordCheckBusyError when there is none"""
+    if fcntl is None:
+        if not _password_slots.acquire(blocking=False):
+            _reject_password_check()
+        try:
+            return _check_password(password_hash, password)
+        finally:
+            _password_slots.release()
+
+    fd = _lock_password_slot()
+    if fd is None:
+        _reject_password_check()
+    try:
+        return _check_password(password_hash, password)
+    finally:
+        os.close(fd)
+
+def get_password_pool_stats():
+    """This process's password check counters, with the size and scope of the slot pool"""
+    with _password_stats_lock:
+        stats = dict(_password_stats)
+    stats['concurrency'] = PASSWORD_CHECK_CONCURRENCY
+    stats['scope'] = 'process' if fcntl is None else 'host'
+    return stats
+
+# Row-to-object mapping. Each model stores its columns in __slots__, so an
+# instance is a fixed-size struct instead of a per-row dict. Rows come from a
+# plain tuple cursor and are turned into objects by a mapper built once per
+# (model, column list), which sets each tuple position on its slot.
+# Models also support row['column'] so code written against DictCursor rows
+# (templates, fetch_keyset_page's key lookup) keeps working.
+_row_mappers = {}
+
+class Model:
+    """Base for the __slots__ entity classes below"""
+    __slots__ = ()
+    # Columns whose attribute name differs from the column name
+    RENAMED = {}
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, self.RENAMED.get(name, name), value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.RENAMED.get(key, key))
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Columns that were loaded, as a dict (e.g. for jsonify)"""
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+def row_mapper(model, columns):
+    """
+    Return a function turning a sequence of tuple rows with the given column
+    names into model instances. Built on first use and cached per (model,
+    columns). Raises ValueError for a column the model has no slot for.
+    """
+    key = (model, columns)
+    mapper = _row_mappers.get(key)
+    if mapper is not None:
+        return mapper
+
+    attrs = tuple(model.RENAMED.get(column, column) for column in columns)
+    unknown = [column for column, attr in zip(columns, attrs) if attr not in model.__slots__]
+    if unknown:
+        raise ValueError(f"{model.__name__} has no slot for column(s): {', '.join(unknown)}")
+
+    new = object.__new__
+
+    def map_rows(rows):
+        objects = []
+        append = objects.append
+        for row in rows:
+            obj = new(model)
+            for attr, value in zip(attrs, row):
+                setattr(obj, attr, value)
+            append(obj)
+        return objects
+
+    mapper = _row_mappers[key] = map_rows
+    return mapper
+
+def tuple_cursor(db):
+    """Open a plain tuple cursor on db (the app's connections default to DictCursor)"""
+    return db.cursor(pymysql.cursors.Cursor)
+
+def fetch_models(cursor, model):
+    """Fetch every remaining row of a tuple cursor's result as model instances"""
+    columns = tuple(column[0] for column in cursor.description)
+    return row_mapper(model, columns)(cursor.fetchall())
+
+def fetch_model(cursor, model):
+    """Fetch the next row of a tuple cursor's result as a model instance (None when exhausted)"""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row_mapper(model, tuple(column[0] for column in cursor.description))((row,))[0]
+
+class Employee(Model):
+    """A logged-in employee; implements the Flask-Login user interface itself so it can stay slotted"""
+    __slots__ = ('employee_id', 'username', 'password_hash', 'first_name', 'last_name', 'email', 'phone',
+                 'position', 'hire_date', '_is_active', 'created_at', 'updated_at')
+    RENAMED = {'is_active': '_is_active'}
+
+    # Flask-Login user interface
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def id(self):
+        return self.employee_id
 
     @property
     def is_active(self):
         """Return True if the employee is active (required by Flask-Login)"""
-        return self._is_active
+        return bool(self._is_active)
+
+    def get_id(self):
+        """Return the employee ID as a string (required by Flask-Login)"""
+        return str(self.employee_id)
+
+    def __eq__(self, other):
+        if isinstance(other, Employee):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.get_id())
+
+    def check_password(self, password):
+        """Verify password against hash (may raise PasswordCheckBusyError)"""
+        return verify_password(self.password_hash, password)
 
     def get_full_name(self):
         """Return full name of employee"""
         return f"{self.first_name} {self.last_name}"
 
     @staticmethod
-    def get_by_id(employee_id):
-        """Get employee by ID"""
-        db = get_db()
-        if db is None:
-            return None
-
-        cursor = db.cursor()
-        cursor.execute("""
+    def _fetch_one(where_sql, value):
+        cursor = tuple_cursor(get_db())
+        cursor.execute(f"""
             SELECT employee_id, username, password_hash, first_name, last_name,
                    email, phone, position, hire_date, is_active
             FROM employee
-            WHERE employee_id = %s AND is_active = TRUE
-        """, (employee_id,))
-
-        row = cursor.fetchone()
+            WHERE {where_sql} AND is_active = TRUE
+        """, (value,))
+        employee = fetch_model(cursor, Employee)
         cursor.close()
+        return employee
 
-        if row:
-            return Employee(
-                employee_id=row['employee_id'],
-                username=row['username'],
-                password_hash=row['password_hash'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                email=row['email'],
-                phone=row['phone'],
-                position=row['position'],
-                hire_date=row['hire_date'],
-                is_active=row['is_active']
-            )
-        return None
+    @staticmethod
+    def get_by_id(employee_id):
+        """Get employee by ID"""
+        return Employee._fetch_one("employee_id = %s", employee_id)
 
     @staticmethod
     def get_by_username(username):
         """Get employee by username"""
-        db = get_db()
-        if db is None:
-            return None
-
-        cursor = db.cursor()
-        cursor.execute("""
-            SELECT employee_id, username, password_hash, first_name, last_name,
-                   email, phone, position, hire_date, is_active
-            FROM employee
-            WHERE username = %s AND is_active = TRUE
-        """, (username,))
-
-        row = cursor.fetchone()
-        cursor.close()
-
-        if row:
-            return Employee(
-                employee_id=row['employee_id'],
-                username=row['username'],
-                password_hash=row['password_hash'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                email=row['email'],
-                phone=row['phone'],
-                position=row['position'],
-                hire_date=row['hire_date'],
-                is_active=row['is_active']
-            )
-        return None
+        return Employee._fetch_one("username = %s", username)
 
     @staticmethod
     def authenticate(username, password):
@@ -106,3 +249,41 @@ class Employee(UserMixin):
         if employee and employee.check_password(password):
             return employee
         return None
+
+    @staticmethod
+    def get_cached(employee_id):
+        """Get an active employee by ID through the per-process cache (used by the user loader)"""
+        return lru_get(_employee_cache, employee_id, lambda: Employee.get_by_id(employee_id))
+
+    @staticmethod
+    def cache(employee):
+        """Seed the cache with a freshly loaded employee, e.g. right after login"""
+        lru_put(_employee_cache, employee.employee_id, employee)
+
+    @staticmethod
+    def invalidate_cache(employee_id=None):
+        """Forget one cached employee (after their row changes or they are deactivated), or all of them"""
+        lru_invalidate(_employee_cache, employee_id)
+
+def get_employee_cache_stats():
+    """Hit/miss counters and size of this process's employee cache"""
+    return lru_stats(_employee_cache)
+
+class Customer(Model):
+    """A customer row, plus the rental totals the customer list joins in"""
+    __slots__ = ('customer_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state',
+                 'zip_code', 'drivers_license', 'is_archived', 'created_at', 'updated_at',
+                 'total_rentals', 'total_spent')
+
+class Equipment(Model):
+    """An equipment row, plus the usage totals the equipment list joins in"""
+    __slots__ = ('equipment_id', 'equipment_name', 'equipment_type', 'description', 'daily_rate',
+                 'condition_status', 'availability_status', 'purchase_date', 'serial_number', 'is_archived',
+                 'created_at', 'updated_at', 'times_rented', 'total_revenue')
+
+class Rental(Model):
+    """A rental row, plus the customer and employee names the rental pages join in"""
+    __slots__ = ('rental_id', 'customer_id', 'employee_id', 'rental_date', 'due_date', 'return_date', 'status',
+                 'subtotal', 'late_fee', 'total_cost', 'notes', 'created_at', 'updated_at',
+                 'customer_first_name', 'customer_last_name', 'customer_phone', 'customer_email',
+                 'employee_first_name', 'employee_last_name')
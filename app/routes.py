@@ -1,6 +1,10 @@
-from flask import render_template, redirect, url_for
-from flask_login import current_user
+from flask import render_template, redirect, url_for, jsonify
+from flask_login import current_user, login_required
 from . import app
+from .db_connect import get_pool_stats
+from .functions import get_fragment_cache_stats
+from .models import get_employee_cache_stats, get_password_pool_stats
+from .blueprints.auth import get_login_throttle_stats
 
 @app.route('/')
 def index():
@@ -8,3 +12,27 @@ def index():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard.index'))
     return redirect(url_for('auth.login'))
+
+@app.route('/health/db-pool')
+@login_required
+def db_pool_stats():
+    """Connection pool size and counters for the worker process serving this request"""
+    return jsonify(get_pool_stats())
+
+@app.route('/health/user-cache')
+@login_required
+def user_cache_stats():
+    """Employee cache hit/miss counters for the worker process serving this request"""
+    return jsonify(get_employee_cache_stats())
+
+@app.route('/health/login')
+@login_required
+def login_stats():
+    """Password check pool and login throttle counters for the worker process serving this request"""
+    return jsonify({'password_pool': get_password_pool_stats(), 'throttle': get_login_throttle_stats()})
+
+@app.route('/health/fragment-cache')
+@login_required
+def fragment_cache_stats():
+    """Listing fragment cache hit/miss counters for the worker process serving this request"""
+    return jsonify(get_fragment_cache_stats())
@@ -0,0 +1,16 @@
+// Mobile menu toggle
+const mobileToggle = document.getElementById('mobileMenuToggle');
+const sidebar = document.getElementById('sidebar');
+const overlay = document.getElementById('mobileOverlay');
+
+if (mobileToggle && sidebar && overlay) {
+    mobileToggle.addEventListener('click', function() {
+        sidebar.classList.add('show');
+        overlay.classList.add('show');
+    });
+
+    overlay.addEventListener('click', function() {
+        sidebar.classList.remove('show');
+        overlay.classList.remove('show');
+    });
+}
@@ -0,0 +1,116 @@
+"""
+Derived rental tables: the summary tables and the materialized overdue list.
+
+Their source queries, and the helpers that rebuild and verify them from
+scratch, live here rather than in the rentals blueprint because bulk loaders
+(scripts/generate_seed_data.py) need them too. The module imports nothing
+from the app, so a script can load it by path without building the Flask
+app. The rentals blueprint keeps the tables in step with each write.
+"""
+
+# Flat late fee, as a share of the subtotal, once a rental runs past its due date
+LATE_FEE_RATE = 0.10
+
+# Shared change counter (a data_version row) for the whole rental history.
+# Bulk loads bump it to retire every cached analytics month at once; see
+# app.functions for the per-month counters that single writes bump.
+RENTAL_HISTORY_COUNTER = 'rental_history'
+
+# Live GROUP BY queries the summary tables are rebuilt from and checked against.
+# Each maps a summary table to (key column, live aggregate query).
+SUMMARY_SOURCES = {
+    'rental_status_summary': ('status', """
+        SELECT status, COUNT(*) as rental_count, SUM(total_cost) as total_cost, SUM(late_fee) as late_fee_total
+        FROM rental
+        GROUP BY status
+    """),
+    'rental_customer_summary': ('customer_id', """
+        SELECT customer_id, COUNT(*) as total_rentals, SUM(total_cost) as total_spent
+        FROM rental
+        GROUP BY customer_id
+    """),
+    'rental_equipment_summary': ('equipment_id', """
+        SELECT equipment_id, COUNT(*) as times_rented, SUM(line_total) as total_revenue
+        FROM rental_detail
+        GROUP BY equipment_id
+    """),
+}
+
+def rebuild_rental_summaries(cursor):
+    """Replace every summary table's rows with a fresh GROUP BY over rental/rental_detail (caller commits)"""
+    for table, (key, query) in SUMMARY_SOURCES.items():
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} {query}")
+
+def check_rental_summaries(cursor):
+    """
+    Compare each summary table with its live GROUP BY.
+
+    Rows that are all zero count as missing, so emptied summaries left behind
+    by deletes are not reported. Returns a list of mismatch descriptions
+    (empty when the summaries are consistent).
+    """
+    mismatches = []
+    for table, (key, query) in SUMMARY_SOURCES.items():
+        cursor.execute(query)
+        live = {row[key]: row for row in cursor.fetchall()}
+        cursor.execute(f"SELECT * FROM {table}")
+        stored = {row[key]: row for row in cursor.fetchall() if any(v for k, v in row.items() if k != key)}
+
+        for key_value in sorted(set(live) | set(stored), key=str):
+            live_row = live.get(key_value)
+            stored_row = stored.get(key_value)
+            if live_row is None or stored_row is None:
+                mismatches.append(f"{table} {key}={key_value}: live={live_row} summary={stored_row}")
+                continue
+            for column, live_value in live_row.items():
+                if column != key and (live_value or 0) != stored_row[column]:
+                    mismatches.append(f"{table} {key}={key_value} {column}: "
+                                      f"live={live_value} summary={stored_row[column]}")
+    return mismatches
+
+# The materialized overdue list (overdue_rental): one row per Overdue rental
+# with the customer's contact details and the equipment names already joined.
+# The rentals blueprint keeps it in step with rental writes; the dashboard and
+# the collections export read it.
+OVERDUE_COLUMNS = ('rental_id', 'customer_id', 'rental_date', 'due_date', 'subtotal', 'late_fee', 'total_cost',
+                   'first_name', 'last_name', 'phone', 'email', 'equipment_list')
+OVERDUE_SOURCE = """
+    SELECT
+        r.rental_id, r.customer_id, r.rental_date, r.due_date, r.subtotal, r.late_fee, r.total_cost,
+        c.first_name, c.last_name, c.phone, c.email,
+        GROUP_CONCAT(e.equipment_name ORDER BY rd.rental_detail_id SEPARATOR ', ') as equipment_list
+    FROM rental r
+    JOIN customer c ON r.customer_id = c.customer_id
+    JOIN rental_detail rd ON r.rental_id = rd.rental_id
+    JOIN equipment e ON rd.equipment_id = e.equipment_id
+    WHERE r.status = 'Overdue' {condition}
+    GROUP BY r.rental_id
+"""
+
+def rebuild_overdue_rentals(cursor):
+    """Replace every overdue_rental row with the live join (caller commits)"""
+    cursor.execute("DELETE FROM overdue_rental")
+    cursor.execute(f"INSERT INTO overdue_rental ({', '.join(OVERDUE_COLUMNS)}) "
+                   + OVERDUE_SOURCE.format(condition=''))
+
+def check_overdue_rentals(cursor):
+    """Compare overdue_rental with the live join; returns a list of mismatch descriptions"""
+    cursor.execute(OVERDUE_SOURCE.format(condition=''))
+    live = {row['rental_id']: row for row in cursor.fetchall()}
+    cursor.execute(f"SELECT {', '.join(OVERDUE_COLUMNS)} FROM overdue_rental")
+    stored = {row['rental_id']: row for row in cursor.fetchall()}
+
+    mismatches = []
+    for rental_id in sorted(set(live) | set(stored)):
+        live_row = live.get(rental_id)
+        stored_row = stored.get(rental_id)
+        if live_row is None or stored_row is None:
+            state = 'missing' if stored_row is None else 'not overdue in the live join'
+            mismatches.append(f"overdue_rental rental_id={rental_id}: {state}")
+            continue
+        for column in OVERDUE_COLUMNS:
+            if live_row[column] != stored_row[column]:
+                mismatches.append(f"overdue_rental rental_id={rental_id} {column}: "
+                                  f"live={live_row[column]} stored={stored_row[column]}")
+    return mismatches
@@ -2,6 +2,14 @@
 -- Run this file to create the required database structure
 
 -- Drop tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS data_version;
+DROP TABLE IF EXISTS overdue_rental;
+DROP TABLE IF EXISTS import_progress;
+DROP TABLE IF EXISTS rollup_watermark;
+DROP TABLE IF EXISTS equipment_daily_rollup;
+DROP TABLE IF EXISTS rental_equipment_summary;
+DROP TABLE IF EXISTS rental_customer_summary;
+DROP TABLE IF EXISTS rental_status_summary;
 DROP TABLE IF EXISTS rental_detail;
 DROP TABLE IF EXISTS rental;
 DROP TABLE IF EXISTS equipment;
@@ -90,6 +98,87 @@ CREATE TABLE rental_detail (
     FOREIGN KEY (equipment_id) REFERENCES equipment(equipment_id) ON DELETE RESTRICT
 );
 
+-- Summary tables: running aggregates over rental and rental_detail.
+-- The rental write handlers keep them in step inside the same transaction;
+-- `flask --app app rentals rebuild-summaries` recomputes them from scratch.
+CREATE TABLE rental_status_summary (
+    status ENUM('Active', 'Completed', 'Overdue') PRIMARY KEY,
+    rental_count INT NOT NULL DEFAULT 0,
+    total_cost DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    late_fee_total DECIMAL(12, 2) NOT NULL DEFAULT 0.00
+);
+
+CREATE TABLE rental_customer_summary (
+    customer_id INT PRIMARY KEY,
+    total_rentals INT NOT NULL DEFAULT 0,
+    total_spent DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON DELETE CASCADE
+);
+
+CREATE TABLE rental_equipment_summary (
+    equipment_id INT PRIMARY KEY,
+    times_rented INT NOT NULL DEFAULT 0,
+    total_revenue DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    FOREIGN KEY (equipment_id) REFERENCES equipment(equipment_id) ON DELETE CASCADE
+);
+
+-- Per-equipment, per-day utilization, filled incrementally by `flask analytics rollup-utilization`
+CREATE TABLE equipment_daily_rollup (
+    equipment_id INT NOT NULL,
+    rollup_date DATE NOT NULL,
+    rented_days TINYINT NOT NULL DEFAULT 0,
+    idle_days TINYINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (equipment_id, rollup_date),
+    FOREIGN KEY (equipment_id) REFERENCES equipment(equipment_id) ON DELETE CASCADE
+);
+
+-- One denormalized row per Overdue rental: the customer's contact details and the rental's
+-- equipment names, for the dashboard and the collections export. Rental writes refresh their
+-- rows in the same transaction; `flask --app app rentals refresh-overdue` rebuilds it.
+CREATE TABLE overdue_rental (
+    rental_id INT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    rental_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    subtotal DECIMAL(10, 2) NOT NULL,
+    late_fee DECIMAL(10, 2) NOT NULL,
+    total_cost DECIMAL(10, 2) NOT NULL,
+    first_name VARCHAR(50) NOT NULL,
+    last_name VARCHAR(50) NOT NULL,
+    phone VARCHAR(20),
+    email VARCHAR(100),
+    equipment_list TEXT
+);
+
+-- Last day each incremental job has fully processed
+CREATE TABLE rollup_watermark (
+    job_name VARCHAR(50) PRIMARY KEY,
+    processed_through DATE NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Progress of each bulk CSV import (`flask imports load`, /import/<kind>), keyed by a hash of
+-- the file, so an interrupted import resumes after its last committed batch
+CREATE TABLE import_progress (
+    import_key CHAR(64) PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL,
+    source VARCHAR(255),
+    rows_done INT NOT NULL DEFAULT 0,
+    inserted INT NOT NULL DEFAULT 0,
+    duplicates INT NOT NULL DEFAULT 0,
+    invalid INT NOT NULL DEFAULT 0,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Change counter per table, advanced after every committed write (bump_data_version);
+-- read once per request to build ETags and listing cache keys
+CREATE TABLE data_version (
+    table_name VARCHAR(50) PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0
+);
+
 -- Create indexes for performance optimization
 CREATE INDEX idx_employee_username ON employee(username);
 CREATE INDEX idx_employee_email ON employee(email);
@@ -104,4 +193,22 @@ CREATE INDEX idx_rental_employee ON rental(employee_id);
 CREATE INDEX idx_rental_status ON rental(status);
 CREATE INDEX idx_rental_dates ON rental(rental_date, due_date);
 CREATE INDEX idx_rental_detail_rental ON rental_detail(rental_id);
-CREATE INDEX idx_rental_detail_equipment ON rental_detail(equipment_id);
\ No newline at end of file
+CREATE INDEX idx_rental_detail_equipment ON rental_detail(equipment_id);
+CREATE INDEX idx_equipment_summary_times ON rental_equipment_summary(times_rented);
+
+-- Keyset pagination indexes: filter column first, then the listing's sort order ending in the primary key
+CREATE INDEX idx_rental_status_date ON rental(status, rental_date, rental_id);
+CREATE INDEX idx_customer_archived_name ON customer(is_archived, last_name, first_name, customer_id);
+CREATE INDEX idx_equipment_archived_type_name ON equipment(is_archived, equipment_type, equipment_name, equipment_id);
+
+-- Overdue list in due-date order, and the rows to refresh after a customer edit
+CREATE INDEX idx_overdue_due ON overdue_rental(due_date, rental_id);
+CREATE INDEX idx_overdue_customer ON overdue_rental(customer_id);
+
+-- Utilization range queries: date range first, covering the summed columns
+CREATE INDEX idx_rollup_date ON equipment_daily_rollup(rollup_date, equipment_id, rented_days, idle_days, revenue);
+
+-- Utilization rollup: rentals out or returned since a chunk's first day, and the longest
+-- billing period, so each run reads only the rentals that touch the days it processes
+CREATE INDEX idx_rental_return ON rental(return_date);
+CREATE INDEX idx_rental_detail_days ON rental_detail(days_rented);
@@ -107,4 +107,26 @@ INSERT INTO rental_detail (rental_id, equipment_id, quantity, daily_rate, days_r
 
 -- Rental 12: Lawn Mower for 3 days (Completed with late fee)
 INSERT INTO rental_detail (rental_id, equipment_id, quantity, daily_rate, days_rented, line_total) VALUES
-(12, 4, 1, 40.00, 3, 120.00);
\ No newline at end of file
+(12, 4, 1, 40.00, 3, 120.00);
+-- Build the summary tables from the rentals above
+INSERT INTO rental_status_summary (status, rental_count, total_cost, late_fee_total)
+SELECT status, COUNT(*), SUM(total_cost), SUM(late_fee) FROM rental GROUP BY status;
+
+INSERT INTO rental_customer_summary (customer_id, total_rentals, total_spent)
+SELECT customer_id, COUNT(*), SUM(total_cost) FROM rental GROUP BY customer_id;
+
+INSERT INTO rental_equipment_summary (equipment_id, times_rented, total_revenue)
+SELECT equipment_id, COUNT(*), SUM(line_total) FROM rental_detail GROUP BY equipment_id;
+
+-- Materialize the overdue rentals for the dashboard (same join as refresh_overdue_rentals)
+INSERT INTO overdue_rental (rental_id, customer_id, rental_date, due_date, subtotal, late_fee, total_cost,
+                            first_name, last_name, phone, email, equipment_list)
+SELECT r.rental_id, r.customer_id, r.rental_date, r.due_date, r.subtotal, r.late_fee, r.total_cost,
+       c.first_name, c.last_name, c.phone, c.email,
+       GROUP_CONCAT(e.equipment_name ORDER BY rd.rental_detail_id SEPARATOR ', ')
+FROM rental r
+JOIN customer c ON r.customer_id = c.customer_id
+JOIN rental_detail rd ON r.rental_id = rd.rental_id
+JOIN equipment e ON rd.equipment_id = e.equipment_id
+WHERE r.status = 'Overdue'
+GROUP BY r.rental_id;
@@ -63,7 +63,11 @@ def deploy_seed_data():
                 try:
                     cursor.execute(statement)
                     # Determine what was inserted
-                    if 'INTO customer' in statement:
+                    if '_summary' in statement:
+                        print("[OK] Summary table rebuilt")
+                    elif 'INTO overdue_rental' in statement:
+                        print("[OK] Overdue rentals materialized")
+                    elif 'INTO customer' in statement:
                         print("[OK] Customers inserted")
                     elif 'INTO equipment' in statement:
                         print("[OK] Equipment inserted")
@@ -0,0 +1,1168 @@
+"""
+Benchmarks for the rental system's hot paths.
+
+Runs against the database configured in .env (load it with
+deploy_seed_data.py first). Benchmarks that write do so inside a transaction
+that is rolled back, so the data is left as it was.
+
+    python scripts/benchmark.py create-rental --items 20 --repeat 50
+    python scripts/benchmark.py reservation-stress --threads 16 --attempts 200
+    python scripts/benchmark.py availability --rentals 100000 --fleet 500
+    python scripts/benchmark.py models --rows 10000
+    python scripts/benchmark.py export --rows 1000000 --gzip
+    python scripts/benchmark.py analytics --rows 1000000
+    python scripts/benchmark.py analytics-load --months 24 --repeat 5
+    python scripts/benchmark.py search --customers 50000
+    python scripts/benchmark.py import --rows 20000
+    python scripts/benchmark.py routes --requests 200 --concurrency 8 --compare baseline.json
+    python scripts/benchmark.py login-flood --flood-threads 16
+    python scripts/benchmark.py fragments --rows 10000
+    python scripts/benchmark.py compression --rows 10000
+    python scripts/benchmark.py overdue --repeat 50
+"""
+import argparse
+import csv
+import http.client
+import io
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pymysql
+import pymysql.cursors
+from dotenv import load_dotenv
+from werkzeug.serving import make_server
+
+# Run from the repo root as `python scripts/benchmark.py`: the app package lives one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.blueprints.rentals import (EquipmentUnavailableError, apply_rental_to_summaries, build_interval_bucket,
+                                   insert_rental, interval_overlaps)
+from app.blueprints.analytics import (BUCKET_COLUMNS, ANALYTICS_CHUNK_ROWS, bucket_rows, combine_buckets,
+                                     compute_bucket, load_bucket_frame, month_buckets, next_month)
+from app.blueprints.exports import RENTAL_COLUMNS, gzip_chunks, nest_rental_lines, serialize_csv, serialize_json
+from app.blueprints.imports import CUSTOMER_IMPORT_COLUMNS, describe_import, import_csv, import_key_for
+from app.db_connect import run_in_transaction
+from app.functions import bump_data_version, cached_fragment, new_search_index, search_index_load, search_index_query, search_words
+from app.models import Rental, row_mapper
+from app.summaries import OVERDUE_COLUMNS, OVERDUE_SOURCE, check_overdue_rentals
+
+load_dotenv()
+
+def connect():
+    """Open a DictCursor connection with the same settings as the app"""
+    return pymysql.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+def statements_sent(cursor):
+    """Statements this session has sent to the server (MySQL's Questions counter)"""
+    cursor.execute("SHOW SESSION STATUS LIKE 'Questions'")
+    return int(cursor.fetchone()['Value'])
+
+def summarize(label, timings, round_trips=None):
+    """Print one result line: round trips (when measured) and latency percentiles in milliseconds"""
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    trips = f"round trips={round_trips:<4} " if round_trips is not None else ""
+    print(f"  {label:<12} {trips}mean={statistics.mean(timings) * 1000:8.2f}ms "
+          f"p95={p95 * 1000:8.2f}ms")
+    return statistics.mean(timings)
+
+def legacy_insert_rental(cursor, customer_id, employee_id, rental_date, due_date, notes, equipment_ids, days_rented):
+    """The original per-line create_rental writes: one rate SELECT, detail INSERT and equipment UPDATE per item"""
+    subtotal = 0
+    rental_details = []
+    for i, equip_id in enumerate(equipment_ids):
+        cursor.execute("SELECT daily_rate FROM equipment WHERE equipment_id = %s", (equip_id,))
+        equipment = cursor.fetchone()
+        if equipment:
+            daily_rate = float(equipment['daily_rate'])
+            days = int(days_rented[i]) if i < len(days_rented) else 1
+            subtotal += daily_rate * days
+            rental_details.append((equip_id, daily_rate, days, daily_rate * days))
+
+    cursor.execute("""
+        INSERT INTO rental (customer_id, employee_id, rental_date, due_date, status, subtotal, late_fee, total_cost, notes)
+        VALUES (%s, %s, %s, %s, 'Active', %s, 0.00, %s, %s)
+    """, (customer_id, employee_id, rental_date, due_date, subtotal, subtotal, notes))
+    rental_id = cursor.lastrowid
+
+    for equip_id, daily_rate, days, line_total in rental_details:
+        cursor.execute("""
+            INSERT INTO rental_detail (rental_id, equipment_id, quantity, daily_rate, days_rented, line_total)
+            VALUES (%s, %s, 1, %s, %s, %s)
+        """, (rental_id, equip_id, daily_rate, days, line_total))
+        cursor.execute("UPDATE equipment SET availability_status = 'Rented' WHERE equipment_id = %s", (equip_id,))
+
+    apply_rental_to_summaries(cursor, rental_id, 1)
+    return rental_id
+
+def bench_create_rental(args):
+    """Time per-line vs batched rental creation for an order of --items equipment lines"""
+    connection = connect()
+    cursor = connection.cursor()
+
+    cursor.execute("SELECT customer_id FROM customer ORDER BY customer_id LIMIT 1")
+    customer_id = cursor.fetchone()['customer_id']
+    cursor.execute("SELECT employee_id FROM employee ORDER BY employee_id LIMIT 1")
+    employee_id = cursor.fetchone()['employee_id']
+    cursor.execute("""
+        SELECT equipment_id FROM equipment
+        WHERE is_archived = FALSE AND availability_status IN ('Available', 'Rented')
+        ORDER BY equipment_id LIMIT %s
+    """, (args.items,))
+    fleet = [row['equipment_id'] for row in cursor.fetchall()]
+    if not fleet:
+        print("[ERROR] No equipment rows to rent; seed the database first")
+        return
+    equipment_ids = [str(fleet[i % len(fleet)]) for i in range(args.items)]
+    days_rented = ['3'] * args.items
+    # A window no existing rental reaches, so every run can book the same items
+    far_future = date(date.today().year + 50, 1, 1)
+    connection.rollback()
+
+    print(f"[INFO] create-rental: {args.items} items, {args.repeat} runs each (rolled back)")
+    means = {}
+    for label, writer in (('per-line', legacy_insert_rental), ('batched', insert_rental)):
+        timings = []
+        round_trips = 0
+        for _ in range(args.repeat):
+            before = statements_sent(cursor)
+            started = time.perf_counter()
+            writer(cursor, customer_id, employee_id, far_future, far_future + timedelta(days=7), 'benchmark',
+                   equipment_ids, days_rented)
+            connection.rollback()
+            timings.append(time.perf_counter() - started)
+            # Exclude the SHOW STATUS query itself; the ROLLBACK stands in for the COMMIT
+            round_trips = statements_sent(cursor) - before - 1
+        means[label] = summarize(label, timings, round_trips)
+
+    print(f"[OK] batched is {means['per-line'] / means['batched']:.1f}x faster")
+    cursor.close()
+    connection.close()
+
+def bench_reservation_stress(args):
+    """
+    Race --threads connections booking random sets of --items equipment for
+    random windows and verify that no item is ever booked for two
+    overlapping windows.
+
+    The windows lie in a far-future month, so they only collide with each
+    other and never flip an item's status; every rental the run created is
+    taken out of the summary rows and deleted at the end.
+    """
+    setup = connect()
+    cursor = setup.cursor()
+    cursor.execute("""
+        SELECT equipment_id FROM equipment
+        WHERE is_archived = FALSE AND availability_status IN ('Available', 'Rented')
+        ORDER BY equipment_id LIMIT %s
+    """, (args.fleet,))
+    fleet = [row['equipment_id'] for row in cursor.fetchall()]
+    cursor.execute("SELECT customer_id FROM customer ORDER BY customer_id LIMIT 1")
+    customer = cursor.fetchone()
+    cursor.execute("SELECT employee_id FROM employee ORDER BY employee_id LIMIT 1")
+    employee = cursor.fetchone()
+    setup.rollback()
+    if len(fleet) < args.items or not customer or not employee:
+        print("[ERROR] Not enough equipment, customer or employee rows; seed the database first")
+        return
+
+    first_day = date(date.today().year + 50, 1, 1)
+    bookings = []   # (rental_id, equipment_ids, start, end)
+    outcomes = Counter()
+    results_lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        connection = connect()
+        for _ in range(args.attempts):
+            wanted = rng.sample(fleet, args.items)
+            start = first_day + timedelta(days=rng.randrange(28))
+            end = start + timedelta(days=rng.randrange(4))
+            try:
+                rental_id = run_in_transaction(connection, lambda cur: insert_rental(
+                    cur, customer['customer_id'], employee['employee_id'], start, end, 'reservation-stress',
+                    wanted, []))
+                outcome = 'booked'
+                with results_lock:
+                    bookings.append((rental_id, wanted, start, end))
+            except EquipmentUnavailableError:
+                outcome = 'unavailable'
+            except pymysql.err.OperationalError as e:
+                outcome = f'mysql error {e.args[0]}'
+            with results_lock:
+                outcomes[outcome] += 1
+        connection.close()
+
+    print(f"[INFO] reservation-stress: {args.threads} threads x {args.attempts} bookings of "
+          f"{args.items} items over {len(fleet)} equipment rows")
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        for rental_id, _, _, _ in bookings:
+            apply_rental_to_summaries(cursor, rental_id, -1)
+            cursor.execute("DELETE FROM rental WHERE rental_id = %s", (rental_id,))
+        setup.commit()
+        cursor.close()
+        setup.close()
+
+    windows = {}
+    for _, wanted, start, end in bookings:
+        for equip_id in wanted:
+            windows.setdefault(equip_id, []).append((start, end))
+    double_booked = sorted(equip_id for equip_id, booked in windows.items()
+                           if any(later[0] <= earlier[1] for earlier, later in zip(sorted(booked), sorted(booked)[1:])))
+    total = sum(outcomes.values())
+    print(f"  outcomes: {dict(outcomes)}")
+    print(f"  throughput: {total / elapsed:.0f} booking attempts/s over {elapsed:.2f}s")
+    if double_booked:
+        print(f"[ERROR] equipment booked for overlapping windows: {double_booked}")
+        raise SystemExit(1)
+    print(f"[OK] {len(bookings)} rentals booked, no item booked twice for the same day")
+
+def bench_availability(args):
+    """
+    Answer "which equipment is free from start to end" over --rentals synthetic
+    closed rentals, by linear scan and by the sorted-interval index.
+
+    Runs in-process (no database) so it measures the lookup alone; both
+    methods must agree on every query.
+    """
+    rng = random.Random(args.seed)
+    first_day = date(2020, 1, 1)
+    span_days = 365 * 5
+    history = {equip_id: [] for equip_id in range(1, args.fleet + 1)}
+    for rental_id in range(1, args.rentals + 1):
+        start = first_day + timedelta(days=rng.randrange(span_days))
+        end = start + timedelta(days=rng.randint(1, 14))
+        history[rng.randint(1, args.fleet)].append((start, end, rental_id))
+
+    started = time.perf_counter()
+    buckets = {equip_id: build_interval_bucket(intervals) for equip_id, intervals in history.items()}
+    build_time = time.perf_counter() - started
+
+    windows = []
+    for _ in range(args.queries):
+        start = first_day + timedelta(days=rng.randrange(span_days))
+        windows.append((start, start + timedelta(days=rng.randint(1, 14))))
+
+    def linear(start, end):
+        return [equip_id for equip_id, intervals in history.items()
+                if not any(s <= end and e >= start for s, e, _ in intervals)]
+
+    def indexed(start, end):
+        return [equip_id for equip_id, bucket in buckets.items()
+                if not interval_overlaps(bucket, start, end)]
+
+    print(f"[INFO] availability: {args.rentals} rentals over {args.fleet} equipment, {args.queries} window queries")
+    print(f"  index build: {build_time * 1000:.1f}ms")
+    means = {}
+    answers = {}
+    for label, lookup in (('linear scan', linear), ('interval idx', indexed)):
+        timings = []
+        answers[label] = []
+        for start, end in windows:
+            query_started = time.perf_counter()
+            answers[label].append(lookup(start, end))
+            timings.append(time.perf_counter() - query_started)
+        means[label] = summarize(label, timings)
+
+    if answers['linear scan'] != answers['interval idx']:
+        print("[ERROR] index and linear scan disagree")
+        raise SystemExit(1)
+    print(f"[OK] results match; index is {means['linear scan'] / means['interval idx']:.1f}x faster")
+
+def bench_models(args):
+    """
+    Build --rows rental listing rows as DictCursor dicts and as slotted Rental
+    objects from the same tuples, comparing time and retained memory.
+
+    The dict path is what PyMySQL's DictCursor does per row (dict(zip(...)));
+    the tuples stand in for what a plain cursor returns, so no database is needed.
+    """
+    columns = ('rental_id', 'rental_date', 'due_date', 'return_date', 'status', 'subtotal', 'late_fee',
+               'total_cost', 'notes', 'customer_first_name', 'customer_last_name', 'customer_phone',
+               'customer_email', 'employee_first_name', 'employee_last_name')
+    first_day = date(2024, 1, 1)
+    rows = [(i, first_day + timedelta(days=i % 365), first_day + timedelta(days=i % 365 + 7), None, 'Active',
+             100.0, 0.0, 100.0, '', f'First{i}', f'Last{i}', '555-0100', f'c{i}@example.com', 'John', 'Admin')
+            for i in range(args.rows)]
+
+    def as_dicts(rows):
+        return [dict(zip(columns, row)) for row in rows]
+
+    map_rentals = row_mapper(Rental, columns)
+
+    print(f"[INFO] models: {args.rows} rows x {len(columns)} columns, best of {args.repeat}")
+    results = {}
+    for label, build in (('dict rows', as_dicts), ('slot models', map_rentals)):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            build(rows)
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        built = build(rows)
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del built
+
+        results[label] = (min(timings), retained)
+        print(f"  {label:<12} time={min(timings) * 1000:8.2f}ms memory={retained / 1024:9.1f}KiB "
+              f"({retained / args.rows:.0f} bytes/row)")
+
+    dict_time, dict_memory = results['dict rows']
+    model_time, model_memory = results['slot models']
+    speed = (f"{dict_time / model_time:.1f}x faster" if model_time <= dict_time
+             else f"{model_time / dict_time:.1f}x slower")
+    print(f"[OK] models use {dict_memory / model_memory:.1f}x less memory and build {speed} than dict rows")
+
+def peak_rss_mib():
+    """Peak resident set size of this process so far, in MiB (Linux reports ru_maxrss in KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_export(args):
+    """
+    Stream --rows synthetic rental lines through the export serializers and
+    check that peak RSS grows by less than --max-rss-mib.
+
+    Rows come from a generator, as they do from the server-side cursor, so
+    this measures the serializer and gzip path alone.
+    """
+    first_day = date(2020, 1, 1)
+
+    def synthetic_rows():
+        for i in range(args.rows):
+            rental_id = i // 3 + 1
+            rental_date = first_day + timedelta(days=rental_id % 1500)
+            yield {
+                'rental_id': rental_id, 'rental_date': rental_date, 'due_date': rental_date + timedelta(days=7),
+                'return_date': None, 'status': 'Active', 'subtotal': 150.0, 'late_fee': 0.0, 'total_cost': 150.0,
+                'notes': 'benchmark row', 'customer_id': rental_id % 5000, 'customer_first_name': 'First',
+                'customer_last_name': f'Last{rental_id % 5000}', 'employee_id': 1, 'rental_detail_id': i + 1,
+                'equipment_id': i % 500, 'equipment_name': f'Equipment {i % 500}', 'quantity': 1,
+                'daily_rate': 50.0, 'days_rented': 1, 'line_total': 50.0,
+            }
+
+    print(f"[INFO] export: {args.rows} rows per format{' (gzip)' if args.gzip else ''}, "
+          f"baseline peak RSS {peak_rss_mib():.1f}MiB")
+    failed = False
+    for fmt in ('csv', 'json'):
+        baseline = peak_rss_mib()
+        if fmt == 'json':
+            chunks = serialize_json(nest_rental_lines(synthetic_rows()))
+        else:
+            chunks = serialize_csv(synthetic_rows(), RENTAL_COLUMNS)
+        if args.gzip:
+            chunks = gzip_chunks(chunks)
+
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in chunks)
+        elapsed = time.perf_counter() - started
+        growth = peak_rss_mib() - baseline
+        failed = failed or growth > args.max_rss_mib
+        print(f"  {fmt:<5} {size / 1024 / 1024:8.1f}MiB out in {elapsed:6.2f}s "
+              f"({args.rows / elapsed:,.0f} rows/s), peak RSS +{growth:.1f}MiB")
+
+    if failed:
+        print(f"[ERROR] peak RSS grew by more than {args.max_rss_mib}MiB")
+        raise SystemExit(1)
+    print(f"[OK] peak RSS stayed within +{args.max_rss_mib}MiB")
+
+def bench_analytics(args):
+    """
+    Run the analytics engine over --rows synthetic rental lines spread across
+    --months months: chunked tuple-to-DataFrame conversion (as rows arrive
+    from the cursor), then every month bucket, then the combined metrics.
+    """
+    rng = random.Random(args.seed)
+    today = date.today()
+    first = month_buckets(today - timedelta(days=30 * args.months), today)[0]
+    span = (today - first).days
+    fleet = 500
+    rows = []
+    rental_id = 0
+    while len(rows) < args.rows:
+        rental_id += 1
+        start = first + timedelta(days=rng.randrange(span))
+        returned = start + timedelta(days=rng.randint(1, 14))
+        return_date = returned if returned < today else None
+        late_fee = 5.0 if rng.random() < 0.1 else 0.0
+        for _ in range(rng.randint(1, 3)):
+            rows.append((rental_id, start, return_date, 50.0 + late_fee, late_fee, rng.randrange(1, fleet + 1)))
+    rows = rows[:args.rows]
+    print(f"[INFO] analytics: {len(rows)} lines, {rental_id} rentals over {args.months} months")
+
+    started = time.perf_counter()
+    frames = []
+    for offset in range(0, len(rows), ANALYTICS_CHUNK_ROWS):
+        frame = pd.DataFrame.from_records(rows[offset:offset + ANALYTICS_CHUNK_ROWS], columns=BUCKET_COLUMNS)
+        frame['rental_date'] = pd.to_datetime(frame['rental_date'])
+        frame['return_date'] = pd.to_datetime(frame['return_date'])
+        frames.append(frame)
+    lines = pd.concat(frames, ignore_index=True)
+    load_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    buckets = []
+    for start in month_buckets(first, today):
+        end = next_month(start)
+        buckets.append(compute_bucket(bucket_rows(lines, start, end), start, end, today))
+    bucket_time = time.perf_counter() - started
+
+    equipment = pd.DataFrame({'equipment_name': [f'Equipment {i}' for i in range(1, fleet + 1)],
+                              'equipment_type': [f'Type {i % 12}' for i in range(1, fleet + 1)]},
+                             index=pd.Index(range(1, fleet + 1), name='equipment_id'))
+    started = time.perf_counter()
+    metrics = combine_buckets(buckets, first, today, equipment)
+    combine_time = time.perf_counter() - started
+
+    print(f"  chunked load  {load_time * 1000:8.1f}ms")
+    print(f"  all buckets   {bucket_time * 1000:8.1f}ms ({len(buckets)} months)")
+    print(f"  combine       {combine_time * 1000:8.1f}ms")
+    print(f"  revenue=${metrics['revenue']:,.2f} avg length={metrics['avg_rental_days']:.2f} days "
+          f"late rate={metrics['late_return_rate']:.1%}")
+    print(f"[OK] {load_time + bucket_time + combine_time:.2f}s cold; a warm page load recomputes only "
+          f"the current month ({bucket_time / len(buckets) * 1000:.0f}ms on average)")
+
+def bench_search(args):
+    """
+    Typeahead over --customers synthetic customers: a linear word-prefix scan
+    vs the prefix/trigram search index, top --limit results per query.
+
+    Runs in-process (no database). Both methods must return the same prefix
+    hits, and the index has to answer within --budget-ms on average.
+    """
+    rng = random.Random(args.seed)
+    first_names = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+                   'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah']
+    last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+                  'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore']
+    # Real surnames are long-tailed: a few common ones, then thousands of rare ones
+    syllables = ['bar', 'ker', 'mon', 'ton', 'ric', 'hal', 'den', 'vel', 'sto', 'lin', 'gar', 'fel', 'wen', 'dor']
+    rare_names = [(a + b + c).capitalize() for a in syllables for b in syllables for c in ('', 's', 'son', 'ley')]
+    documents = []
+    for customer_id in range(1, args.customers + 1):
+        first = rng.choice(first_names)
+        last = rng.choice(last_names) if rng.random() < 0.3 else rng.choice(rare_names)
+        email = f"{first.lower()}.{last.lower()}{customer_id}@example.com"
+        phone = f"555-{rng.randrange(1000):03d}-{rng.randrange(10000):04d}"
+        license_number = f"D{rng.randrange(10 ** 8):08d}"
+        documents.append((customer_id, (first, last, email, phone, license_number),
+                          (last.lower(), first.lower(), customer_id), customer_id))
+
+    index = new_search_index()
+    started = time.perf_counter()
+    search_index_load(index, documents)
+    build_time = time.perf_counter() - started
+
+    queries = []
+    for _ in range(args.queries):
+        _, fields, _, _ = rng.choice(documents)
+        kind = rng.randrange(3)
+        if kind == 0:
+            queries.append(fields[1][:rng.randint(1, 4)])
+        elif kind == 1:
+            queries.append(f"{fields[0][:rng.randint(1, 3)]} {fields[1][:rng.randint(2, 5)]}")
+        else:
+            queries.append(fields[2][:rng.randint(4, 10)])
+
+    word_sets = [(sort_key, {word for field in fields for word in search_words(field)}, doc_id)
+                 for doc_id, fields, sort_key, _ in documents]
+
+    def linear(text):
+        words = search_words(text)
+        hits = [(not all(word in doc_words for word in words), sort_key, doc_id)
+                for sort_key, doc_words, doc_id in word_sets
+                if all(any(doc_word.startswith(word) for doc_word in doc_words) for word in words)]
+        return [doc_id for _, _, doc_id in sorted(hits)[:args.limit]]
+
+    def indexed(text):
+        return search_index_query(index, text, args.limit)
+
+    print(f"[INFO] search: {args.customers} customers, {args.queries} queries, top {args.limit}")
+    print(f"  index build: {build_time * 1000:.1f}ms")
+    means = {}
+    answers = {}
+    for label, lookup in (('linear scan', linear), ('search idx', indexed)):
+        timings = []
+        answers[label] = []
+        for text in queries:
+            query_started = time.perf_counter()
+            answers[label].append(lookup(text))
+            timings.append(time.perf_counter() - query_started)
+        means[label] = summarize(label, timings)
+
+    # The index may pad short prefix results with trigram hits, so compare its leading prefix hits only
+    mismatches = sum(found[:len(expected)] != expected
+                     for expected, found in zip(answers['linear scan'], answers['search idx']))
+    if mismatches:
+        print(f"[ERROR] index and linear scan disagree on {mismatches} queries")
+        raise SystemExit(1)
+    print(f"[OK] results match; index is {means['linear scan'] / means['search idx']:.0f}x faster")
+    if means['search idx'] * 1000 > args.budget_ms:
+        print(f"[ERROR] mean {means['search idx'] * 1000:.2f}ms is over the {args.budget_ms}ms budget")
+        raise SystemExit(1)
+
+def bench_import(args):
+    """
+    Import --rows synthetic customers (with --duplicate-rate repeated emails
+    and --invalid-rate bad rows) row by row with a commit each, then through
+    import_csv in --batch-size batches, and report rows/s for both.
+
+    The per-row baseline runs on the first --baseline-rows rows only. Every
+    row the benchmark inserts has a bench-import- email and is deleted at the
+    end, along with its import_progress row.
+    """
+    rng = random.Random(args.seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CUSTOMER_IMPORT_COLUMNS)
+    rows = []
+    for i in range(args.rows):
+        roll = rng.random()
+        if roll < args.duplicate_rate and rows:
+            email = rng.choice(rows)[2]
+        elif roll < args.duplicate_rate + args.invalid_rate:
+            email = f'bench-import-{i}-not-an-address'
+        else:
+            email = f'bench-import-{i}@example.com'
+        row = ('Bench', f'Customer{i}', email, f'555-{i % 10000:04d}', f'{i} Main St', 'Springfield', 'IL',
+               '62701', f'BI{i:08d}')
+        rows.append(row)
+        writer.writerow(row)
+    data = buffer.getvalue().encode()
+
+    connection = connect()
+    cursor = connection.cursor()
+
+    def cleanup():
+        cursor.execute("DELETE FROM customer WHERE email LIKE 'bench-import-%%'")
+        connection.commit()
+
+    print(f"[INFO] import: {args.rows} customer rows ({len(data) / 1024 / 1024:.1f}MiB CSV), "
+          f"batches of {args.batch_size}")
+    cleanup()
+    baseline = rows[:args.baseline_rows]
+    started = time.perf_counter()
+    for row in baseline:
+        try:
+            cursor.execute(f"""
+                INSERT INTO customer ({', '.join(CUSTOMER_IMPORT_COLUMNS)})
+                VALUES ({', '.join(['%s'] * len(CUSTOMER_IMPORT_COLUMNS))})
+            """, row)
+            connection.commit()
+        except pymysql.err.IntegrityError:
+            connection.rollback()
+    per_row = len(baseline) / (time.perf_counter() - started)
+    print(f"  {'per-row':<10} {len(baseline):>8} rows {per_row:>10,.0f} rows/s")
+    cleanup()
+
+    import_key = import_key_for('customers', io.BytesIO(data))
+    try:
+        stats = import_csv(connection, 'customers', io.StringIO(data.decode(), newline=''), import_key=import_key,
+                           source='benchmark', batch_size=args.batch_size)
+        batched = stats['rows'] / stats['elapsed']
+        print(f"  {'batched':<10} {stats['rows']:>8} rows {batched:>10,.0f} rows/s  ({describe_import(stats)})")
+    finally:
+        cleanup()
+        cursor.execute("DELETE FROM import_progress WHERE import_key = %s", (import_key,))
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+    print(f"[OK] batched import is {batched / per_row:.1f}x faster than per-row inserts")
+
+def percentile(timings, share):
+    """Nearest-rank percentile of an already sorted list"""
+    return timings[min(len(timings) - 1, max(0, int(round(len(timings) * share)) - 1))]
+
+def queries_sent(cursor):
+    """Statements the server has run for all clients (MySQL's global Questions counter)"""
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    return int(cursor.fetchone()['Value'])
+
+def http_request(port, method, path, cookie=None, form=None):
+    """Send one request to the local server; returns (status, headers, seconds)"""
+    headers = {'Cookie': cookie} if cookie else {}
+    body = None
+    if form is not None:
+        body = urllib.parse.urlencode(form, doseq=True)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    started = time.perf_counter()
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.headers, time.perf_counter() - started
+    finally:
+        connection.close()
+
+def start_app_server():
+    """Serve the app from app/__init__.py on a free local port in a background thread; returns (server, port)"""
+    from app import app as flask_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port
+
+def login_cookie(server, port, username, password):
+    """Log in through auth.login and return the session cookie; stops the server and exits on failure"""
+    status, headers, _ = http_request(port, 'POST', '/login', form={'username': username, 'password': password})
+    cookie = (headers.get('Set-Cookie') or '').split(';')[0]
+    if status != 302 or not cookie:
+        print(f"[ERROR] Login as {username} failed (HTTP {status})")
+        server.shutdown()
+        raise SystemExit(1)
+    return cookie
+
+def run_route_scenario(port, cookie, requests, concurrency, monitor):
+    """
+    Send (method, path, form, expected status) requests from `concurrency`
+    threads. Returns the latency/throughput/queries result for the batch
+    (queries only with a monitor cursor).
+    """
+    def send(spec):
+        method, path, form, expected = spec
+        try:
+            status, _, elapsed = http_request(port, method, path, cookie, form)
+        except OSError:
+            return None
+        return elapsed if status == expected else None
+
+    before = queries_sent(monitor) if monitor else 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, requests))
+    wall = time.perf_counter() - started
+    # The second SHOW STATUS is counted before it reads the counter
+    queries = queries_sent(monitor) - before - 1 if monitor else None
+
+    timings = sorted(outcome for outcome in outcomes if outcome is not None)
+    result = {'requests': len(requests), 'errors': len(requests) - len(timings),
+              'throughput_rps': round(len(requests) / wall, 1),
+              'queries_per_request': round(queries / len(requests), 2) if monitor else None}
+    for name, share in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+        result[name] = round(percentile(timings, share) * 1000, 2) if timings else None
+    result['mean_ms'] = round(statistics.mean(timings) * 1000, 2) if timings else None
+    return result
+
+def compare_route_results(results, baseline, tolerance):
+    """Regressions against a saved run: p95 latency or queries/request above baseline * (1 + tolerance)"""
+    regressions = []
+    for route, result in results.items():
+        previous = baseline.get('routes', {}).get(route)
+        if not previous:
+            continue
+        for metric in ('p95_ms', 'queries_per_request'):
+            if result[metric] is None or previous.get(metric) is None:
+                continue
+            limit = previous[metric] * (1 + tolerance)
+            if result[metric] > limit:
+                regressions.append(f"{route} {metric}: {result[metric]} > {limit:.2f} "
+                                   f"(baseline {previous[metric]})")
+        if result['errors'] > previous.get('errors', 0):
+            regressions.append(f"{route} errors: {result['errors']} (baseline {previous.get('errors', 0)})")
+    return regressions
+
+def bench_routes(args):
+    """
+    Serve the real app (app/__init__.py) over HTTP on a local port, log in
+    through auth.login, and drive the dashboard, rentals list, view_rental,
+    create_rental and return_rental routes from --concurrency threads,
+    --requests requests each.
+
+    Reports p50/p95/p99 latency, throughput and queries per request (the
+    global Questions delta, so keep other clients off the database), and
+    saves the run as JSON to --output. With --compare, fails when a route's
+    p95 or queries per request grew by more than --tolerance over that run.
+    Rentals created here are returned and deleted again at the end.
+    """
+    server, port = start_app_server()
+    cookie = login_cookie(server, port, args.username, args.password)
+
+    monitor_connection = connect()
+    monitor_connection.autocommit(True)
+    monitor = monitor_connection.cursor()
+    rng = random.Random(args.seed)
+    monitor.execute("SELECT MIN(rental_id) as first_id, MAX(rental_id) as last_id FROM rental")
+    bounds = monitor.fetchone()
+    view_ids = []
+    if bounds['first_id'] is not None:
+        candidates = [rng.randint(bounds['first_id'], bounds['last_id']) for _ in range(args.requests * 2)]
+        monitor.execute(f"SELECT rental_id FROM rental WHERE rental_id IN ({', '.join(['%s'] * len(candidates))})",
+                        candidates)
+        existing = {row['rental_id'] for row in monitor.fetchall()}
+        view_ids = [rental_id for rental_id in candidates if rental_id in existing][:args.requests]
+    monitor.execute("SELECT customer_id FROM customer WHERE is_archived = FALSE ORDER BY customer_id LIMIT 1000")
+    customer_ids = [row['customer_id'] for row in monitor.fetchall()]
+    monitor.execute("""
+        SELECT equipment_id FROM equipment
+        WHERE is_archived = FALSE AND availability_status = 'Available'
+        ORDER BY equipment_id LIMIT %s
+    """, (args.requests,))
+    equipment_ids = [row['equipment_id'] for row in monitor.fetchall()]
+    if not view_ids or not customer_ids or len(equipment_ids) < args.requests:
+        print(f"[ERROR] Need rentals, customers and {args.requests} available equipment items; "
+              f"seed the database first (scripts/generate_seed_data.py)")
+        server.shutdown()
+        raise SystemExit(1)
+
+    marker = f"benchmark routes {os.getpid()}-{time.time_ns()}"
+    today = date.today()
+    creates = [('POST', '/rentals/create', {
+        'customer_id': rng.choice(customer_ids), 'rental_date': today.isoformat(),
+        'due_date': (today + timedelta(days=3)).isoformat(), 'notes': marker,
+        'equipment_ids[]': [equipment_id], 'days_rented[]': ['3'],
+    }, 302) for equipment_id in equipment_ids]
+    scenarios = [
+        ('dashboard', lambda: [('GET', '/dashboard', None, 200)] * args.requests),
+        ('list_rentals', lambda: [('GET', '/rentals', None, 200)] * args.requests),
+        ('view_rental', lambda: [('GET', f'/rentals/{rental_id}', None, 200) for rental_id in view_ids]),
+        ('create_rental', lambda: creates),
+        ('return_rental', lambda: [('POST', f'/rentals/{rental_id}/return', None, 302)
+                                   for rental_id in created_rentals()]),
+    ]
+
+    def created_rentals():
+        monitor.execute("SELECT rental_id FROM rental WHERE notes = %s ORDER BY rental_id", (marker,))
+        return [row['rental_id'] for row in monitor.fetchall()]
+
+    print(f"[INFO] routes: {args.requests} requests per route from {args.concurrency} threads "
+          f"against http://127.0.0.1:{port}")
+    results = {}
+    try:
+        for path in ('/dashboard', '/rentals', f'/rentals/{view_ids[0]}'):
+            for _ in range(args.warmup):
+                http_request(port, 'GET', path, cookie)
+        for route, build in scenarios:
+            requests = build()
+            if not requests:
+                print(f"  {route:<14} skipped: nothing to send")
+                continue
+            result = results[route] = run_route_scenario(port, cookie, requests, args.concurrency, monitor)
+            print(f"  {route:<14} p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                  f"{result['throughput_rps']:>7} req/s {result['queries_per_request']:>6} queries/req "
+                  f"errors={result['errors']}")
+    finally:
+        for rental_id in created_rentals():
+            http_request(port, 'POST', f'/rentals/{rental_id}/return', cookie)
+            http_request(port, 'POST', f'/rentals/delete/{rental_id}', cookie)
+        monitor.close()
+        monitor_connection.close()
+        server.shutdown()
+
+    run = {'timestamp': datetime.now().isoformat(timespec='seconds'),
+           'settings': {'requests': args.requests, 'concurrency': args.concurrency, 'seed': args.seed},
+           'routes': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as out:
+        json.dump(run, out, indent=2)
+    print(f"[OK] Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare_route_results(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            for regression in regressions:
+                print(f"[ERROR] {regression}")
+            raise SystemExit(1)
+        print(f"[OK] No route regressed more than {args.tolerance:.0%} against {args.compare}")
+
+def bench_login_flood(args):
+    """
+    Dashboard latency with and without a login flood: --flood-threads
+    threads POST wrong passwords to /login (for --username and random
+    usernames) while --concurrency threads load the dashboard.
+
+    The throttle answers most flood requests with 429 before any database or
+    hash work; --no-throttle lifts its limits so every attempt reaches the
+    password check. Fails when the dashboard p99 under the flood exceeds the
+    quiet p99 by more than --tolerance.
+    """
+    from app.blueprints import auth as auth_blueprint
+    from app.models import get_password_pool_stats
+
+    server, port = start_app_server()
+    cookie = login_cookie(server, port, args.username, args.password)
+    if args.no_throttle:
+        for limiter in (auth_blueprint._user_attempts, auth_blueprint._ip_attempts):
+            limiter['limit'] = 10 ** 9
+    dashboard = [('GET', '/dashboard', None, 200)] * args.requests
+    for _ in range(args.warmup):
+        http_request(port, 'GET', '/dashboard', cookie)
+
+    print(f"[INFO] login-flood: {args.requests} dashboard loads from {args.concurrency} threads, "
+          f"{args.flood_threads} flood threads{' (throttle off)' if args.no_throttle else ''}")
+    quiet = run_route_scenario(port, cookie, dashboard, args.concurrency, None)
+
+    stop = threading.Event()
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+
+    def flood(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            username = args.username if rng.random() < 0.5 else f"user{rng.randrange(100000)}"
+            try:
+                status, _, _ = http_request(port, 'POST', '/login',
+                                            form={'username': username, 'password': f"wrong{rng.random()}"})
+            except OSError:
+                status = 'error'
+            with outcomes_lock:
+                outcomes[status] += 1
+
+    flooders = [threading.Thread(target=flood, args=(seed,)) for seed in range(args.flood_threads)]
+    for thread in flooders:
+        thread.start()
+    try:
+        time.sleep(0.5)
+        flooded = run_route_scenario(port, cookie, dashboard, args.concurrency, None)
+    finally:
+        stop.set()
+        for thread in flooders:
+            thread.join()
+        server.shutdown()
+
+    for label, result in (('quiet', quiet), ('login flood', flooded)):
+        print(f"  {label:<12} p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+              f"{result['throughput_rps']:>7} req/s errors={result['errors']}")
+    print(f"  flood responses: {dict(outcomes)} (429 = throttled, 503 = password checks full)")
+    print(f"  password checks: {get_password_pool_stats()}")
+    if quiet['p99_ms'] is None or flooded['p99_ms'] is None:
+        print("[ERROR] Dashboard requests failed")
+        raise SystemExit(1)
+    limit = quiet['p99_ms'] * (1 + args.tolerance)
+    if flooded['p99_ms'] > limit:
+        print(f"[ERROR] dashboard p99 rose to {flooded['p99_ms']}ms under the flood (limit {limit:.2f}ms)")
+        raise SystemExit(1)
+    print(f"[OK] dashboard p99 stayed within {args.tolerance:.0%} of {quiet['p99_ms']}ms during the flood")
+
+def synthetic_listing_rentals(count):
+    """count Rental models shaped like list_rentals rows, every tenth one overdue"""
+    columns = ('rental_id', 'rental_date', 'due_date', 'return_date', 'status', 'subtotal', 'late_fee',
+               'total_cost', 'notes', 'customer_first_name', 'customer_last_name', 'customer_phone',
+               'customer_email', 'employee_first_name', 'employee_last_name')
+    first_day = date.today() - timedelta(days=365)
+    return row_mapper(Rental, columns)([
+        (i, first_day + timedelta(days=i % 365), first_day + timedelta(days=i % 365 + 7), None,
+         'Overdue' if i % 10 == 0 else 'Active', 100.0, 10.0 * (i % 3), 100.0 + 10.0 * (i % 3), '',
+         f'First{i}', f'Last{i}', '555-0100', f'c{i}@example.com', 'John', 'Admin')
+        for i in range(count)])
+
+def bench_fragments(args):
+    """
+    Render the rental listing page with --rows synthetic rentals in one table:
+    the page and table rendered on every request vs the table served from
+    cached_fragment(), plus the one-off cost of compiling the templates.
+
+    Runs in-process against the app's templates (no database).
+    """
+    from flask import g, render_template
+    from flask_login import login_user
+    from markupsafe import Markup
+    from app import app
+    from app.models import Employee
+
+    rows = synthetic_listing_rentals(args.rows)
+    page = {'rows': rows, 'prev_token': None, 'next_token': 'next'}
+
+    def render_table():
+        return Markup(render_template('rentals/rentals_table.html', rentals=rows, page=page,
+                                      per_page=args.rows, status_filter='active'))
+
+    def uncached():
+        return render_template('rentals/list.html', table_html=render_table(), status_filter='active')
+
+    def cached():
+        table_html = cached_fragment('bench-rentals', (args.rows,), ('rental', 'customer'), render_table)
+        return render_template('rentals/list.html', table_html=table_html, status_filter='active')
+
+    print(f"[INFO] fragments: rental listing with {args.rows} rows, best of {args.repeat}")
+    with app.test_request_context('/rentals'):
+        # base.html only renders page content for a logged-in employee
+        login_user(Employee(employee_id=1, username='admin', first_name='John', last_name='Admin',
+                            position='Manager', is_active=True))
+        g.change_counters = {}  # no database: every shared change counter reads as 0
+        app.jinja_env.cache.clear()
+        started = time.perf_counter()
+        app.jinja_env.get_template('rentals/list.html')
+        app.jinja_env.get_template('rentals/rentals_table.html')
+        print(f"  compile      {(time.perf_counter() - started) * 1000:8.2f}ms (once per worker)")
+
+        results = {}
+        for label, render in (('uncached', uncached), ('cached', cached)):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                html = render()
+                timings.append(time.perf_counter() - started)
+            results[label] = (min(timings), html)
+            print(f"  {label:<12} time={min(timings) * 1000:8.2f}ms size={len(html) / 1024:8.1f}KiB")
+
+        bump_data_version('rental')
+        started = time.perf_counter()
+        rebuilt = cached()
+        print(f"  after write  {(time.perf_counter() - started) * 1000:8.2f}ms (fragment re-rendered)")
+
+    if not (results['uncached'][1] == results['cached'][1] == rebuilt):
+        print("[ERROR] cached page differs from the uncached render")
+        raise SystemExit(1)
+    print(f"[OK] pages match; cached listing renders {results['uncached'][0] / results['cached'][0]:.0f}x faster")
+
+def bench_compression(args):
+    """
+    Compress a --rows rental listing table with each coding and level: time,
+    size, and the cost of flushing every --chunk-kib as a streamed response
+    does. Also reports the precompressed static assets.
+
+    Runs in-process against the app's templates (no database). Brotli rows
+    appear only when the optional brotli package is installed.
+    """
+    from flask import render_template
+    from app import app
+    from app.compression import (ASSET_BROTLI_QUALITY, ASSET_GZIP_LEVEL, COMPRESS_BROTLI_QUALITY,
+                                 COMPRESS_GZIP_LEVEL, _assets, _variants, compress_bytes, compress_chunks,
+                                 supported_encodings)
+
+    rows = synthetic_listing_rentals(args.rows)
+    page = {'rows': rows, 'prev_token': None, 'next_token': 'next'}
+    with app.test_request_context('/rentals'):
+        html = render_template('rentals/rentals_table.html', rentals=rows, page=page, per_page=args.rows,
+                               status_filter='active').encode()
+    chunk_size = args.chunk_kib * 1024
+    chunks = [html[i:i + chunk_size] for i in range(0, len(html), chunk_size)]
+
+    print(f"[INFO] compression: {args.rows}-row listing table, {len(html) / 1024:.0f}KiB, best of {args.repeat}")
+    levels = {'gzip': sorted({1, COMPRESS_GZIP_LEVEL, ASSET_GZIP_LEVEL}),
+              'br': sorted({1, COMPRESS_BROTLI_QUALITY, ASSET_BROTLI_QUALITY})}
+    for encoding in supported_encodings():
+        for level in levels[encoding]:
+            for label, compress in (('whole', lambda: compress_bytes(html, encoding, level)),
+                                    ('streamed', lambda: b''.join(compress_chunks(iter(chunks), encoding, level)))):
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    size = len(compress())
+                    timings.append(time.perf_counter() - started)
+                print(f"  {encoding:<4} level={level:<2} {label:<8} time={min(timings) * 1000:8.2f}ms "
+                      f"size={size / 1024:8.1f}KiB ({size / len(html):.1%})")
+
+    print("  static assets:")
+    for name, hashed in sorted(_assets.items()):
+        variants = _variants[hashed]
+        sizes = ' '.join(f"{encoding}={len(variants[encoding]) / 1024:.1f}KiB"
+                         for encoding in ('identity', 'gzip', 'br') if encoding in variants)
+        print(f"    {hashed:<32} {sizes}")
+    print(f"[OK] responses use gzip level {COMPRESS_GZIP_LEVEL} and brotli quality {COMPRESS_BROTLI_QUALITY}")
+
+def bench_analytics_load(args):
+    """
+    A cold analytics page load against the database in .env (seed it with
+    scripts/generate_seed_data.py): one bucket query per month, as the page used to
+    run, vs one query for the whole window sliced per month in pandas. The
+    month metrics must match.
+    """
+    connection = connect()
+    today = date.today()
+    months = month_buckets(today - timedelta(days=31 * (args.months - 1)), today)[-args.months:]
+    first = months[0]
+
+    def per_month():
+        return [compute_bucket(load_bucket_frame(connection, start, end), start, end, today)
+                for start, end in zip(months, months[1:] + [next_month(today)])]
+
+    def one_window():
+        frame = load_bucket_frame(connection, first, next_month(today))
+        return [compute_bucket(bucket_rows(frame, start, end), start, end, today)
+                for start, end in zip(months, months[1:] + [next_month(today)])]
+
+    print(f"[INFO] analytics-load: {len(months)} months from {first}, {args.repeat} cold loads each")
+    means = {}
+    results = {}
+    for label, load in (('per month', per_month), ('one window', one_window)):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            results[label] = load()
+            timings.append(time.perf_counter() - started)
+        means[label] = summarize(label, timings)
+    connection.close()
+
+    keys = ('rentals', 'revenue', 'returned', 'rental_days', 'late_returns', 'late_fees')
+    for start, old, new in zip(months, results['per month'], results['one window']):
+        if any(abs(old[key] - new[key]) > 1e-6 for key in keys):
+            print(f"[ERROR] {start:%Y-%m}: per-month and windowed metrics differ")
+            raise SystemExit(1)
+    print(f"[OK] metrics match; one window query is {means['per month'] / means['one window']:.1f}x faster")
+
+def bench_overdue(args):
+    """
+    The dashboard's overdue list: the live four-table GROUP BY it used to run
+    vs one ordered read of the materialized overdue_rental table, against the
+    database in .env (seed it with scripts/generate_seed_data.py). The table must
+    match the live join.
+    """
+    connection = connect()
+    cursor = connection.cursor()
+    queries = (
+        ('live join', OVERDUE_SOURCE.format(condition='') + " ORDER BY r.due_date, r.rental_id"),
+        ('materialized', f"SELECT {', '.join(OVERDUE_COLUMNS)} FROM overdue_rental ORDER BY due_date, rental_id"),
+    )
+    print(f"[INFO] overdue: dashboard list, {args.repeat} loads each")
+    means = {}
+    for label, sql in queries:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+        print(f"  {label:<12} rows={len(rows)}")
+        means[label] = summarize(label, timings)
+
+    mismatches = check_overdue_rentals(cursor)
+    cursor.close()
+    connection.close()
+    for mismatch in mismatches[:10]:
+        print(f"[ERROR] {mismatch}")
+    if mismatches:
+        print(f"[ERROR] overdue_rental differs from the live join in {len(mismatches)} place(s); "
+              "run flask --app app rentals refresh-overdue")
+        raise SystemExit(1)
+    print(f"[OK] table matches the live join; reads are {means['live join'] / means['materialized']:.1f}x faster")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create-rental', help='per-line vs batched rental creation')
+    create.add_argument('--items', type=int, default=20)
+    create.add_argument('--repeat', type=int, default=50)
+    create.set_defaults(run=bench_create_rental)
+
+    stress = commands.add_parser('reservation-stress', help='concurrent bookings, checked for overlapping windows')
+    stress.add_argument('--threads', type=int, default=16)
+    stress.add_argument('--attempts', type=int, default=200)
+    stress.add_argument('--items', type=int, default=2)
+    stress.add_argument('--fleet', type=int, default=200)
+    stress.set_defaults(run=bench_reservation_stress)
+
+    availability = commands.add_parser('availability', help='date-window availability: linear scan vs interval index')
+    availability.add_argument('--rentals', type=int, default=100000)
+    availability.add_argument('--fleet', type=int, default=500)
+    availability.add_argument('--queries', type=int, default=200)
+    availability.add_argument('--seed', type=int, default=42)
+    availability.set_defaults(run=bench_availability)
+
+    models = commands.add_parser('models', help='DictCursor dicts vs slotted model objects per --rows rows')
+    models.add_argument('--rows', type=int, default=10000)
+    models.add_argument('--repeat', type=int, default=20)
+    models.set_defaults(run=bench_models)
+
+    export = commands.add_parser('export', help='stream synthetic rows through the export serializers, bounding RSS')
+    export.add_argument('--rows', type=int, default=1000000)
+    export.add_argument('--gzip', action='store_true')
+    export.add_argument('--max-rss-mib', type=float, default=32)
+    export.set_defaults(run=bench_export)
+
+    analytics = commands.add_parser('analytics', help='vectorized analytics engine over synthetic rental lines')
+    analytics.add_argument('--rows', type=int, default=1000000)
+    analytics.add_argument('--months', type=int, default=24)
+    analytics.add_argument('--seed', type=int, default=42)
+    analytics.set_defaults(run=bench_analytics)
+
+    analytics_load = commands.add_parser('analytics-load',
+                                         help='cold analytics page load: per-month queries vs one window query')
+    analytics_load.add_argument('--months', type=int, default=24)
+    analytics_load.add_argument('--repeat', type=int, default=5)
+    analytics_load.set_defaults(run=bench_analytics_load)
+
+    search = commands.add_parser('search', help='typeahead: linear word-prefix scan vs prefix/trigram index')
+    search.add_argument('--customers', type=int, default=50000)
+    search.add_argument('--queries', type=int, default=500)
+    search.add_argument('--limit', type=int, default=10)
+    search.add_argument('--budget-ms', type=float, default=1.0)
+    search.add_argument('--seed', type=int, default=42)
+    search.set_defaults(run=bench_search)
+
+    bulk = commands.add_parser('import', help='bulk CSV import: per-row commits vs batched import_csv')
+    bulk.add_argument('--rows', type=int, default=20000)
+    bulk.add_argument('--batch-size', type=int, default=1000)
+    bulk.add_argument('--baseline-rows', type=int, default=2000)
+    bulk.add_argument('--duplicate-rate', type=float, default=0.02)
+    bulk.add_argument('--invalid-rate', type=float, default=0.01)
+    bulk.add_argument('--seed', type=int, default=42)
+    bulk.set_defaults(run=bench_import)
+
+    routes = commands.add_parser('routes', help='HTTP load test of the main pages, saved as JSON for comparison')
+    routes.add_argument('--requests', type=int, default=200)
+    routes.add_argument('--concurrency', type=int, default=8)
+    routes.add_argument('--warmup', type=int, default=3)
+    routes.add_argument('--username', default='admin')
+    routes.add_argument('--password', default='password123')
+    routes.add_argument('--seed', type=int, default=42)
+    routes.add_argument('--output', default=f"benchmark-results/routes-{datetime.now():%Y%m%d-%H%M%S}.json")
+    routes.add_argument('--compare', help='a saved run to check this one against')
+    routes.add_argument('--tolerance', type=float, default=0.25, help='allowed growth in p95 and queries/request')
+    routes.set_defaults(run=bench_routes)
+
+    login_flood = commands.add_parser('login-flood', help='dashboard latency during a flood of failed logins')
+    login_flood.add_argument('--requests', type=int, default=300)
+    login_flood.add_argument('--concurrency', type=int, default=4)
+    login_flood.add_argument('--flood-threads', type=int, default=16)
+    login_flood.add_argument('--no-throttle', action='store_true', help='lift the login throttle for the run')
+    login_flood.add_argument('--warmup', type=int, default=3)
+    login_flood.add_argument('--username', default='admin')
+    login_flood.add_argument('--password', default='password123')
+    login_flood.add_argument('--tolerance', type=float, default=0.5, help='allowed growth in dashboard p99')
+    login_flood.set_defaults(run=bench_login_flood)
+
+    fragments = commands.add_parser('fragments', help='rental listing render time: every request vs cached fragment')
+    fragments.add_argument('--rows', type=int, default=10000)
+    fragments.add_argument('--repeat', type=int, default=10)
+    fragments.set_defaults(run=bench_fragments)
+
+    compression = commands.add_parser('compression', help='gzip/brotli size and time per level for a listing page')
+    compression.add_argument('--rows', type=int, default=10000)
+    compression.add_argument('--chunk-kib', type=int, default=64)
+    compression.add_argument('--repeat', type=int, default=3)
+    compression.set_defaults(run=bench_compression)
+
+    overdue = commands.add_parser('overdue', help='dashboard overdue list: live join vs materialized table')
+    overdue.add_argument('--repeat', type=int, default=50)
+    overdue.set_defaults(run=bench_overdue)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
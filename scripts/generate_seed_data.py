@@ -0,0 +1,382 @@
+"""
+Synthetic data generator for load testing.
+
+Fills customer, equipment, rental and rental_detail with --customers,
+--equipment and --rentals rows (1-4 detail lines per rental), spread over the
+--days before --as-of. Output is deterministic: the same --seed, counts and
+--as-of always produce the same rows, whatever --workers is.
+
+    python scripts/generate_seed_data.py --truncate --customers 100000 --equipment 50000 --rentals 1000000
+    python scripts/generate_seed_data.py --dry-run --rentals 1000000
+
+Work is split into chunks that a process pool generates and writes in
+parallel, each over its own connection with multi-row INSERTs. The fleet is
+split into partitions and each partition owns its rentals, so no two rentals
+of one item overlap. Employees must already exist (run deploy_seed_data.py
+first); the summary tables are rebuilt at the end.
+"""
+import argparse
+import importlib.util
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import pymysql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# app/summaries.py is loaded by path: importing it as app.summaries would run
+# app/__init__.py, building the whole Flask app (and starting its background
+# sweeper threads when their intervals are set) in every pool process
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_summaries_spec = importlib.util.spec_from_file_location('summaries', os.path.join(ROOT, 'app', 'summaries.py'))
+summaries = importlib.util.module_from_spec(_summaries_spec)
+_summaries_spec.loader.exec_module(summaries)
+
+# Rows per multi-row INSERT statement (and per commit)
+INSERT_BATCH_ROWS = 5000
+# Customers generated per pool task
+CUSTOMER_CHUNK_ROWS = 50000
+# Most detail lines one rental can have; each fleet partition reserves this many detail ids per rental
+MAX_LINES = 4
+# Random picks tried per line; a rental's first line falls back to scanning the partition
+PICK_ATTEMPTS = 8
+
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Karen',
+               'Daniel', 'Lisa', 'Matthew', 'Nancy', 'Anthony', 'Sandra', 'Mark', 'Ashley', 'Wei', 'Emily',
+               'Luis', 'Donna', 'Kevin', 'Michelle', 'Brian', 'Amanda', 'Priya', 'Melissa', 'Kenji', 'Stephanie')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+              'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+              'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Patel')
+STREETS = ('Main St', 'Oak Ave', 'Pine Rd', 'Elm St', 'Maple Dr', 'Cedar Ln', 'Birch Ct', 'Spruce Way',
+           'Peachtree St', 'Lakeview Dr', 'Hillcrest Rd', 'Park Ave')
+CITIES = (('Atlanta', 'GA', '303'), ('Marietta', 'GA', '300'), ('Roswell', 'GA', '300'), ('Decatur', 'GA', '300'),
+          ('Charlotte', 'NC', '282'), ('Raleigh', 'NC', '276'), ('Nashville', 'TN', '372'),
+          ('Birmingham', 'AL', '352'), ('Jacksonville', 'FL', '322'), ('Greenville', 'SC', '296'))
+# (type, name templates, daily rate range)
+EQUIPMENT_CATALOG = (
+    ('Power Tools', ('Power Drill', 'Circular Saw', 'Table Saw', 'Air Compressor', 'Hammer Drill'), (20, 65)),
+    ('Cleaning Equipment', ('Pressure Washer', 'Carpet Cleaner', 'Floor Scrubber'), (40, 80)),
+    ('Lawn Equipment', ('Lawn Mower', 'Leaf Blower', 'Tiller', 'Hedge Trimmer'), (25, 60)),
+    ('Floor Equipment', ('Floor Sander', 'Edger', 'Tile Stripper'), (50, 90)),
+    ('Masonry Tools', ('Tile Cutter', 'Brick Saw', 'Core Drill'), (35, 85)),
+    ('Ladders', ('Extension Ladder', 'Step Ladder', 'Scaffold Set'), (15, 45)),
+    ('Concrete Equipment', ('Concrete Mixer', 'Plate Compactor', 'Power Trowel'), (45, 110)),
+    ('Power Equipment', ('Generator', 'Light Tower', 'Welder'), (60, 150)),
+    ('Heavy Equipment', ('Mini Excavator', 'Skid Steer', 'Trencher'), (180, 350)),
+)
+CONDITIONS = ('Excellent', 'Good', 'Fair', 'Poor')
+CONDITION_WEIGHTS = (30, 50, 15, 5)
+# Rental lengths in days, and how often each is booked
+RENTAL_DAYS = (1, 2, 3, 4, 5, 7, 10, 14, 21, 30)
+RENTAL_DAY_WEIGHTS = (22, 18, 14, 8, 7, 13, 5, 7, 3, 3)
+LINE_COUNT_WEIGHTS = (60, 25, 10, 5)  # 1..MAX_LINES lines per rental
+# Share of rentals due in the last OVERDUE_WINDOW_DAYS still out (Overdue), of returns that come back
+# late, and of open rentals returned early. Older rentals have all come back.
+OVERDUE_WINDOW_DAYS = 30
+OVERDUE_SHARE = 0.05
+LATE_RETURN_SHARE = 0.12
+EARLY_RETURN_SHARE = 0.15
+
+def connect():
+    """Open a plain-cursor connection with the same settings as the app, with FK/unique checks off for bulk loads"""
+    connection = pymysql.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        port=int(os.getenv('DB_PORT', 3306))
+    )
+    cursor = connection.cursor()
+    # Ids are assigned here and every reference is generated valid, so the checks would only cost time
+    cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+    cursor.close()
+    return connection
+
+def chunk_rng(seed, kind, index):
+    """RNG for one chunk, independent of which worker runs it or in what order"""
+    return random.Random(f"{seed}:{kind}:{index}")
+
+def split_evenly(total, parts):
+    """Sizes of `parts` near-equal shares of total, larger shares first"""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+def generate_customers(seed, index, first_id, count):
+    """Customer rows (as tuples in insert column order) for ids first_id..first_id + count - 1"""
+    rng = chunk_rng(seed, 'customer', index)
+    rows = []
+    for customer_id in range(first_id, first_id + count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        city, state, zip_prefix = rng.choice(CITIES)
+        rows.append((
+            customer_id, first_name, last_name,
+            f"{first_name.lower()}.{last_name.lower()}{customer_id}@example.com",
+            f"555-{rng.randrange(1000):03d}-{rng.randrange(10000):04d}",
+            f"{rng.randrange(1, 9999)} {rng.choice(STREETS)}", city, state,
+            f"{zip_prefix}{rng.randrange(100):02d}",
+            f"{state}{customer_id:08d}",
+            rng.random() < 0.02,
+        ))
+    return rows
+
+def generate_fleet(seed, index, first_equipment_id, equipment_count, first_rental_id, rental_count,
+                   first_detail_id, customer_ids, employee_ids, as_of, days):
+    """
+    Equipment, rental and rental_detail rows for one fleet partition.
+
+    Rental start dates are drawn with volume growing toward as_of and placed
+    in date order. Each line goes to an Available item of this partition
+    that is free on the start date (returned before it); an item out on an
+    unreturned rental stays busy. Past-due rentals are mostly Completed,
+    some late with the flat late fee; recent ones are sometimes still out and
+    Overdue. Items still out at the end are marked Rented.
+    """
+    rng = chunk_rng(seed, 'fleet', index)
+    first_day = as_of - timedelta(days=days)
+
+    equipment = []
+    for equipment_id in range(first_equipment_id, first_equipment_id + equipment_count):
+        equipment_type, names, (low, high) = rng.choice(EQUIPMENT_CATALOG)
+        status = 'Maintenance' if rng.random() < 0.02 else 'Retired' if rng.random() < 0.01 else 'Available'
+        purchase_date = first_day - timedelta(days=rng.randrange(30, 1500))
+        equipment.append([
+            equipment_id, f"{rng.choice(names)} #{equipment_id}", equipment_type, None,
+            round(rng.uniform(low, high) / 5) * 5, rng.choices(CONDITIONS, CONDITION_WEIGHTS)[0], status,
+            purchase_date, f"GEN-{equipment_id:08d}", False,
+        ])
+    rentable = [row for row in equipment if row[6] == 'Available']
+    free_from = {row[0]: first_day for row in equipment}
+
+    starts = sorted(first_day + timedelta(days=int(days * math.sqrt(rng.random()))) for _ in range(rental_count))
+    rentals = []
+    details = []
+    detail_id = first_detail_id
+    for rental_id, start in zip(range(first_rental_id, first_rental_id + rental_count), starts):
+        lines = []
+        for line in range(rng.choices(range(1, MAX_LINES + 1), LINE_COUNT_WEIGHTS)[0]):
+            picks = [rng.choice(rentable) for _ in range(PICK_ATTEMPTS)]
+            item = next((row for row in picks if free_from[row[0]] <= start and row not in lines), None)
+            if item is None and not lines:
+                # Every line needs an item: scan the partition, and if nothing is free on the start
+                # date, start when the soonest item frees up
+                offset = rng.randrange(len(rentable))
+                ordered = rentable[offset:] + rentable[:offset]
+                item = next((row for row in ordered if free_from[row[0]] <= start), None)
+                if item is None:
+                    item = min(ordered, key=lambda row: free_from[row[0]])
+                    if free_from[item[0]] > as_of:
+                        raise RuntimeError(f"fleet partition {index} is fully booked; "
+                                           f"raise --equipment or lower --rentals")
+                    start = free_from[item[0]]
+            if item is not None:
+                lines.append(item)
+
+        length = rng.choices(RENTAL_DAYS, RENTAL_DAY_WEIGHTS)[0]
+        due = start + timedelta(days=length)
+        if due < as_of:
+            if (as_of - due).days <= OVERDUE_WINDOW_DAYS and rng.random() < OVERDUE_SHARE:
+                returned = None
+            elif rng.random() < LATE_RETURN_SHARE:
+                returned = min(due + timedelta(days=rng.randint(1, 10)), as_of)
+            else:
+                returned = start + timedelta(days=rng.randint(0, length))
+        elif rng.random() < EARLY_RETURN_SHARE:
+            returned = start + timedelta(days=rng.randint(0, (as_of - start).days))
+        else:
+            returned = None
+        for row in lines:
+            free_from[row[0]] = returned + timedelta(days=1) if returned else date.max
+
+        subtotal = 0
+        for row in lines:
+            line_total = row[4] * length
+            subtotal += line_total
+            details.append((detail_id, rental_id, row[0], 1, row[4], length, line_total, start))
+            detail_id += 1
+        late = (returned or as_of) > due
+        if returned:
+            status = 'Completed'
+        else:
+            status = 'Overdue' if late else 'Active'
+        late_fee = round(subtotal * summaries.LATE_FEE_RATE, 2) if late else 0
+        rentals.append((rental_id, rng.choice(customer_ids), rng.choice(employee_ids), start, due, returned,
+                        status, subtotal, late_fee, subtotal + late_fee, None, start))
+
+    for row in equipment:
+        if free_from[row[0]] == date.max:
+            row[6] = 'Rented'
+    return [tuple(row) for row in equipment], rentals, details
+
+CUSTOMER_INSERT = """
+    INSERT INTO customer (customer_id, first_name, last_name, email, phone, address, city, state, zip_code,
+                          drivers_license, is_archived)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+EQUIPMENT_INSERT = """
+    INSERT INTO equipment (equipment_id, equipment_name, equipment_type, description, daily_rate, condition_status,
+                           availability_status, purchase_date, serial_number, is_archived)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+RENTAL_INSERT = """
+    INSERT INTO rental (rental_id, customer_id, employee_id, rental_date, due_date, return_date, status, subtotal,
+                        late_fee, total_cost, notes, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+DETAIL_INSERT = """
+    INSERT INTO rental_detail (rental_detail_id, rental_id, equipment_id, quantity, daily_rate, days_rented,
+                               line_total, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+def write_rows(connection, sql, rows):
+    """Insert rows INSERT_BATCH_ROWS at a time, one multi-row statement and commit per batch"""
+    cursor = connection.cursor()
+    for offset in range(0, len(rows), INSERT_BATCH_ROWS):
+        cursor.executemany(sql, rows[offset:offset + INSERT_BATCH_ROWS])
+        connection.commit()
+    cursor.close()
+
+def run_task(task, dry_run):
+    """Pool entry point: generate one chunk and, unless dry_run, write it; returns row counts"""
+    kind, kwargs = task
+    if kind == 'customers':
+        tables = ((CUSTOMER_INSERT, generate_customers(**kwargs)),)
+    else:
+        equipment, rentals, details = generate_fleet(**kwargs)
+        tables = ((EQUIPMENT_INSERT, equipment), (RENTAL_INSERT, rentals), (DETAIL_INSERT, details))
+    if not dry_run:
+        connection = connect()
+        try:
+            for sql, rows in tables:
+                write_rows(connection, sql, rows)
+        finally:
+            connection.close()
+    return kind, [len(rows) for sql, rows in tables]
+
+def plan_tasks(args, bases, customer_ids, employee_ids):
+    """Pool tasks: customer chunks, then one fleet partition per --partitions"""
+    first_customer, first_equipment, first_rental, first_detail = bases
+    tasks = []
+    first_id = first_customer
+    for index, count in enumerate(split_evenly(args.customers, max(1, math.ceil(args.customers / CUSTOMER_CHUNK_ROWS)))):
+        tasks.append(('customers', {'seed': args.seed, 'index': index, 'first_id': first_id, 'count': count}))
+        first_id += count
+
+    equipment_id, rental_id, detail_id = first_equipment, first_rental, first_detail
+    for index, (equipment_count, rental_count) in enumerate(zip(split_evenly(args.equipment, args.partitions),
+                                                                split_evenly(args.rentals, args.partitions))):
+        tasks.append(('fleet', {
+            'seed': args.seed, 'index': index,
+            'first_equipment_id': equipment_id, 'equipment_count': equipment_count,
+            'first_rental_id': rental_id, 'rental_count': rental_count, 'first_detail_id': detail_id,
+            'customer_ids': customer_ids, 'employee_ids': employee_ids, 'as_of': args.as_of, 'days': args.days,
+        }))
+        equipment_id += equipment_count
+        rental_id += rental_count
+        detail_id += rental_count * MAX_LINES
+    return tasks
+
+def prepare_database(args):
+    """Optionally empty the generated tables; returns the first free ids and the employee ids"""
+    connection = connect()
+    cursor = connection.cursor()
+    if args.truncate:
+        for table in ('overdue_rental', 'equipment_daily_rollup', 'rollup_watermark', 'rental_equipment_summary',
+                      'rental_customer_summary', 'rental_status_summary', 'rental_detail', 'rental', 'equipment',
+                      'customer'):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        print("[OK] Customer, equipment and rental tables emptied")
+    bases = []
+    for table, key in (('customer', 'customer_id'), ('equipment', 'equipment_id'), ('rental', 'rental_id'),
+                       ('rental_detail', 'rental_detail_id')):
+        cursor.execute(f"SELECT COALESCE(MAX({key}), 0) + 1 FROM {table}")
+        bases.append(cursor.fetchone()[0])
+    cursor.execute("SELECT employee_id FROM employee WHERE is_active = TRUE ORDER BY employee_id")
+    employee_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    connection.close()
+    return bases, employee_ids
+
+def finish_database():
+    """Rebuild the summary and overdue tables from the generated rentals and retire cached pages and analytics"""
+    connection = connect()
+    cursor = connection.cursor()
+    summaries.rebuild_rental_summaries(cursor)
+    summaries.rebuild_overdue_rentals(cursor)
+    # The shared change counters every worker checks (app.functions.bump_change_counters)
+    counters = ('customer', 'equipment', 'rental', summaries.RENTAL_HISTORY_COUNTER)
+    cursor.execute(f"""
+        INSERT INTO data_version (table_name, version)
+        VALUES {', '.join(['(%s, 1)'] * len(counters))}
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, counters)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    print("[OK] Summary and overdue tables rebuilt")
+
+def generate_seed_data(args):
+    """Plan, generate and write every chunk across a process pool"""
+    if args.dry_run:
+        bases, employee_ids = (1, 1, 1, 1), [1]
+    else:
+        bases, employee_ids = prepare_database(args)
+        if not employee_ids:
+            print("[ERROR] No active employees; run deploy_seed_data.py first")
+            return False
+    customer_ids = range(bases[0], bases[0] + args.customers)
+    tasks = plan_tasks(args, bases, customer_ids, employee_ids)
+
+    print(f"[INFO] {args.customers} customers, {args.equipment} equipment, {args.rentals} rentals over "
+          f"{args.days} days to {args.as_of}; seed {args.seed}, {len(tasks)} chunks on {args.workers} workers"
+          f"{' (dry run)' if args.dry_run else ''}")
+    started = time.perf_counter()
+    totals = {'customers': 0, 'equipment': 0, 'rentals': 0, 'lines': 0}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_task, task, args.dry_run) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            kind, counts = future.result()
+            if kind == 'customers':
+                totals['customers'] += counts[0]
+            else:
+                totals['equipment'] += counts[0]
+                totals['rentals'] += counts[1]
+                totals['lines'] += counts[2]
+            elapsed = time.perf_counter() - started
+            print(f"[INFO] {done}/{len(tasks)} chunks, {totals['rentals']} rentals "
+                  f"({totals['rentals'] / elapsed:,.0f} rentals/s)")
+
+    if not args.dry_run:
+        finish_database()
+    elapsed = time.perf_counter() - started
+    print(f"[SUCCESS] {totals['customers']} customers, {totals['equipment']} equipment, {totals['rentals']} rentals "
+          f"and {totals['lines']} rental lines in {elapsed:.1f}s")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--equipment', type=int, default=50000)
+    parser.add_argument('--rentals', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=1095, help='history length before --as-of')
+    parser.add_argument('--as-of', type=date.fromisoformat, default=date.today(),
+                        help="the generated data's 'today' (YYYY-MM-DD)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--partitions', type=int, default=32, help='fleet partitions (pool tasks for rentals)')
+    parser.add_argument('--truncate', action='store_true', help='empty the customer, equipment and rental tables first')
+    parser.add_argument('--dry-run', action='store_true', help='generate without connecting to the database')
+    args = parser.parse_args()
+    if args.customers < 1 or args.equipment < args.partitions:
+        parser.error('need at least one customer and one equipment item per partition')
+    generate_seed_data(args)
+
+if __name__ == '__main__':
+    main()
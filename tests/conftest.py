@@ -0,0 +1,165 @@
+import time
+from types import SimpleNamespace
+
+import pymysql.cursors
+import pytest
+
+from app import app as flask_app
+from app import db_connect
+
+# The employee the logged_in fixture signs in as, as the user loader's SELECT returns it
+EMPLOYEE_ROW = {'employee_id': 1, 'username': 'admin', 'password_hash': 'unused', 'first_name': 'Ada',
+                'last_name': 'Admin', 'email': 'admin@example.com', 'phone': None, 'position': 'Manager',
+                'hire_date': None, 'is_active': 1}
+
+class FakeCursor:
+    """
+    Minimal PyMySQL cursor: every execute() is recorded on the connection and
+    answered by its responder(sql, args), which returns a list of dict rows
+    or, for a write, the number of affected rows. Tuple cursors
+    (pymysql.cursors.Cursor) get the rows as tuples, and each INSERT gets a
+    new lastrowid.
+    """
+
+    def __init__(self, connection, cursorclass):
+        self.connection = connection
+        self.as_tuples = cursorclass is pymysql.cursors.Cursor
+        self.rows = []
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, args=None):
+        self.connection.executed.append((sql, args))
+        result = self.connection.responder(sql, args)
+        if sql.lstrip().upper().startswith('INSERT'):
+            self.connection.insert_id += 1
+            self.lastrowid = self.connection.insert_id
+        if isinstance(result, int):
+            self.rows, self.description, self.rowcount = [], None, result
+            return result
+        self.rows = list(result)
+        columns = list(self.rows[0]) if self.rows else []
+        self.description = [(column,) for column in columns]
+        if self.as_tuples:
+            self.rows = [tuple(row[column] for column in columns) for row in self.rows]
+        self.rowcount = len(self.rows)
+        return self.rowcount
+
+    def executemany(self, sql, args):
+        for row_args in args:
+            self.execute(sql, row_args)
+        self.rowcount = len(args)
+        return self.rowcount
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchall_unbuffered(self):
+        while self.rows:
+            yield self.rows.pop(0)
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Stands in for a pooled PyMySQL connection: always open, never inside a transaction"""
+
+    def __init__(self, responder=None):
+        self.responder = responder or (lambda sql, args: [])
+        self.executed = []
+        self.pings = 0
+        self.insert_id = 0
+        self.open = True
+        self.server_status = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def cursor(self, cursorclass=None):
+        return FakeCursor(self, cursorclass)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.open = False
+
+class OpenedConnections(list):
+    """Replacement for _open_connection that hands out FakeConnections and keeps them"""
+    responder = None
+
+    def open(self):
+        conn = FakeConnection(self.responder)
+        self.append(conn)
+        return conn
+
+class FakeClock:
+    """Replacement for time.monotonic that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def app():
+    flask_app.testing = True
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def opened_connections(monkeypatch):
+    """
+    Start every test with an empty connection pool whose new connections are
+    FakeConnections. Returns the list of connections opened so far; set
+    `opened_connections.responder` before the first query to script results.
+    """
+    opened = OpenedConnections()
+    monkeypatch.setattr(db_connect, '_pool', {'pid': None, 'idle': None, 'size': 0, 'stats': {}})
+    monkeypatch.setattr(db_connect, '_open_connection', opened.open)
+    return opened
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Freeze db_connect's monotonic clock; advance it with fake_clock.advance(seconds)"""
+    clock = FakeClock()
+    monkeypatch.setattr(db_connect, 'time', SimpleNamespace(monotonic=clock, perf_counter=time.perf_counter,
+                                                            sleep=time.sleep))
+    return clock
+
+@pytest.fixture
+def database_down(monkeypatch):
+    """Start with an empty pool whose every connection attempt fails like an unreachable server"""
+    def refuse():
+        raise pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+
+    monkeypatch.setattr(db_connect, '_pool', {'pid': None, 'idle': None, 'size': 0, 'stats': {}})
+    monkeypatch.setattr(db_connect, '_open_connection', refuse)
+
+@pytest.fixture
+def logged_in(client):
+    """Put employee 1 in the test client's session, as Flask-Login does after a login"""
+    from app.models import Employee
+
+    Employee.invalidate_cache()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    yield
+    Employee.invalidate_cache()
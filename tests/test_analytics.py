@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app import functions
+from app.blueprints import analytics
+from app.summaries import RENTAL_HISTORY_COUNTER
+from conftest import EMPLOYEE_ROW, FakeConnection
+
+def lines_frame(today):
+    """Three rentals: one long since returned, one spanning a month boundary, one still out"""
+    rows = [(1, today - timedelta(days=400), today - timedelta(days=390), 50.0, 0.0, 1),
+            (2, today - timedelta(days=45), today - timedelta(days=20), 80.0, 8.0, 2),
+            (3, today - timedelta(days=3), None, 30.0, 0.0, 1)]
+    frame = pd.DataFrame.from_records(rows, columns=analytics.BUCKET_COLUMNS)
+    frame['rental_date'] = pd.to_datetime(frame['rental_date'])
+    frame['return_date'] = pd.to_datetime(frame['return_date'])
+    return frame
+
+def test_cold_page_load_reads_the_window_once(app, opened_connections, monkeypatch):
+    today = date.today()
+    frame = lines_frame(today)
+    loads = []
+
+    def load_bucket_frame(db, start, end):
+        loads.append((start, end))
+        return analytics.bucket_rows(frame, start, end)
+
+    monkeypatch.setattr(analytics, 'load_bucket_frame', load_bucket_frame)
+    monkeypatch.setattr(analytics, 'ANALYTICS_CACHE_TTL', 0)
+    monkeypatch.setattr(analytics, 'ANALYTICS_CURRENT_TTL', 0)
+    first = analytics.month_buckets(today - timedelta(days=500), today)[0]
+
+    with app.app_context():
+        buckets = analytics.get_buckets(None, first, today)
+
+    assert loads == [(first, analytics.next_month(today))]
+    expected = [analytics.compute_bucket(analytics.bucket_rows(frame, start, analytics.next_month(start)),
+                                         start, analytics.next_month(start), today)
+                for start in analytics.month_buckets(first, today)]
+    assert [bucket['revenue'] for bucket in buckets] == [bucket['revenue'] for bucket in expected]
+    assert sum(bucket['rentals'] for bucket in buckets) == 3
+
+def test_closed_months_reload_when_a_write_reaches_back_into_them(app, opened_connections, monkeypatch):
+    today = date.today()
+    frame = lines_frame(today)
+    counters = {}
+    loads = []
+
+    def load_bucket_frame(db, start, end):
+        loads.append(start)
+        return analytics.bucket_rows(frame, start, end)
+
+    opened_connections.responder = lambda sql, args: [{'table_name': name, 'version': version}
+                                                      for name, version in counters.items()]
+    monkeypatch.setattr(analytics, 'load_bucket_frame', load_bucket_frame)
+    monkeypatch.setattr(functions, '_snapshots', {})
+    months = analytics.month_buckets(today - timedelta(days=150), today)
+
+    def page_load():
+        with app.test_request_context():
+            analytics.get_buckets(None, months[0], today)
+
+    page_load()
+    page_load()
+    assert loads == [months[0]]
+
+    # A write back-dated into the second month invalidates it, not the first
+    counters[functions.rental_month_counter(months[1])] = 1
+    page_load()
+    assert loads[1:] == [months[1]]
+
+    counters[RENTAL_HISTORY_COUNTER] = 1
+    page_load()
+    assert loads[2:] == [months[0]]
+
+def test_rewind_rental_months_bumps_closed_months_only():
+    conn = FakeConnection()
+    today = date(2026, 3, 10)
+
+    functions.rewind_rental_months(conn.cursor(), date(2025, 12, 20), today)
+    functions.rewind_rental_months(conn.cursor(), date(2026, 3, 1), today)
+
+    assert [args for _, args in conn.executed] == [['rental_month:2025-12', 'rental_month:2026-01',
+                                                     'rental_month:2026-02']]
+
+def test_analytics_page_renders_the_window(client, logged_in, opened_connections, monkeypatch):
+    today = date.today()
+    frame = lines_frame(today)
+
+    def respond(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'FROM equipment' in sql:
+            return [{'equipment_id': 1, 'equipment_name': 'Ladder', 'equipment_type': 'Access'},
+                    {'equipment_id': 2, 'equipment_name': 'Scaffold tower', 'equipment_type': 'Access'}]
+        return []
+
+    opened_connections.responder = respond
+    monkeypatch.setattr(analytics, 'load_bucket_frame', lambda db, start, end: analytics.bucket_rows(frame, start, end))
+    monkeypatch.setattr(functions, '_snapshots', {})
+
+    for months in ('3', '24', 'forever'):
+        response = client.get(f'/analytics?months={months}')
+        assert response.status_code == 200
+        assert b'Scaffold tower' in response.data
+
+def test_utilization_route_clamps_the_range_to_the_rollup(client, logged_in, opened_connections):
+    def respond(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'FROM rollup_watermark' in sql:
+            return [{'processed_through': date(2024, 1, 31)}]
+        if 'FROM equipment_daily_rollup' in sql:
+            return [{'equipment_id': 3, 'equipment_name': 'Ladder', 'equipment_type': 'Access',
+                     'rented_days': 6, 'idle_days': 24, 'revenue': 120}]
+        return []
+
+    opened_connections.responder = respond
+    response = client.get('/analytics/utilization?start=2024-01-01&end=2024-03-31&type=Access&min_idle=0.8')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['end'], body['processed_through']) == ('2024-01-31', '2024-01-31')
+    assert body['equipment'] == [{'equipment_id': 3, 'equipment_name': 'Ladder', 'equipment_type': 'Access',
+                                  'rented_days': 6, 'idle_days': 24, 'revenue': 120.0, 'utilization': 0.2}]
+    [query_args] = [args for conn in opened_connections for sql, args in conn.executed
+                    if 'FROM equipment_daily_rollup' in sql]
+    assert query_args == [date(2024, 1, 1), date(2024, 1, 31), 'Access', 0.8]
+
+    assert client.get('/analytics/utilization?start=2024-02-01&end=2024-01-01').status_code == 400
+    assert client.get('/analytics/utilization?start=soon').status_code == 400
@@ -0,0 +1,66 @@
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app.blueprints import auth
+from app.functions import new_rate_limiter
+from app.models import Employee
+from conftest import EMPLOYEE_ROW
+
+@pytest.fixture
+def ip_limit_of_two(monkeypatch):
+    """Fresh login limiters allowing two attempts per client IP"""
+    monkeypatch.setattr(auth, '_user_attempts', new_rate_limiter(auth.LOGIN_USER_LIMIT, auth.LOGIN_THROTTLE_WINDOW))
+    monkeypatch.setattr(auth, '_ip_attempts', new_rate_limiter(2, auth.LOGIN_THROTTLE_WINDOW))
+
+@pytest.fixture
+def behind_one_proxy(app, monkeypatch):
+    """Serve the app as PROXY_FIX_HOPS=1 does, trusting one proxy's X-Forwarded-For"""
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1, x_proto=1))
+
+def login_from(client, address, username, password='wrong'):
+    """POST the login form as the Heroku router would forward it for a client at address"""
+    return client.post('/login', data={'username': username, 'password': password},
+                       headers={'X-Forwarded-For': address})
+
+def test_login_with_database_down_flashes_an_error(client, database_down):
+    response = client.post('/login', data={'username': 'outage-check', 'password': 'secret'})
+
+    assert response.status_code == 503
+    assert b'The database is unavailable' in response.data
+    assert 'Retry-After' in response.headers
+
+def test_session_with_database_down_is_sent_to_login(client, database_down, logged_in):
+    response = client.get('/health/user-cache')
+
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith('/login')
+
+def test_forwarded_clients_are_throttled_separately(client, behind_one_proxy, ip_limit_of_two, monkeypatch):
+    monkeypatch.setattr(Employee, 'authenticate', staticmethod(lambda username, password: None))
+
+    assert login_from(client, '203.0.113.7', 'first').status_code == 200
+    assert login_from(client, '203.0.113.7', 'second').status_code == 200
+    assert login_from(client, '203.0.113.7', 'third').status_code == 429
+    assert login_from(client, '198.51.100.4', 'fourth').status_code == 200
+
+def test_successful_logins_do_not_use_up_the_ip_window(client, behind_one_proxy, ip_limit_of_two, monkeypatch):
+    def authenticate(username, password):
+        return Employee(**EMPLOYEE_ROW) if password == 'right' else None
+
+    monkeypatch.setattr(Employee, 'authenticate', staticmethod(authenticate))
+    for _ in range(3):
+        assert login_from(client, '203.0.113.7', 'admin', 'right').status_code == 302
+        client.get('/logout')
+        Employee.invalidate_cache()
+
+    assert login_from(client, '203.0.113.7', 'admin').status_code == 200
+    assert login_from(client, '203.0.113.7', 'admin').status_code == 200
+    assert login_from(client, '203.0.113.7', 'admin').status_code == 429
+
+def test_forwarded_header_is_ignored_without_a_proxy(client, ip_limit_of_two, monkeypatch):
+    monkeypatch.setattr(Employee, 'authenticate', staticmethod(lambda username, password: None))
+
+    assert login_from(client, '203.0.113.7', 'first').status_code == 200
+    assert login_from(client, '198.51.100.4', 'second').status_code == 200
+    # A client cannot escape its own window by naming another address
+    assert login_from(client, '192.0.2.9', 'third').status_code == 429
@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+
+from app import compression
+from app.compression import asset_url
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    """Negotiate as if the optional brotli package were not installed"""
+    monkeypatch.setattr(compression, 'brotli', None)
+
+def hashed_url(app, name):
+    """The /assets/ URL of a file in app/static/assets"""
+    with app.test_request_context():
+        return asset_url(name)
+
+def test_hashed_asset_is_served_precompressed_and_immutable(app, client, gzip_only):
+    url = hashed_url(app, 'app.css')
+    with open(f'{compression.ASSET_DIR}/app.css', 'rb') as f:
+        source = f.read()
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == source
+
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == source
+    assert client.get(url, headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+def test_images_are_never_recompressed(app, client, gzip_only):
+    response = client.get(hashed_url(app, 'olympics.jpg'), headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
+
+def test_unknown_asset_is_404(client):
+    assert client.get('/assets/app.000000000000.css').status_code == 404
+
+def test_pages_are_gzipped_when_accepted(client, gzip_only):
+    response = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    page = gzip.decompress(response.data)
+
+    response = client.get('/login')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == page
+
+def test_streamed_chunks_are_flushed_as_they_are_compressed():
+    chunks = compression.compress_chunks(iter(['id,name\n', '1,Ladder\n']), 'gzip', 6)
+
+    first = next(chunks)
+    assert first and gzip.decompress(first + b''.join(chunks)) == b'id,name\n1,Ladder\n'
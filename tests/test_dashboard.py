@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from app import functions
+from conftest import EMPLOYEE_ROW
+
+def shop_responder(counters, status_rows):
+    """Employee login, the shared change counters and the status summary; other queries find nothing"""
+    def responder(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'FROM data_version' in sql:
+            return [{'table_name': name, 'version': version} for name, version in counters.items()]
+        if 'FROM rental_status_summary' in sql:
+            return status_rows
+        return []
+    return responder
+
+def summary_reads(opened_connections):
+    return [sql for conn in opened_connections for sql, _ in conn.executed if 'rental_status_summary' in sql]
+
+def test_dashboard_shows_the_kpis_from_the_status_summary(client, logged_in, opened_connections, monkeypatch):
+    monkeypatch.setattr(functions, '_snapshots', {})
+    opened_connections.responder = shop_responder({}, [
+        {'status': 'Active', 'rental_count': 3, 'total_cost': Decimal('300.00'), 'late_fee_total': Decimal('0')},
+        {'status': 'Overdue', 'rental_count': 1, 'total_cost': Decimal('110.00'), 'late_fee_total': Decimal('10')},
+    ])
+
+    response = client.get('/dashboard')
+
+    assert response.status_code == 200
+    assert b'410.00' in response.data
+    assert b'10.00' in response.data
+
+def test_kpi_snapshot_is_reused_until_a_rental_write(client, logged_in, opened_connections, monkeypatch):
+    monkeypatch.setattr(functions, '_snapshots', {})
+    counters = {'rental': 1}
+    opened_connections.responder = shop_responder(counters, [])
+
+    assert client.get('/dashboard').status_code == 200
+    assert client.get('/dashboard').status_code == 200
+    assert len(summary_reads(opened_connections)) == 1
+
+    # Another worker's rental write advances the shared counter
+    counters['rental'] = 2
+    assert client.get('/dashboard').status_code == 200
+    assert len(summary_reads(opened_connections)) == 2
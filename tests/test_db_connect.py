@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from app import db_connect
+from app.compression import asset_url
+from conftest import EMPLOYEE_ROW
+
+def test_warm_connection_is_reused_without_a_ping(opened_connections, fake_clock):
+    conn = db_connect.acquire_connection()
+    db_connect.release_connection(conn)
+
+    fake_clock.advance(db_connect.POOL_VALIDATION_INTERVAL - 1)
+    assert db_connect.acquire_connection() is conn
+    stats = db_connect.get_pool_stats()
+    assert stats['pings'] == 0
+    assert stats['validations_skipped'] == 1
+    assert conn.pings == 0
+    db_connect.release_connection(conn)
+
+    fake_clock.advance(db_connect.POOL_VALIDATION_INTERVAL + 1)
+    assert db_connect.acquire_connection() is conn
+    assert db_connect.get_pool_stats()['pings'] == 1
+    assert conn.pings == 1
+    assert len(opened_connections) == 1
+
+def test_suspect_connection_is_pinged_on_next_checkout(opened_connections, fake_clock):
+    conn = db_connect.acquire_connection()
+    db_connect.release_connection(conn, suspect=True)
+
+    assert db_connect.acquire_connection() is conn
+    assert db_connect.get_pool_stats()['pings'] == 1
+
+def test_static_and_redirect_responses_open_no_connection(client, opened_connections):
+    assert client.get('/static/assets/app.css').status_code == 200
+    with client.application.test_request_context():
+        hashed_url = asset_url('app.css')
+    assert hashed_url.startswith('/assets/')
+    assert client.get(hashed_url).status_code == 200
+    assert client.get('/').status_code == 302
+
+    assert opened_connections == []
+    assert db_connect.get_pool_stats()['checkouts'] == 0
+
+def test_statements_are_recorded_once_with_their_shape(app, opened_connections):
+    with app.app_context():
+        cursor = db_connect.get_db().cursor()
+        cursor.execute("SELECT * FROM rental WHERE rental_id IN (%s, %s, %s) AND status = 'Active'", (1, 2, 3))
+        cursor.executemany("INSERT INTO rental_detail (rental_id, equipment_id) VALUES (%s, %s)",
+                           [(1, 1), (1, 2), (1, 3)])
+        stats = db_connect.get_request_sql_stats()
+
+    assert stats['queries'] == 2
+    assert list(stats['shapes']) == ['SELECT * FROM rental WHERE rental_id IN (...) AND status = ?',
+                                     'INSERT INTO rental_detail (rental_id, equipment_id) VALUES (...)']
+
+def test_repeated_statement_flags_the_request(client, logged_in, opened_connections, monkeypatch, caplog):
+    monkeypatch.setattr('app.SQL_DEBUG_HEADERS', True)
+    # Any shape seen once counts as repeated, so the user loader's one SELECT is flagged
+    monkeypatch.setattr(db_connect, 'SQL_REPEAT_THRESHOLD', 1)
+    opened_connections.responder = lambda sql, args: [EMPLOYEE_ROW] if 'FROM employee' in sql else []
+
+    with caplog.at_level('WARNING', logger='app.slow_queries'):
+        response = client.get('/health/user-cache')
+
+    assert response.headers['X-DB-Queries'] == '1'
+    [record] = [json.loads(record.message) for record in caplog.records]
+    assert record['event'] == 'slow_request'
+    assert record['path'] == '/health/user-cache'
+    assert [repeat['count'] for repeat in record['repeated']] == [1]
+    assert 'FROM employee WHERE employee_id = %s' in record['repeated'][0]['statement']
+
+def test_pool_never_opens_more_than_its_max_size(opened_connections, monkeypatch):
+    monkeypatch.setattr(db_connect, 'POOL_MAX_SIZE', 2)
+    borrowed = [db_connect.acquire_connection(), db_connect.acquire_connection()]
+
+    with pytest.raises(db_connect.PoolTimeoutError):
+        db_connect.acquire_connection(timeout=0)
+    db_connect.release_connection(borrowed.pop())
+    borrowed.append(db_connect.acquire_connection(timeout=0))
+
+    assert len(opened_connections) == 2
+    stats = db_connect.get_pool_stats()
+    assert (stats['size'], stats['in_use'], stats['timeouts']) == (2, 2, 1)
+
+def test_request_connection_goes_back_to_the_pool(client, logged_in, opened_connections):
+    opened_connections.responder = lambda sql, args: [EMPLOYEE_ROW] if 'FROM employee' in sql else []
+
+    for _ in range(3):
+        assert client.get('/health/user-cache').status_code == 200
+
+    assert len(opened_connections) == 1
+    stats = db_connect.get_pool_stats()
+    assert (stats['idle'], stats['in_use']) == (1, 0)
+
+def test_closed_connection_is_dropped_instead_of_pooled(opened_connections):
+    conn = db_connect.acquire_connection()
+    conn.close()
+    db_connect.release_connection(conn)
+
+    assert db_connect.get_pool_stats()['size'] == 0
+    assert db_connect.acquire_connection() is not conn
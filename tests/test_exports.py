@@ -0,0 +1,104 @@
+import csv
+import gzip
+import io
+import json
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.blueprints.exports import (CUSTOMER_COLUMNS, EQUIPMENT_COLUMNS, EXPORT_FLUSH_ROWS, RENTAL_COLUMNS,
+                                    RENTAL_LINE_COLUMNS, gzip_chunks, nest_rental_lines, serialize_csv, serialize_json)
+from conftest import EMPLOYEE_ROW
+
+def rental_lines(count, pulled=None):
+    """count synthetic export rows, three lines per rental; appends to pulled as each row is read"""
+    first_day = date(2024, 1, 1)
+    for i in range(count):
+        if pulled is not None:
+            pulled.append(i)
+        rental_id = i // 3 + 1
+        yield {column: None for column in RENTAL_COLUMNS} | {
+            'rental_id': rental_id, 'rental_date': first_day + timedelta(days=rental_id % 300),
+            'status': 'Active', 'subtotal': Decimal('150.00'), 'total_cost': Decimal('150.00'),
+            'customer_first_name': 'First', 'customer_last_name': f'Last{rental_id}', 'rental_detail_id': i + 1,
+            'equipment_id': i % 50, 'equipment_name': f'Equipment {i % 50}', 'line_total': Decimal('50.00')}
+
+@pytest.mark.parametrize('serialize', [
+    lambda rows: serialize_csv(rows, RENTAL_COLUMNS),
+    lambda rows: serialize_json(rows),
+])
+def test_serializers_read_rows_only_as_chunks_are_sent(serialize):
+    pulled = []
+    chunks = serialize(rental_lines(10 * EXPORT_FLUSH_ROWS, pulled))
+
+    next(chunks)
+    assert len(pulled) == EXPORT_FLUSH_ROWS
+
+def export_peak(rows):
+    """Bytes a CSV and a gzipped nested-JSON export of rows synthetic lines send, and the peak traced memory"""
+    tracemalloc.start()
+    try:
+        size = sum(len(chunk) for chunk in serialize_csv(rental_lines(rows), RENTAL_COLUMNS))
+        size += sum(len(chunk) for chunk in gzip_chunks(serialize_json(nest_rental_lines(rental_lines(rows)))))
+        return size, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_export_memory_does_not_grow_with_the_row_count():
+    """The pytest form of `scripts/benchmark.py export`: ten times the rows, about the same peak"""
+    small_size, small_peak = export_peak(5000)
+    large_size, large_peak = export_peak(50000)
+
+    assert large_size > 9 * small_size
+    assert large_peak < small_peak + 256 * 1024
+
+def test_json_export_nests_lines_under_their_rental():
+    rentals = json.loads(''.join(serialize_json(nest_rental_lines(rental_lines(4)))))
+
+    assert [rental['rental_id'] for rental in rentals] == [1, 2]
+    assert [len(rental['lines']) for rental in rentals] == [3, 1]
+    assert rentals[0]['rental_date'] == '2024-01-02'
+    assert rentals[0]['lines'][0]['line_total'] == 50.0
+
+@pytest.fixture
+def export_rows(opened_connections):
+    """Answer every export query with two rental lines, carrying the customer and equipment columns too"""
+    extra = dict.fromkeys(CUSTOMER_COLUMNS + EQUIPMENT_COLUMNS + RENTAL_LINE_COLUMNS + ('equipment_list',))
+    rows = [extra | row for row in rental_lines(2)]
+
+    def respond(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'data_version' in sql:
+            return []
+        return [dict(row) for row in rows]
+
+    opened_connections.responder = respond
+    return rows
+
+@pytest.mark.parametrize('url', [
+    '/export/rentals.csv', '/export/rentals.json?status=active&start=2024-01-01&end=2024-12-31',
+    '/export/customers.csv?status=all', '/export/customers.json', '/export/equipment.csv?status=archived',
+    '/export/equipment.json', '/export/overdue.csv', '/export/overdue.json',
+])
+def test_export_routes_stream_a_download(client, logged_in, export_rows, url):
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['Content-Disposition'].startswith('attachment; filename=')
+    assert response.data
+
+def test_rental_csv_export_has_a_header_and_one_line_per_row(client, logged_in, export_rows):
+    response = client.get('/export/rentals.csv?gzip=1')
+
+    assert response.mimetype == 'application/gzip'
+    lines = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode())))
+    assert lines[0] == list(RENTAL_COLUMNS)
+    assert [line[RENTAL_COLUMNS.index('rental_detail_id')] for line in lines[1:]] == ['1', '2']
+
+@pytest.mark.parametrize('query', ['status=lost', 'start=yesterday'])
+def test_rental_export_rejects_bad_filters(client, logged_in, export_rows, query):
+    assert client.get(f'/export/rentals.csv?{query}').status_code == 400
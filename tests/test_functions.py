@@ -0,0 +1,150 @@
+from datetime import date
+
+import pytest
+
+from app import functions
+from app.functions import (MAX_PAGE_SIZE, PAGE_SIZE, decode_page_token, encode_page_token, fetch_keyset_page,
+                           keyset_condition, new_lru_cache, parse_page_size)
+from conftest import EMPLOYEE_ROW, FakeConnection
+
+def id_table(ids):
+    """Responder for `SELECT id FROM t [WHERE id >/< %s] ORDER BY id ASC/DESC LIMIT %s` over the given ids"""
+    def responder(sql, args):
+        *seek, limit = args
+        rows = sorted(ids, reverse='DESC' in sql)
+        if seek:
+            rows = [i for i in rows if (i > seek[0] if 'id > %s' in sql else i < seek[0])]
+        return [{'id': i} for i in rows[:limit]]
+    return responder
+
+def walk(cursor, token=None, descending=False):
+    page = fetch_keyset_page(cursor, 'SELECT id FROM t', [], ['id'], ['id'], descending=descending,
+                             page_size=2, token=token)
+    return [row['id'] for row in page['rows']], page
+
+def test_page_token_round_trips_and_rejects_garbage():
+    token = encode_page_token('next', [date(2024, 5, 1), 42])
+
+    assert decode_page_token(token) == ('next', ['2024-05-01', 42])
+    assert decode_page_token(None) == (None, None)
+    assert decode_page_token('not a token') == (None, None)
+    assert decode_page_token(encode_page_token('sideways', [1])) == (None, None)
+
+@pytest.mark.parametrize('value, size', [(None, PAGE_SIZE), ('abc', PAGE_SIZE), ('0', 1), ('25', 25),
+                                         ('100000', MAX_PAGE_SIZE)])
+def test_page_size_is_clamped(value, size):
+    assert parse_page_size(value) == size
+
+def test_keyset_condition_expands_the_row_comparison():
+    sql, params = keyset_condition(['rental_date', 'rental_id'], True, ['2024-05-01', 7])
+
+    assert sql == '((rental_date < %s) OR (rental_date = %s AND rental_id < %s))'
+    assert params == ['2024-05-01', '2024-05-01', 7]
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_keyset_pages_walk_forward_and_back(descending):
+    cursor = FakeConnection(id_table([1, 2, 3, 4, 5])).cursor()
+    order = [1, 2, 3, 4, 5][::-1 if descending else 1]
+
+    first, page = walk(cursor, descending=descending)
+    assert first == order[:2] and page['prev_token'] is None
+    second, page = walk(cursor, page['next_token'], descending)
+    assert second == order[2:4]
+    last, page = walk(cursor, page['next_token'], descending)
+    assert last == order[4:] and page['next_token'] is None
+
+    back, page = walk(cursor, page['prev_token'], descending)
+    assert back == order[2:4]
+    back, page = walk(cursor, page['prev_token'], descending)
+    assert back == order[:2] and page['prev_token'] is None
+
+@pytest.mark.parametrize('url', ['/rentals', '/customers', '/equipment'])
+def test_listings_accept_any_page_arguments(client, logged_in, opened_connections, url):
+    opened_connections.responder = lambda sql, args: [EMPLOYEE_ROW] if 'FROM employee' in sql else []
+
+    assert client.get(f'{url}?page=garbage&per_page=100000').status_code == 200
+    limits = [args[-1] for conn in opened_connections for sql, args in conn.executed if 'LIMIT %s' in sql]
+    assert MAX_PAGE_SIZE + 1 in limits
+
+class CountedTables:
+    """
+    The shared data_version counters, updated the way the upsert in
+    bump_change_counters does, plus a count of the listing queries on each
+    table (answered with no rows).
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.listed = {}
+
+    def __call__(self, sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'FROM data_version' in sql:
+            return [{'table_name': name, 'version': version} for name, version in self.versions.items()]
+        if 'INSERT INTO data_version' in sql:
+            for name in args:
+                self.versions[name] = self.versions.get(name, 0) + 1
+            return len(args)
+        for table in ('customer', 'equipment'):
+            if 'LIMIT %s' in sql and f'FROM {table} ' in sql:
+                self.listed[table] = self.listed.get(table, 0) + 1
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+@pytest.fixture
+def counted_tables(opened_connections, monkeypatch):
+    """Fresh fragment cache and data versions over a CountedTables database"""
+    monkeypatch.setattr(functions, '_fragment_cache', new_lru_cache(8, 60))
+    monkeypatch.setattr(functions, '_data_versions', {})
+    tables = CountedTables()
+    opened_connections.responder = tables
+    return tables
+
+def test_listing_fragment_is_reused_until_its_tables_change(client, logged_in, counted_tables, monkeypatch):
+    monkeypatch.setattr('app.blueprints.rentals.refresh_search_entry', lambda cursor, source, doc_id: None)
+
+    client.get('/customers')
+    client.get('/customers')
+    assert counted_tables.listed == {'customer': 1}
+
+    # Another page size is another fragment; other tables' writes leave it alone
+    client.get('/customers?per_page=10')
+    client.post('/equipment/create', data={'equipment_name': 'Saw', 'equipment_type': 'Tool', 'daily_rate': '5'})
+    client.get('/customers')
+    assert counted_tables.listed == {'customer': 2}
+
+    # This worker's own write, then another worker's (only the shared counter moves)
+    client.post('/customers/create', data={'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'a@b.c',
+                                           'phone': '1'})
+    client.get('/customers')
+    counted_tables.versions['rental'] = counted_tables.versions.get('rental', 0) + 1
+    client.get('/customers')
+    assert counted_tables.listed == {'customer': 4}
+    assert functions.get_fragment_cache_stats()['hits'] == 2
+
+def test_unchanged_listing_answers_304_without_running_the_view(client, logged_in, counted_tables):
+    response = client.get('/customers')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag.startswith('W/')
+
+    response = client.get('/customers', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert counted_tables.listed == {'customer': 1}
+
+    # Another URL, or a change to a table the page reads, gets a new tag
+    assert client.get('/customers?status=archived', headers={'If-None-Match': etag}).status_code == 200
+    counted_tables.versions['customer'] = 1
+    response = client.get('/customers', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_pending_flash_messages_bypass_the_304(client, logged_in, counted_tables):
+    etag = client.get('/customers').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Customer created successfully!')]
+
+    response = client.get('/customers', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Customer created successfully!' in response.data
+    assert 'ETag' not in response.headers
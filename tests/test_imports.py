@@ -0,0 +1,141 @@
+import io
+from datetime import date
+
+import pytest
+
+from app.blueprints.imports import ImportFormatError, import_csv, import_key_for
+from conftest import EMPLOYEE_ROW, FakeConnection
+
+CUSTOMERS_CSV = b"""first_name,last_name,email,phone,state
+Ada,Lovelace,ada@example.com,555-0100,ny
+Alan,Turing,alan@example.com,555-0101,
+Grace,Hopper,not-an-email,555-0102,
+Ada,Again,ADA@example.com,555-0103,
+Linus,Torvalds,linus@example.com,555-0104,
+Edsger,Dijkstra,edsger@example.com,555-0105,
+"""
+
+class CustomerTable:
+    """
+    In-memory customer and import_progress tables answering the statements an
+    import runs. fail_on_insert makes the insert of that customer (by email)
+    raise, the way a dropped connection would stop an import.
+    """
+
+    def __init__(self, emails=(), fail_on_insert=None):
+        self.rows = [{'email': email} for email in emails]
+        self.progress = {}
+        self.fail_on_insert = fail_on_insert
+
+    def __call__(self, sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'SELECT email FROM customer' in sql:
+            wanted = {email.lower() for email in args}
+            return [row for row in self.rows if row['email'].lower() in wanted]
+        if 'INSERT INTO customer' in sql:
+            if args[2] == self.fail_on_insert:
+                self.fail_on_insert = None
+                raise ConnectionResetError('server went away')
+            self.rows.append(dict(zip(('first_name', 'last_name', 'email', 'phone'), args)) | {'state': args[6]})
+            return 1
+        if 'FROM import_progress' in sql:
+            row = self.progress.get(args[0])
+            return [dict(row)] if row else []
+        if 'INSERT INTO import_progress' in sql:
+            import_key, _, _, rows_done, inserted, duplicates, invalid, completed = args
+            self.progress[import_key] = {'rows_done': rows_done, 'inserted': inserted, 'duplicates': duplicates,
+                                         'invalid': invalid, 'completed': completed}
+            return 1
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+def run_import(table, data=CUSTOMERS_CSV, import_key=None, batch_size=2):
+    """import_csv of data as customers into table"""
+    return import_csv(FakeConnection(table), 'customers', io.StringIO(data.decode()), import_key=import_key,
+                      batch_size=batch_size)
+
+def test_import_validates_and_deduplicates_rows():
+    table = CustomerTable(emails=['linus@example.com'])
+
+    stats = run_import(table)
+
+    assert [row['email'] for row in table.rows] == ['linus@example.com', 'ada@example.com', 'alan@example.com',
+                                                    'edsger@example.com']
+    assert table.rows[1]['state'] == 'NY'
+    assert (stats['rows'], stats['inserted'], stats['duplicates'], stats['invalid']) == (6, 3, 2, 1)
+    assert stats['errors'] == [{'line': 4, 'error': "email 'not-an-email' is not a valid address"}]
+
+@pytest.mark.parametrize('header, error', [
+    (b'first_name,last_name,email\n', 'missing column(s): phone'),
+    (b'first_name,last_name,email,phone,nickname\n', 'unknown column(s): nickname'),
+])
+def test_import_rejects_an_unusable_header(header, error):
+    with pytest.raises(ImportFormatError, match=error.replace('(', r'\(').replace(')', r'\)')):
+        run_import(CustomerTable(), data=header)
+
+def test_interrupted_import_resumes_after_the_last_committed_batch():
+    table = CustomerTable(fail_on_insert='linus@example.com')
+    import_key = import_key_for('customers', io.BytesIO(CUSTOMERS_CSV))
+
+    with pytest.raises(ConnectionResetError):
+        run_import(table, import_key=import_key)
+    assert table.progress[import_key]['rows_done'] == 4
+    assert not table.progress[import_key]['completed']
+
+    stats = run_import(table, import_key=import_key)
+    assert stats['resumed_from'] == 4
+    assert [row['email'] for row in table.rows] == ['ada@example.com', 'alan@example.com', 'linus@example.com',
+                                                    'edsger@example.com']
+    assert table.progress[import_key] == {'rows_done': 6, 'inserted': 4, 'duplicates': 1, 'invalid': 1,
+                                          'completed': True}
+
+    again = run_import(table, import_key=import_key)
+    assert again['already_imported']
+    assert len(table.rows) == 4
+
+@pytest.mark.parametrize('purchase_dates, rewound_to', [
+    (('2024-03-01', '2023-11-20'), date(2023, 11, 20)),
+    (('2024-03-01', ''), date(2023, 6, 1)),
+])
+def test_equipment_import_rewinds_the_rollup_to_the_earliest_purchase(purchase_dates, rewound_to):
+    data = 'equipment_name,equipment_type,daily_rate,purchase_date\n' + ''.join(
+        f'Item {i},Tool,10,{purchase_date}\n' for i, purchase_date in enumerate(purchase_dates))
+
+    def respond(sql, args):
+        if 'MIN(rental_date)' in sql:
+            return [{'first_day': date(2023, 6, 1)}]
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+    conn = FakeConnection(respond)
+    stats = import_csv(conn, 'equipment', io.StringIO(data))
+
+    assert stats['inserted'] == 2
+    assert [args for sql, args in conn.executed if 'UPDATE rollup_watermark' in sql] == [
+        (rewound_to, 'equipment_daily_rollup')]
+
+def test_import_route_redirects_to_the_list_with_a_summary(client, logged_in, opened_connections):
+    table = CustomerTable()
+    opened_connections.responder = table
+
+    response = client.post('/import/customers', data={'file': (io.BytesIO(CUSTOMERS_CSV), 'customers.csv')})
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/customers')
+    assert len(table.rows) == 4
+    with client.session_transaction() as session:
+        messages = session['_flashes']
+    assert messages[0] == ('warning', 'Imported customers.csv: 4 inserted, 1 duplicate(s) skipped, '
+                                      '1 invalid row(s).')
+
+def test_import_route_answers_json_when_asked(client, logged_in, opened_connections):
+    opened_connections.responder = CustomerTable()
+
+    response = client.post('/import/customers?format=json',
+                           data={'file': (io.BytesIO(CUSTOMERS_CSV), 'customers.csv')})
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 4
+
+    assert client.post('/import/customers?format=json').status_code == 400
+    response = client.post('/import/equipment?format=json', data={'file': (io.BytesIO(CUSTOMERS_CSV), 'x.csv')})
+    assert response.status_code == 400
+    assert 'missing column(s)' in response.get_json()['error']
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import models
+from conftest import EMPLOYEE_ROW
+
+def employee_selects(opened_connections):
+    return [sql for conn in opened_connections for sql, _ in conn.executed if 'FROM employee' in sql]
+
+def test_repeated_requests_load_the_employee_once(client, logged_in, opened_connections):
+    opened_connections.responder = lambda sql, args: [EMPLOYEE_ROW] if 'FROM employee' in sql else []
+
+    assert client.get('/health/user-cache').status_code == 200
+    assert client.get('/health/user-cache').status_code == 200
+
+    assert len(employee_selects(opened_connections)) == 1
+
+@pytest.fixture
+def slot_dir(tmp_path, monkeypatch):
+    """An empty directory for the password slot files"""
+    monkeypatch.setattr(models, 'PASSWORD_CHECK_LOCK_DIR', str(tmp_path))
+    return tmp_path
+
+@pytest.mark.skipif(models.fcntl is None, reason='slot files need fcntl')
+def test_password_check_is_refused_while_another_process_holds_every_slot(slot_dir):
+    password_hash = generate_password_hash('secret')
+    # Another worker holding every slot: flock() conflicts across processes
+    holder = subprocess.Popen([sys.executable, '-c', f"""
+import fcntl, os, sys
+fds = [os.open(os.path.join({str(slot_dir)!r}, f'slot-{{slot}}.lock'), os.O_RDWR | os.O_CREAT)
+       for slot in range({models.PASSWORD_CHECK_CONCURRENCY})]
+for fd in fds:
+    fcntl.flock(fd, fcntl.LOCK_EX)
+print('held', flush=True)
+sys.stdin.read()
+"""], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'held'
+        with pytest.raises(models.PasswordCheckBusyError):
+            models.verify_password(password_hash, 'secret')
+    finally:
+        holder.stdin.close()
+        holder.wait()
+    assert models.verify_password(password_hash, 'secret')
+
+@pytest.mark.skipif(models.fcntl is None, reason='slot files need fcntl')
+def test_password_slots_are_exclusive_within_one_process(slot_dir):
+    held = [models._lock_password_slot() for _ in range(models.PASSWORD_CHECK_CONCURRENCY)]
+    try:
+        assert None not in held
+        assert models._lock_password_slot() is None
+    finally:
+        for fd in held:
+            os.close(fd)
+    fd = models._lock_password_slot()
+    assert fd is not None
+    os.close(fd)
@@ -0,0 +1,123 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import functions
+from app.blueprints import rentals
+from app.blueprints.rentals import refresh_overdue_rentals, sweep_overdue_rentals
+from app.summaries import OVERDUE_COLUMNS, check_overdue_rentals, rebuild_overdue_rentals
+from conftest import EMPLOYEE_ROW, FakeConnection
+
+def overdue_row(rental_id, customer_id=1, phone='555-0100', equipment_list='Ladder'):
+    """A row of the live overdue join"""
+    return {'rental_id': rental_id, 'customer_id': customer_id, 'rental_date': date(2024, 1, 2),
+            'due_date': date(2024, 1, rental_id + 5), 'subtotal': Decimal('100.00'), 'late_fee': Decimal('10.00'),
+            'total_cost': Decimal('110.00'), 'first_name': 'Ada', 'last_name': f'Customer{rental_id}',
+            'phone': phone, 'email': 'ada@example.com', 'equipment_list': equipment_list}
+
+class OverdueLedger:
+    """
+    The live overdue join (`live`, rental_id -> row) and the overdue_rental
+    table (`stored`), answering the statements that read and maintain it.
+    `due` lists the rentals the sweep finds past due; sweeping one makes it
+    overdue in the live join.
+    """
+
+    def __init__(self, live=(), stored=()):
+        self.live = {row['rental_id']: row for row in live}
+        self.stored = {row['rental_id']: dict(row) for row in stored}
+        self.due = []
+
+    def __call__(self, sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'INSERT INTO overdue_rental' in sql:
+            ids = set(args) if args else set(self.live)
+            rows = [dict(row) for rental_id, row in self.live.items() if rental_id in ids]
+            self.stored.update((row['rental_id'], row) for row in rows)
+            return len(rows)
+        if 'DELETE FROM overdue_rental' in sql:
+            ids = set(args) if args else set(self.stored)
+            for rental_id in ids:
+                self.stored.pop(rental_id, None)
+            return len(ids)
+        if "WHERE r.status = 'Overdue'" in sql:
+            return [dict(row) for row in self.live.values()]
+        if 'FROM overdue_rental' in sql and 'WHERE customer_id' in sql:
+            return [{'rental_id': rental_id} for rental_id, row in self.stored.items() if row['customer_id'] == args[0]]
+        if 'FROM overdue_rental' in sql:
+            return [dict(row) for row in sorted(self.stored.values(), key=lambda row: (row['due_date'],
+                                                                                        row['rental_id']))]
+        if "status = 'Active'" in sql and 'FOR UPDATE' in sql:
+            due, self.due = self.due, []
+            return [{'rental_id': rental_id, 'rental_date': date(2024, 1, 2)} for rental_id in due]
+        if "SET status = 'Overdue'" in sql:
+            for rental_id in args[2:]:
+                self.live[rental_id] = overdue_row(rental_id)
+            return len(args) - 2
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+def test_refresh_rederives_only_the_given_rentals():
+    ledger = OverdueLedger(live=[overdue_row(1), overdue_row(2, phone='555-0199')],
+                           stored=[overdue_row(2), overdue_row(3)])
+    cursor = FakeConnection(ledger).cursor()
+
+    refresh_overdue_rentals(cursor, [1, 2, 3])
+    assert ledger.stored == ledger.live
+
+    refresh_overdue_rentals(cursor, [])
+    assert len(cursor.connection.executed) == 2
+
+def test_check_reports_drift_until_a_rebuild():
+    ledger = OverdueLedger(live=[overdue_row(1), overdue_row(2, equipment_list='Ladder, Drill')],
+                           stored=[overdue_row(2), overdue_row(3)])
+    cursor = FakeConnection(ledger).cursor()
+
+    assert check_overdue_rentals(cursor) == [
+        'overdue_rental rental_id=1: missing',
+        'overdue_rental rental_id=2 equipment_list: live=Ladder, Drill stored=Ladder',
+        'overdue_rental rental_id=3: not overdue in the live join',
+    ]
+    rebuild_overdue_rentals(cursor)
+    assert check_overdue_rentals(cursor) == []
+
+def test_sweep_adds_the_rentals_it_marks_overdue(monkeypatch):
+    monkeypatch.setattr(rentals, 'bump_data_version', lambda *tables, db=None: None)
+    ledger = OverdueLedger()
+    ledger.due = [4, 5]
+
+    assert sweep_overdue_rentals(FakeConnection(ledger), today=date(2024, 2, 1)) == 2
+    assert sorted(ledger.stored) == [4, 5]
+    assert check_overdue_rentals(FakeConnection(ledger).cursor()) == []
+
+@pytest.fixture
+def overdue_ledger(opened_connections, monkeypatch):
+    """Two overdue rentals for customer 1, materialized, behind the app's connections"""
+    monkeypatch.setattr(functions, '_snapshots', {})
+    monkeypatch.setattr(rentals, 'refresh_search_entry', lambda cursor, source, doc_id: None)
+    ledger = OverdueLedger(live=[overdue_row(2), overdue_row(1, equipment_list='Drill, Saw')])
+    ledger.stored = {rental_id: dict(row) for rental_id, row in ledger.live.items()}
+    opened_connections.responder = ledger
+    return ledger
+
+def test_dashboard_lists_the_materialized_rows_in_due_order(client, logged_in, overdue_ledger):
+    response = client.get('/dashboard')
+
+    assert response.status_code == 200
+    assert response.data.index(b'Ada Customer1') < response.data.index(b'Ada Customer2')
+
+def test_customer_edit_refreshes_the_rows_that_show_them(client, logged_in, overdue_ledger):
+    for rental_id in overdue_ledger.live:
+        overdue_ledger.live[rental_id] = overdue_row(rental_id, phone='555-0142')
+
+    assert client.post('/customers/edit/1', data={'first_name': 'Ada', 'last_name': 'Lovelace',
+                                                  'email': 'ada@example.com', 'phone': '555-0142'}).status_code == 302
+    assert {row['phone'] for row in overdue_ledger.stored.values()} == {'555-0142'}
+
+def test_overdue_export_reads_the_materialized_table(client, logged_in, overdue_ledger):
+    response = client.get('/export/overdue.csv')
+
+    lines = response.data.decode().splitlines()
+    assert lines[0] == ','.join(OVERDUE_COLUMNS)
+    assert [line.split(',')[0] for line in lines[1:]] == ['1', '2']
@@ -0,0 +1,275 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.blueprints import rentals
+from app.blueprints.rentals import insert_rental
+from conftest import EMPLOYEE_ROW, FakeConnection
+
+class RentalShop:
+    """
+    In-memory equipment and rental lines, answering the statements the
+    availability lookup and the booking path run (everything else is a no-op).
+    """
+
+    def __init__(self, equipment, lines):
+        self.equipment = equipment   # equipment_id -> availability_status
+        self.lines = list(lines)     # (equipment_id, rental_id, rental_date, due_date, return_date)
+        self.booking = None          # (rental_date, due_date) of the rental being inserted
+
+    def equipment_row(self, equipment_id):
+        return {'equipment_id': equipment_id, 'equipment_name': f'Item {equipment_id}', 'equipment_type': 'Tool',
+                'serial_number': f'SN-{equipment_id}', 'daily_rate': 10, 'is_archived': False,
+                'availability_status': self.equipment[equipment_id]}
+
+    def holds(self, line, start, end, today):
+        """Whether a rental line keeps its item over [start, end], by the rule booked_equipment applies"""
+        _, _, rental_date, due_date, return_date = line
+        last_day = return_date - timedelta(days=1) if return_date else max(due_date, today)
+        return rental_date <= end and last_day >= start
+
+    def __call__(self, sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'SELECT NOW()' in sql:
+            return [{'now': datetime.now()}]
+        if 'INSERT INTO rental (' in sql:
+            self.booking = (args[2], args[3])
+            return 1
+        if 'INSERT INTO rental_detail' in sql:
+            self.lines.append((args[1], args[0], *self.booking, None))
+            return 1
+        if 'SELECT equipment_id, equipment_name, equipment_type, serial_number' in sql:
+            if 'rental_detail' in sql:
+                ids = sorted(line[0] for line in self.lines if line[1] == args[0])
+            else:
+                ids = sorted(self.equipment)
+            return [self.equipment_row(equipment_id) for equipment_id in ids]
+        if 'SELECT rd.equipment_id, r.rental_id' in sql:
+            columns = ('equipment_id', 'rental_id', 'rental_date', 'due_date', 'return_date')
+            return [dict(zip(columns, line)) for line in self.lines
+                    if 'WHERE r.rental_id' not in sql or line[1] == args[0]]
+        if 'SELECT DISTINCT rd.equipment_id' in sql:
+            count = len(args) - (5 if 'r.rental_id <>' in sql else 4)
+            ids, (end, start, today) = args[:count], args[count:count + 3]
+            return [{'equipment_id': equipment_id} for equipment_id in sorted(
+                {line[0] for line in self.lines if line[0] in ids and self.holds(line, start, end, today)})]
+        if 'FROM equipment' in sql and 'FOR UPDATE' in sql:
+            return [self.equipment_row(equipment_id) for equipment_id in args if equipment_id in self.equipment]
+        if "SET availability_status = 'Rented' WHERE equipment_id IN" in sql:
+            for equipment_id in args:
+                self.equipment[equipment_id] = 'Rented'
+            return len(args)
+        if 'FROM equipment' in sql and 'ORDER BY equipment_type' in sql:
+            statuses = ('Available', 'Rented') if "'Rented')" in sql else ('Available',)
+            return [self.equipment_row(equipment_id) for equipment_id in sorted(self.equipment)
+                    if self.equipment[equipment_id] in statuses]
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+@pytest.fixture
+def unloaded_indexes(monkeypatch):
+    """Make the availability and equipment search indexes load from the test's database on first use"""
+    monkeypatch.setitem(rentals._availability, 'loaded_at', None)
+    monkeypatch.setitem(rentals._equipment_search, 'loaded_at', None)
+
+def test_insert_rental_rejects_repeated_equipment():
+    conn = FakeConnection()
+    cursor = conn.cursor()
+
+    with pytest.raises(ValueError, match='#7'):
+        insert_rental(cursor, 1, 1, '2026-10-17', '2026-10-20', '', ['7', '3', '7'], ['1', '2', '1'])
+    assert conn.executed == []
+
+def flash_categories(client):
+    """Categories of the messages flashed so far in the client's session"""
+    with client.session_transaction() as session:
+        return [category for category, _ in session.get('_flashes', [])]
+
+def offered(client, start, end):
+    """Equipment ids /rentals/availability offers for [start, end]"""
+    response = client.get(f'/rentals/availability?start={start}&end={end}')
+    return [item['equipment_id'] for item in response.get_json()['equipment']]
+
+def book(client, start, end, equipment_ids):
+    """POST a rental of equipment_ids for [start, end]"""
+    return client.post('/rentals/create', data={
+        'customer_id': '1', 'rental_date': start.isoformat(), 'due_date': end.isoformat(),
+        'equipment_ids[]': [str(equipment_id) for equipment_id in equipment_ids],
+        'days_rented[]': ['1'] * len(equipment_ids)})
+
+def test_equipment_offered_by_availability_can_be_booked(client, logged_in, opened_connections, unloaded_indexes):
+    today = date.today()
+    # Item 2 is out until the day after tomorrow
+    shop = RentalShop({1: 'Available', 2: 'Rented', 3: 'Maintenance'},
+                      [(2, 50, today - timedelta(days=5), today + timedelta(days=2), None)])
+    opened_connections.responder = shop
+
+    assert offered(client, today + timedelta(days=1), today + timedelta(days=3)) == [1]
+    assert offered(client, today + timedelta(days=3), today + timedelta(days=4)) == [1, 2]
+
+    start, end = today, today + timedelta(days=3)
+    assert book(client, start, end, offered(client, start, end)).status_code == 302
+    assert flash_categories(client) == ['success']
+    assert shop.equipment[1] == 'Rented'
+
+def test_future_booking_blocks_its_window_without_flipping_status(client, logged_in, opened_connections,
+                                                                  unloaded_indexes):
+    today = date.today()
+    shop = RentalShop({1: 'Available'}, [])
+    opened_connections.responder = shop
+    start, end = today + timedelta(days=5), today + timedelta(days=7)
+
+    assert book(client, start, end, [1]).status_code == 302
+    assert flash_categories(client) == ['success']
+    # Still Available: the item can go out before the booking starts...
+    assert shop.equipment[1] == 'Available'
+    assert offered(client, today, today + timedelta(days=4)) == [1]
+    # ...but not over it
+    assert offered(client, today + timedelta(days=6), today + timedelta(days=9)) == []
+
+    book(client, today + timedelta(days=3), today + timedelta(days=5), [1])
+    assert flash_categories(client)[-1] == 'warning'
+    assert [line[1] for line in shop.lines] == [1]
+
+def test_equipment_search_only_lists_bookable_items(client, logged_in, opened_connections, unloaded_indexes):
+    today = date.today()
+    shop = RentalShop({1: 'Available', 2: 'Rented', 3: 'Maintenance'},
+                      [(2, 50, today - timedelta(days=5), today + timedelta(days=2), None)])
+    opened_connections.responder = shop
+
+    def search(start=today):
+        response = client.get(f'/equipment/search?q=item&start={start}')
+        return [item['equipment_id'] for item in response.get_json()['results']]
+
+    assert search() == [1]
+    assert search(today + timedelta(days=3)) == [1, 2]
+
+    book(client, today, today, [1])
+    assert shop.equipment[1] == 'Rented'
+    assert search() == []
+    assert search(today + timedelta(days=3)) == [1, 2]
+
+@pytest.mark.parametrize('old_date, new_date, deleted_before, rewound_to', [
+    (date(2024, 3, 1), date(2024, 1, 15), date(2024, 1, 15), date(2024, 1, 15)),
+    (date(2024, 1, 15), date(2024, 3, 1), date(2024, 3, 1), None),
+    (date(2024, 3, 1), None, None, date(2023, 6, 1)),
+    (date(2024, 3, 1), date(2024, 3, 1), None, None),
+])
+def test_purchase_date_edit_resets_the_rollup(client, logged_in, opened_connections, monkeypatch,
+                                              old_date, new_date, deleted_before, rewound_to):
+    monkeypatch.setattr(rentals, 'refresh_search_entry', lambda cursor, source, doc_id: None)
+
+    def responder(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'SELECT purchase_date FROM equipment' in sql:
+            return [{'purchase_date': old_date}]
+        if 'MIN(rental_date)' in sql:
+            return [{'first_day': date(2023, 6, 1)}]
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+    opened_connections.responder = responder
+    form = {'equipment_name': 'Item 7', 'equipment_type': 'Tool', 'daily_rate': '10',
+            'condition_status': 'Good', 'availability_status': 'Available',
+            'purchase_date': new_date.isoformat() if new_date else ''}
+    assert client.post('/equipment/edit/7', data=form).status_code == 302
+
+    executed = [(sql, args) for conn in opened_connections for sql, args in conn.executed]
+    deletes = [args for sql, args in executed if 'DELETE FROM equipment_daily_rollup' in sql]
+    rewinds = [args for sql, args in executed if 'UPDATE rollup_watermark' in sql]
+    assert deletes == ([(7, deleted_before)] if deleted_before else [])
+    assert rewinds == ([(rewound_to, 'equipment_daily_rollup')] if rewound_to else [])
+
+@pytest.mark.parametrize('purchase_date, rewound_to', [
+    (date(2024, 1, 15), date(2024, 1, 15)),
+    (None, date(2023, 6, 1)),
+])
+def test_new_equipment_rewinds_the_rollup(client, logged_in, opened_connections, monkeypatch,
+                                          purchase_date, rewound_to):
+    monkeypatch.setattr(rentals, 'refresh_search_entry', lambda cursor, source, doc_id: None)
+
+    def responder(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'MIN(rental_date)' in sql:
+            return [{'first_day': date(2023, 6, 1)}]
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+    opened_connections.responder = responder
+    form = {'equipment_name': 'Item 8', 'equipment_type': 'Tool', 'daily_rate': '10',
+            'condition_status': 'Good', 'availability_status': 'Available',
+            'purchase_date': purchase_date.isoformat() if purchase_date else ''}
+    assert client.post('/equipment/create', data=form).status_code == 302
+
+    executed = [(sql, args) for conn in opened_connections for sql, args in conn.executed]
+    assert [args for sql, args in executed if 'UPDATE rollup_watermark' in sql] == [
+        (rewound_to, 'equipment_daily_rollup')]
+
+@pytest.mark.parametrize('url, status', [
+    ('/rentals/5/return', 'Completed'),
+    ('/rentals/reactivate/5', 'Active'),
+    ('/rentals/delete/5', 'Overdue'),
+])
+def test_status_changes_lock_the_rental_before_checking_it(client, logged_in, opened_connections, url, status):
+    def responder(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'FROM rental' in sql and 'FOR UPDATE' in sql:
+            return [{'rental_id': 5, 'rental_date': date(2024, 1, 2), 'due_date': date(2024, 1, 9),
+                     'return_date': None, 'subtotal': 100, 'status': status}]
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+    opened_connections.responder = responder
+    assert client.post(url).status_code == 302
+
+    executed = [sql for conn in opened_connections for sql, _ in conn.executed]
+    rental_reads = [sql for sql in executed if 'FROM rental' in sql and 'WHERE rental_id' in sql]
+    assert rental_reads and all('FOR UPDATE' in sql for sql in rental_reads)
+    # A second request that lost the race changes nothing
+    assert not [sql for sql in executed if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+def test_claim_locks_items_in_id_order(opened_connections):
+    shop = RentalShop({1: 'Available', 2: 'Available', 3: 'Available'}, [])
+    conn = FakeConnection(shop)
+    today = date.today()
+
+    rentals.claim_equipment(conn.cursor(), ['3', '1', '2'], today, today)
+
+    sql, args = conn.executed[0]
+    assert 'FOR UPDATE' in sql and 'ORDER BY equipment_id' in sql
+    assert args == [1, 2, 3]
+
+def test_same_item_cannot_be_booked_twice_for_one_day(client, logged_in, opened_connections, unloaded_indexes):
+    today = date.today()
+    shop = RentalShop({1: 'Available', 2: 'Available'}, [])
+    opened_connections.responder = shop
+
+    assert book(client, today, today + timedelta(days=2), [1]).status_code == 302
+    book(client, today, today + timedelta(days=1), [2, 1])
+
+    assert flash_categories(client) == ['success', 'warning']
+    assert [(line[0], line[1]) for line in shop.lines] == [(1, 1)]
+    assert shop.equipment[2] == 'Available'
+
+def test_sweep_does_not_stop_at_rows_skipped_as_locked(app):
+    today = date.today()
+    statuses = {rental_id: 'Active' for rental_id in range(1, 6)}
+    locked = {3}   # held by a return in progress while the SKIP LOCKED chunks run
+
+    def responder(sql, args):
+        if 'FOR UPDATE' in sql and "status = 'Active'" in sql:
+            due = [rental_id for rental_id, status in sorted(statuses.items())
+                   if status == 'Active' and not ('SKIP LOCKED' in sql and rental_id in locked)]
+            return [{'rental_id': rental_id, 'rental_date': today - timedelta(days=9)}
+                    for rental_id in due[:args[2]]]
+        if "SET status = 'Overdue'" in sql:
+            for rental_id in args[2:]:
+                statuses[rental_id] = 'Overdue'
+            return len(args) - 2
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+    with app.app_context():
+        swept = rentals.sweep_overdue_rentals(FakeConnection(responder), batch_size=2, today=today)
+
+    assert swept == 5
+    assert set(statuses.values()) == {'Overdue'}
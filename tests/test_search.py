@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+from app.blueprints import rentals
+from app.functions import new_search_index, search_index_load, search_index_put, search_index_query, search_index_remove
+from conftest import EMPLOYEE_ROW
+
+CUSTOMERS = [
+    (1, 'Ada', 'Lovelace', 'ada@example.com', '555-0100'),
+    (2, 'Adam', 'Smith', 'adam.smith@example.com', '555-0101'),
+    (3, 'Grace', 'Hopper', 'grace@navy.example', '555-0102'),
+    (4, 'Alan', 'Turing', 'alan@example.com', '555-0103'),
+]
+
+def customer_rows(archived=()):
+    """The customer table the search index loads from, with the given ids archived"""
+    return [{'customer_id': customer_id, 'first_name': first, 'last_name': last, 'email': email, 'phone': phone,
+             'drivers_license': None, 'is_archived': customer_id in archived}
+            for customer_id, first, last, email, phone in CUSTOMERS]
+
+@pytest.fixture
+def customer_table(opened_connections, monkeypatch):
+    """An unloaded customer index over CUSTOMERS; set customer_table['archived'] to archive ids"""
+    monkeypatch.setitem(rentals._customer_search, 'loaded_at', None)
+    table = {'archived': set()}
+
+    def respond(sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        if 'SELECT NOW()' in sql:
+            return [{'now': datetime(2026, 1, 1)}]
+        if 'FROM customer' in sql:
+            rows = customer_rows(table['archived'])
+            return [row for row in rows if not row['is_archived']] if 'is_archived = FALSE' in sql else rows
+        return []
+
+    opened_connections.responder = respond
+    return table
+
+def search(client, query, **args):
+    """Customer ids /customers/search returns for query"""
+    response = client.get('/customers/search', query_string={'q': query, **args})
+    assert response.status_code == 200
+    return [customer['customer_id'] for customer in response.get_json()['results']]
+
+def test_customer_search_ranks_whole_words_then_prefixes_then_typos(client, logged_in, customer_table):
+    assert search(client, 'ada') == [1, 2]
+    assert search(client, 'ad') == [1, 2]
+    assert search(client, 'lovelace ada') == [1]
+    assert search(client, '555 0102')[0] == 3
+    assert search(client, 'hoppr') == [3]
+    # An empty query lists everyone by last name
+    assert search(client, '') == [3, 1, 2, 4]
+
+def test_customer_search_limit_is_clamped(client, logged_in, customer_table):
+    assert search(client, '', limit='2') == [3, 1]
+    assert search(client, '', limit='0') == [3]
+    assert search(client, '', limit='many') == [3, 1, 2, 4]
+
+def test_customer_search_drops_archived_customers_on_sync(client, logged_in, customer_table):
+    customer_table['archived'] = {1}
+    assert search(client, 'ada') == [2]
+
+    customer_table['archived'] = {2}
+    assert search(client, 'ada') == [2]
+    rentals.expire_search_index('customer')
+    assert search(client, 'ada') == [1]
+
+def test_index_put_and_remove_keep_postings_in_sort_order():
+    index = new_search_index()
+    search_index_load(index, [(2, ('Drill press',), 'b', 'drill press'), (3, ('Hammer drill',), 'c', 'hammer')])
+
+    search_index_put(index, 1, ('Drill bits',), 'a', 'drill bits')
+    assert search_index_query(index, 'drill') == ['drill bits', 'drill press', 'hammer']
+    search_index_put(index, 1, ('Saw',), 'a', 'saw')
+    assert search_index_query(index, 'dri') == ['drill press', 'hammer']
+    search_index_remove(index, 2)
+    assert search_index_query(index, 'drill') == ['hammer']
+    assert search_index_query(index, '') == ['saw', 'hammer']
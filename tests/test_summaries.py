@@ -0,0 +1,179 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.summaries import SUMMARY_SOURCES, check_rental_summaries
+from conftest import EMPLOYEE_ROW, FakeConnection
+
+class RentalLedger:
+    """
+    In-memory rental, rental_detail and summary tables, answering the
+    statements the rental routes and the summary check run (everything else
+    is a no-op). The summary upserts are applied the way MySQL would.
+    """
+
+    def __init__(self, equipment_ids):
+        self.equipment_ids = equipment_ids
+        self.rentals = {}    # rental_id -> rental row
+        self.lines = []      # rental_detail rows
+        self.pending = None  # rental inserted but not yet given its id by its first line
+        self.summaries = {table: {} for table in SUMMARY_SOURCES}
+
+    def live(self, table):
+        """What the live GROUP BY behind a summary table returns"""
+        groups = {}
+        if table == 'rental_equipment_summary':
+            for line in self.lines:
+                row = groups.setdefault(line['equipment_id'], {'equipment_id': line['equipment_id'],
+                                                               'times_rented': 0, 'total_revenue': 0})
+                row['times_rented'] += 1
+                row['total_revenue'] += line['line_total']
+        elif table == 'rental_customer_summary':
+            for rental in self.rentals.values():
+                row = groups.setdefault(rental['customer_id'], {'customer_id': rental['customer_id'],
+                                                                'total_rentals': 0, 'total_spent': 0})
+                row['total_rentals'] += 1
+                row['total_spent'] += rental['total_cost']
+        else:
+            for rental in self.rentals.values():
+                row = groups.setdefault(rental['status'], {'status': rental['status'], 'rental_count': 0,
+                                                           'total_cost': 0, 'late_fee_total': 0})
+                row['rental_count'] += 1
+                row['total_cost'] += rental['total_cost']
+                row['late_fee_total'] += rental['late_fee']
+        return list(groups.values())
+
+    def upsert(self, table, sign, rental_ids):
+        """INSERT ... SELECT sign * aggregates of rental_ids ... ON DUPLICATE KEY UPDATE column = column + delta"""
+        key = SUMMARY_SOURCES[table][0]
+        saved = self.rentals, self.lines
+        self.rentals = {rental_id: row for rental_id, row in self.rentals.items() if rental_id in rental_ids}
+        self.lines = [line for line in self.lines if line['rental_id'] in rental_ids]
+        deltas = self.live(table)
+        self.rentals, self.lines = saved
+        for delta in deltas:
+            row = self.summaries[table].setdefault(delta[key], {column: 0 for column in delta} | {key: delta[key]})
+            for column, value in delta.items():
+                if column != key:
+                    row[column] += sign * value
+        return len(deltas)
+
+    def __call__(self, sql, args):
+        if 'FROM employee' in sql:
+            return [EMPLOYEE_ROW]
+        for table in SUMMARY_SOURCES:
+            if f'INSERT INTO {table}' in sql:
+                sign = args[0]
+                return self.upsert(table, sign, set(args[3 if table == 'rental_status_summary' else 2:]))
+            if sql == SUMMARY_SOURCES[table][1]:
+                return self.live(table)
+            if sql == f'SELECT * FROM {table}':
+                return [dict(row) for row in self.summaries[table].values()]
+        if 'INSERT INTO rental (' in sql:
+            customer_id, _, rental_date, due_date, subtotal, total_cost, _ = args
+            self.pending = {'customer_id': int(customer_id), 'rental_date': rental_date, 'due_date': due_date,
+                            'return_date': None, 'status': 'Active', 'subtotal': subtotal, 'late_fee': 0.0,
+                            'total_cost': total_cost}
+            return 1
+        if 'INSERT INTO rental_detail' in sql:
+            if self.pending:
+                self.rentals[args[0]] = self.pending | {'rental_id': args[0]}
+                self.pending = None
+            self.lines.append({'rental_id': args[0], 'equipment_id': args[1], 'line_total': args[5]})
+            return 1
+        if 'SELECT rental_id, rental_date, due_date, return_date, subtotal, status' in sql:
+            rental = self.rentals.get(args[0])
+            return [dict(rental)] if rental else []
+        if 'FROM equipment' in sql and 'FOR UPDATE' in sql:
+            return [{'equipment_id': equipment_id, 'daily_rate': 10, 'availability_status': 'Available',
+                     'is_archived': False} for equipment_id in args if equipment_id in self.equipment_ids]
+        if 'SELECT equipment_id FROM rental_detail WHERE rental_id' in sql:
+            return [{'equipment_id': line['equipment_id']} for line in self.lines if line['rental_id'] == args[0]]
+        if 'SET return_date = %s' in sql:
+            return_date, late_fee, total_cost, rental_id = args
+            self.rentals[rental_id].update(return_date=return_date, status='Completed', late_fee=late_fee,
+                                           total_cost=total_cost)
+            return 1
+        if "SET status = 'Active'" in sql:
+            rental = self.rentals[args[0]]
+            rental.update(return_date=None, status='Active', late_fee=0.0, total_cost=rental['subtotal'])
+            return 1
+        if 'DELETE FROM rental WHERE rental_id' in sql:
+            self.rentals.pop(args[0])
+            self.lines = [line for line in self.lines if line['rental_id'] != args[0]]
+            return 1
+        return 0 if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) else []
+
+    def nonzero(self, table):
+        """A summary table's rows, minus the all-zero ones deletes leave behind"""
+        key = SUMMARY_SOURCES[table][0]
+        return {key_value: {column: value for column, value in row.items() if column != key}
+                for key_value, row in self.summaries[table].items()
+                if any(value for column, value in row.items() if column != key)}
+
+@pytest.fixture
+def ledger(opened_connections):
+    """An empty rental ledger with equipment 1 and 2, answering every query the app sends"""
+    ledger = RentalLedger({1, 2})
+    opened_connections.responder = ledger
+    return ledger
+
+def summaries_match(ledger):
+    """True if the summary check finds nothing against the ledger's live GROUP BY"""
+    return check_rental_summaries(FakeConnection(ledger).cursor()) == []
+
+def test_summary_rows_follow_every_rental_write(client, logged_in, ledger):
+    today = date.today()
+    response = client.post('/rentals/create', data={
+        'customer_id': '1', 'rental_date': (today - timedelta(days=5)).isoformat(),
+        'due_date': (today - timedelta(days=1)).isoformat(), 'equipment_ids[]': ['1', '2'],
+        'days_rented[]': ['3', '2']})
+    assert response.status_code == 302
+    [rental_id] = ledger.rentals
+    assert ledger.nonzero('rental_status_summary') == {
+        'Active': {'rental_count': 1, 'total_cost': 50.0, 'late_fee_total': 0.0}}
+    assert ledger.nonzero('rental_customer_summary') == {1: {'total_rentals': 1, 'total_spent': 50.0}}
+    assert ledger.nonzero('rental_equipment_summary') == {1: {'times_rented': 1, 'total_revenue': 30.0},
+                                                          2: {'times_rented': 1, 'total_revenue': 20.0}}
+    assert summaries_match(ledger)
+
+    # Returned a day late: a 10% fee moves the rental to Completed
+    assert client.post(f'/rentals/{rental_id}/return').status_code == 302
+    assert ledger.nonzero('rental_status_summary') == {
+        'Completed': {'rental_count': 1, 'total_cost': 55.0, 'late_fee_total': 5.0}}
+    assert ledger.nonzero('rental_customer_summary') == {1: {'total_rentals': 1, 'total_spent': 55.0}}
+    assert summaries_match(ledger)
+
+    assert client.post(f'/rentals/reactivate/{rental_id}').status_code == 302
+    assert ledger.nonzero('rental_status_summary') == {
+        'Active': {'rental_count': 1, 'total_cost': 50.0, 'late_fee_total': 0.0}}
+    assert ledger.nonzero('rental_customer_summary') == {1: {'total_rentals': 1, 'total_spent': 50.0}}
+    assert summaries_match(ledger)
+
+    client.post(f'/rentals/{rental_id}/return')
+    assert client.post(f'/rentals/delete/{rental_id}').status_code == 302
+    assert ledger.rentals == {}
+    assert all(ledger.nonzero(table) == {} for table in SUMMARY_SOURCES)
+    assert summaries_match(ledger)
+
+def test_summary_check_reports_drift_from_the_live_group_by():
+    ledger = RentalLedger({1})
+    ledger.rentals[7] = {'rental_id': 7, 'customer_id': 3, 'status': 'Completed', 'total_cost': 40.0,
+                         'late_fee': 0.0}
+    ledger.lines.append({'rental_id': 7, 'equipment_id': 1, 'line_total': 40.0})
+    for table in SUMMARY_SOURCES:
+        key = SUMMARY_SOURCES[table][0]
+        ledger.summaries[table] = {row[key]: row for row in ledger.live(table)}
+    # All-zero rows left behind by deletes are not drift
+    ledger.summaries['rental_customer_summary'][9] = {'customer_id': 9, 'total_rentals': 0, 'total_spent': 0}
+    assert summaries_match(ledger)
+
+    ledger.summaries['rental_status_summary']['Completed']['total_cost'] = 35.0
+    del ledger.summaries['rental_equipment_summary'][1]
+    mismatches = check_rental_summaries(FakeConnection(ledger).cursor())
+
+    assert mismatches == [
+        'rental_status_summary status=Completed total_cost: live=40.0 summary=35.0',
+        "rental_equipment_summary equipment_id=1: live={'equipment_id': 1, 'times_rented': 1, "
+        "'total_revenue': 40.0} summary=None",
+    ]